@@ -0,0 +1,73 @@
+"""
+Отзывы на предложения автора со 100 000 предложений: прежняя реализация
+get_bid_feedbacks (все предложения автора в Python + IN (...)) против одного
+запроса с JOIN, ограниченного тендером, и keyset-пагинации.
+"""
+import uuid
+
+from sqlalchemy import select
+
+from benchmarks.common import Fixture, bulk_insert, measure, prepare_schema, report
+from src.db.crud import get_bid_feedbacks, get_user_by_username
+from src.db.database import SessionLocal
+from src.db.models import Tender, TenderServiceType, TenderStatus, Bid, BidStatus, AuthorType, BidFeedback
+
+AUTHOR_BIDS = 100_000
+TENDERS = 1_000
+FEEDBACKS_PER_BID = 2
+PAGE_SIZE = 50
+
+
+def legacy_get_bid_feedbacks(db, tender_id, author_username, requester_username, limit=5, offset=0):
+    get_user_by_username(db, requester_username)
+    author = get_user_by_username(db, author_username)
+    db.get(Tender, tender_id)
+    bids = db.scalars(select(Bid).where(Bid.author_id == author.id)).all()
+    return db.scalars(
+        select(BidFeedback).where(BidFeedback.bid_id.in_([bid.id for bid in bids])).limit(limit).offset(offset)
+    ).all()
+
+
+def main():
+    prepare_schema()
+    db = SessionLocal()
+    fixture = Fixture(db)
+    try:
+        requester = fixture.user("requester")
+        author = fixture.user("author")
+        organization = fixture.organization("org", responsibles=[requester])
+
+        tender_ids = [uuid.uuid4() for _ in range(TENDERS)]
+        bulk_insert(db, Tender, (
+            dict(id=tender_id, name=f"tender {i}", description="bench", service_type=TenderServiceType.DELIVERY,
+                 status=TenderStatus.PUBLISHED, version=1, organization_id=organization.id)
+            for i, tender_id in enumerate(tender_ids)
+        ))
+        bid_ids = [uuid.uuid4() for _ in range(AUTHOR_BIDS)]
+        bulk_insert(db, Bid, (
+            dict(id=bid_id, name=f"bid {i}", description="bench", status=BidStatus.PUBLISHED, version=1,
+                 tender_id=tender_ids[i % TENDERS], author_type=AuthorType.USER, author_id=author.id)
+            for i, bid_id in enumerate(bid_ids)
+        ))
+        target_tender = tender_ids[0]
+        bulk_insert(db, BidFeedback, (
+            dict(bid_id=bid_id, user_id=requester.id, feedback=f"feedback {n}")
+            for i, bid_id in enumerate(bid_ids) if i % TENDERS == 0
+            for n in range(FEEDBACKS_PER_BID)
+        ))
+
+        args = dict(tender_id=target_tender, author_username=author.username, requester_username=requester.username,
+                    limit=PAGE_SIZE)
+        report("legacy: all author bids + IN list", measure(lambda: legacy_get_bid_feedbacks(db, **args), repeat=5))
+        report("joined, first page", measure(lambda: get_bid_feedbacks(db, **args)))
+
+        first_page = get_bid_feedbacks(db, **args)
+        after = (first_page[-1].created_at, first_page[-1].id)
+        report("joined, keyset next page", measure(lambda: get_bid_feedbacks(db, after=after, **args)))
+    finally:
+        fixture.cleanup()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+"Мои предложения" на большом наборе: прежний запрос (список организаций в Python,
+затем OR + IN) против одного UNION ALL. Печатает план нового
+запроса, чтобы убедиться, что каждая ветка читает индекс bid(author_type, author_id, name, id).
+"""
+import random
+import uuid
+
+from sqlalchemy import select, or_, and_
+
+from benchmarks.common import Fixture, analyze, bulk_insert, explain, measure, prepare_schema, report
+from src.db.crud import bids_by_user_query, get_bids_by_user, get_user_by_username
+from src.db.database import SessionLocal
+from src.db.models import Tender, TenderServiceType, TenderStatus, Bid, BidStatus, AuthorType, OrganizationResponsible
+
+BACKGROUND_BIDS = 500_000
+USER_BIDS = 2_000
+USER_ORGANIZATIONS = 200
+BIDS_PER_ORGANIZATION = 50
+PAGE_SIZE = 50
+
+
+def legacy_get_bids_by_user(db, username, limit=5, offset=0):
+    user = get_user_by_username(db, username)
+    responsible_orgs = db.scalars(
+        select(OrganizationResponsible.organization_id).where(OrganizationResponsible.user_id == user.id)
+    ).all()
+    query = select(Bid).where(
+        or_(
+            Bid.author_id == user.id,
+            and_(Bid.author_type == AuthorType.ORGANIZATION, Bid.author_id.in_(responsible_orgs))
+        )
+    ).limit(limit).offset(offset).order_by(Bid.name)
+    return db.scalars(query).all()
+
+
+def main():
+    prepare_schema()
+    db = SessionLocal()
+    fixture = Fixture(db)
+    try:
+        user = fixture.user("user")
+        owner = fixture.user("owner")
+        tender_org = fixture.organization("tenders", responsibles=[owner])
+        organizations = [fixture.organization(f"org{i}", responsibles=[user]) for i in range(USER_ORGANIZATIONS)]
+
+        tender_ids = [uuid.uuid4() for _ in range(100)]
+        bulk_insert(db, Tender, (
+            dict(id=tender_id, name=f"tender {i}", description="bench", service_type=TenderServiceType.DELIVERY,
+                 status=TenderStatus.PUBLISHED, version=1, organization_id=tender_org.id)
+            for i, tender_id in enumerate(tender_ids)
+        ))
+
+        def bid(author_type, author_id):
+            return dict(name=f"bid {random.random():.12f}", description="bench", status=BidStatus.PUBLISHED, version=1,
+                        tender_id=random.choice(tender_ids), author_type=author_type, author_id=author_id)
+
+        bulk_insert(db, Bid, (bid(AuthorType.USER, uuid.uuid4()) for _ in range(BACKGROUND_BIDS)))
+        bulk_insert(db, Bid, (bid(AuthorType.USER, user.id) for _ in range(USER_BIDS)))
+        bulk_insert(db, Bid, (
+            bid(AuthorType.ORGANIZATION, organization.id)
+            for organization in organizations for _ in range(BIDS_PER_ORGANIZATION)
+        ))
+        analyze(db, "bid")
+        explain(db, bids_by_user_query(user.id, PAGE_SIZE, 0))
+
+        report("legacy: org ids in Python + OR/IN", measure(lambda: legacy_get_bids_by_user(db, user.username, PAGE_SIZE)))
+        report("single UNION ALL statement", measure(lambda: get_bids_by_user(db, user.username, PAGE_SIZE)))
+        report("single UNION ALL, page 20", measure(lambda: get_bids_by_user(db, user.username, PAGE_SIZE, PAGE_SIZE * 20)))
+    finally:
+        fixture.cleanup()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
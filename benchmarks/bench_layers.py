@@ -0,0 +1,57 @@
+"""
+Из чего складывается время ленты тендеров: запрос к БД с драйвером (Core), загрузка
+ORM-объектов, сборка pydantic-моделей и кодирование JSON. Каждый следующий замер включает
+предыдущие, разница между ними — вклад слоя. Удобно сравнивать PostgreSQL и SQLite.
+"""
+import json
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+
+from benchmarks.common import Fixture, bulk_insert, measure, prepare_schema, report
+from src.db.crud import get_tenders
+from src.db.database import SessionLocal, engine
+from src.db.models import Tender, TenderServiceType, TenderStatus
+from src.models import TenderOut
+
+TENDERS = 20_000
+PAGE_SIZE = 50
+
+
+def main():
+    prepare_schema()
+    db = SessionLocal()
+    fixture = Fixture(db)
+    try:
+        organization = fixture.organization("org")
+        bulk_insert(db, Tender, (
+            dict(id=uuid.uuid4(), name=f"tender {i:06d}", description="bench", service_type=TenderServiceType.DELIVERY,
+                 status=TenderStatus.PUBLISHED, organization_id=organization.id, version=1)
+            for i in range(TENDERS)
+        ))
+
+        core_query = select(*Tender.__table__.columns).where(
+            Tender.status == TenderStatus.PUBLISHED
+        ).order_by(Tender.name).limit(PAGE_SIZE)
+
+        def orm():
+            tenders = get_tenders(db=db, service_type=None, limit=PAGE_SIZE, offset=0)
+            db.expunge_all()
+            return tenders
+
+        def models():
+            return [TenderOut.from_orm(tender) for tender in orm()]
+
+        print(f"backend: {engine.dialect.name}")
+        report("db + driver (Core rows)", measure(lambda: db.execute(core_query).all()))
+        report("+ ORM objects", measure(orm))
+        report("+ pydantic models", measure(models))
+        report("+ JSON encoding", measure(lambda: json.dumps(jsonable_encoder(models()))))
+    finally:
+        fixture.cleanup()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
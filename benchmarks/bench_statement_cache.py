@@ -0,0 +1,65 @@
+"""
+Цена сборки запроса в Python: частые запросы crud в виде select(...), который строится и
+хешируется для кеша компиляции при каждом вызове, против lambda_stmt из src.db.crud, который
+собирается один раз на место вызова. Главная метрика — cpu_median_ms на вызов; разница между
+парами — сэкономленное процессорное время запроса. С postgresql+psycopg:// в DATABASE_URL
+дополнительно работают серверные подготовленные запросы (DB_PREPARE_THRESHOLD).
+"""
+from sqlalchemy import select
+
+from benchmarks.common import Fixture, measure, prepare_schema, report
+from src.db.crud import get_user_by_username, is_user_responsible_for_organization
+from src.db.database import SessionLocal, engine
+from src.db.models import User, OrganizationResponsible
+
+CALLS = 200
+
+
+def user_by_username_select(db, username):
+    return db.execute(select(User).where(User.username == username)).scalar_one_or_none()
+
+
+def is_responsible_select(db, user_id, organization_id):
+    query = select(OrganizationResponsible.id).where(
+        OrganizationResponsible.user_id == user_id,
+        OrganizationResponsible.organization_id == organization_id
+    )
+    return db.execute(query).scalar_one_or_none() is not None
+
+
+def main():
+    prepare_schema()
+    db = SessionLocal()
+    fixture = Fixture(db)
+    try:
+        user = fixture.user("responsible")
+        organization = fixture.organization("org", [user])
+        username, user_id, organization_id = user.username, user.id, organization.id
+
+        def calls(fn):
+            # Серия вызовов, чтобы время сборки запроса было заметно на фоне таймера
+            def run():
+                for _ in range(CALLS):
+                    fn()
+                db.expunge_all()
+            return run
+
+        def per_call(stats):
+            return {key: value / CALLS for key, value in stats.items()}
+
+        print(f"backend: {engine.dialect.name}, driver: {engine.dialect.driver}, per call:")
+        report("get_user_by_username select()", per_call(measure(calls(
+            lambda: user_by_username_select(db, username)))))
+        report("get_user_by_username lambda_stmt", per_call(measure(calls(
+            lambda: get_user_by_username(db, username)))))
+        report("is_responsible select()", per_call(measure(calls(
+            lambda: is_responsible_select(db, user_id, organization_id)))))
+        report("is_responsible lambda_stmt", per_call(measure(calls(
+            lambda: is_user_responsible_for_organization(db, user_id, organization_id)))))
+    finally:
+        fixture.cleanup()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
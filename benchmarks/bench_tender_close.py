@@ -0,0 +1,67 @@
+"""
+Закрытие тендера с тысячами открытых предложений: прежний путь, в котором клиент отменяет
+каждое предложение через update_bid_status (запись истории и две фиксации на предложение),
+против каскадной отмены в update_tender_status — одна транзакция с многострочной вставкой
+истории и одним UPDATE. Перед каждым замером создаётся новый тендер с предложениями.
+"""
+import uuid
+
+from benchmarks.common import Fixture, bulk_insert, measure, prepare_schema, report
+from src.db.crud import update_bid_status, update_tender_status
+from src.db.database import SessionLocal, engine
+from src.db.models import Tender, TenderServiceType, TenderStatus, Bid, BidStatus, AuthorType
+
+BID_COUNTS = (1_000, 5_000)
+REPEAT = 3
+
+
+def main():
+    prepare_schema()
+    db = SessionLocal()
+    fixture = Fixture(db)
+    try:
+        user = fixture.user("responsible")
+        organization = fixture.organization("org", [user])
+        username, user_id, organization_id = user.username, user.id, organization.id
+
+        def tender_with_bids(bids):
+            def setup():
+                tender_id = uuid.uuid4()
+                bulk_insert(db, Tender, [dict(
+                    id=tender_id, name="tender", description="bench", service_type=TenderServiceType.DELIVERY,
+                    status=TenderStatus.PUBLISHED, organization_id=organization_id, version=1
+                )])
+                bid_ids = [uuid.uuid4() for _ in range(bids)]
+                bulk_insert(db, Bid, (
+                    dict(id=bid_id, name=f"bid {i:06d}", description="bench",
+                         status=BidStatus.PUBLISHED if i % 2 else BidStatus.CREATED, version=1,
+                         tender_id=tender_id, author_type=AuthorType.USER, author_id=user_id)
+                    for i, bid_id in enumerate(bid_ids)
+                ))
+                db.expunge_all()
+                return tender_id, bid_ids
+            return setup
+
+        def cancel_one_by_one(data):
+            tender_id, bid_ids = data
+            for bid_id in bid_ids:
+                update_bid_status(db, bid_id, BidStatus.CANCELED, username)
+            update_tender_status(db, tender_id, TenderStatus.CLOSED, username)
+
+        def cascade_close(data):
+            tender_id, _ = data
+            update_tender_status(db, tender_id, TenderStatus.CLOSED, username)
+
+        print(f"backend: {engine.dialect.name}")
+        for bids in BID_COUNTS:
+            report(f"{bids} bids: cancel one by one", measure(
+                cancel_one_by_one, repeat=REPEAT, warmup=0, setup=tender_with_bids(bids)))
+            report(f"{bids} bids: cascade on close", measure(
+                cascade_close, repeat=REPEAT, warmup=1, setup=tender_with_bids(bids)))
+    finally:
+        fixture.cleanup()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
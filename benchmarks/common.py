@@ -0,0 +1,116 @@
+"""
+Общие помощники для бенчмарков.
+
+Бенчмарки работают с базой из настроек приложения (.env), создают свои данные
+с уникальным префиксом и удаляют их по завершении. Запуск: python -m benchmarks.<имя>
+Без PostgreSQL можно запускать на SQLite: DATABASE_URL=sqlite:///./bench.db python -m benchmarks.<имя>
+"""
+import statistics
+import time
+import uuid
+from typing import Callable, Iterable
+
+from sqlalchemy import insert, delete, text, Select
+from sqlalchemy.orm import Session
+
+from src.db.database import BaseModel, engine
+from src.db.models import User, Organization, OrganizationResponsible
+
+
+def prepare_schema():
+    BaseModel.metadata.create_all(bind=engine)
+
+
+def analyze(db: Session, *tables: str):
+    for table in tables:
+        db.execute(text(f"ANALYZE {table}"))
+    db.commit()
+
+
+def explain(db: Session, query: Select):
+    """Печатает план запроса: EXPLAIN (ANALYZE, BUFFERS) в PostgreSQL, EXPLAIN QUERY PLAN в SQLite."""
+    compiled = query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    if engine.dialect.name == "postgresql":
+        print("EXPLAIN (ANALYZE, BUFFERS):")
+        for (line,) in db.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {compiled}")):
+            print("   ", line)
+    else:
+        print("EXPLAIN QUERY PLAN:")
+        for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")):
+            print("   ", row[-1])
+
+
+def measure(fn: Callable[..., object], repeat: int = 20, warmup: int = 2,
+            setup: Callable[[], object] | None = None) -> dict[str, float]:
+    """С setup перед каждым вызовом готовятся новые данные (вне замера), и fn получает их аргументом."""
+    def call():
+        if setup is None:
+            return fn
+        data = setup()
+        return lambda: fn(data)
+
+    for _ in range(warmup):
+        call()()
+    wall, cpu = [], []
+    for _ in range(repeat):
+        run = call()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        run()
+        wall.append((time.perf_counter() - wall_start) * 1000)
+        cpu.append((time.process_time() - cpu_start) * 1000)
+    wall.sort()
+    return {
+        "median_ms": statistics.median(wall),
+        "p95_ms": wall[max(0, int(len(wall) * 0.95) - 1)],
+        "cpu_median_ms": statistics.median(cpu),
+    }
+
+
+def report(name: str, stats: dict[str, float]):
+    print(f"{name:<40} " + "  ".join(f"{key}={value:.3f}" for key, value in stats.items()))
+
+
+def bulk_insert(db: Session, model, rows: Iterable[dict], chunk_size: int = 10000):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.execute(insert(model), chunk)
+            chunk = []
+    if chunk:
+        db.execute(insert(model), chunk)
+    db.commit()
+
+
+class Fixture:
+    """Пользователи и организации бенчмарка; удаляются каскадно в cleanup()."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.prefix = f"bench_{uuid.uuid4().hex[:8]}"
+        self.user_ids: list[uuid.UUID] = []
+        self.organization_ids: list[uuid.UUID] = []
+
+    def user(self, name: str) -> User:
+        user = User(username=f"{self.prefix}_{name}", first_name=name, last_name=self.prefix)
+        self.db.add(user)
+        self.db.commit()
+        self.user_ids.append(user.id)
+        return user
+
+    def organization(self, name: str, responsibles: Iterable[User] = ()) -> Organization:
+        organization = Organization(name=f"{self.prefix}_{name}")
+        self.db.add(organization)
+        self.db.commit()
+        self.organization_ids.append(organization.id)
+        for user in responsibles:
+            self.db.add(OrganizationResponsible(organization_id=organization.id, user_id=user.id))
+        self.db.commit()
+        return organization
+
+    def cleanup(self):
+        self.db.rollback()
+        # Тендеры, предложения и их история удаляются каскадно вместе с организациями
+        self.db.execute(delete(Organization).where(Organization.id.in_(self.organization_ids)))
+        self.db.execute(delete(User).where(User.id.in_(self.user_ids)))
+        self.db.commit()
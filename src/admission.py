@@ -0,0 +1,144 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from src.db.database import DB_POOL_SIZE, DB_MAX_OVERFLOW
+from src.metrics import metrics
+
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# По умолчанию одновременно выполняется не больше запросов, чем соединений в пуле,
+# поэтому лишние запросы получают 429 сразу, а не ждут соединение до pool_timeout.
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+ADMISSION_READ_RATE = float(os.getenv("ADMISSION_READ_RATE", "10"))
+ADMISSION_READ_BURST = float(os.getenv("ADMISSION_READ_BURST", "20"))
+ADMISSION_WRITE_RATE = float(os.getenv("ADMISSION_WRITE_RATE", "2"))
+ADMISSION_WRITE_BURST = float(os.getenv("ADMISSION_WRITE_BURST", "5"))
+ADMISSION_MAX_BUCKETS = int(os.getenv("ADMISSION_MAX_BUCKETS", "10000"))
+
+EXEMPT_PATHS = ("/api/ping", "/api/internal/")
+# Долгоживущие соединения не держат соединение с БД и не учитываются в лимите одновременных запросов
+LONG_LIVED_PATHS = ("/api/events/",)
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """Забирает токен. Возвращает 0 при успехе, иначе время в секундах до появления токена."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int, max_buckets: int):
+        self.max_in_flight = max_in_flight
+        self.max_buckets = max_buckets
+        self.in_flight = 0
+        self._buckets: OrderedDict[tuple[str, str], TokenBucket] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def route_group(request: Request) -> str:
+        # /api/tenders/... -> tenders:read, /api/bids/new -> bids:write
+        parts = request.url.path.strip("/").split("/")
+        resource = parts[1] if len(parts) > 1 else parts[0]
+        kind = "read" if request.method in READ_METHODS else "write"
+        return f"{resource}:{kind}"
+
+    @staticmethod
+    def client_key(request: Request) -> str:
+        username = request.query_params.get("username") or request.query_params.get("requesterUsername")
+        if username:
+            return f"user:{username}"
+        return f"ip:{request.client.host if request.client else 'unknown'}"
+
+    def _bucket(self, key: tuple[str, str]) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if key[1].endswith(":read"):
+                bucket = TokenBucket(ADMISSION_READ_RATE, ADMISSION_READ_BURST)
+            else:
+                bucket = TokenBucket(ADMISSION_WRITE_RATE, ADMISSION_WRITE_BURST)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def try_admit(self, client: str, group: str, count_in_flight: bool = True) -> tuple[bool, float, str]:
+        with self._lock:
+            # Перегрузка проверяется до лимита клиента: отказ из-за чужих запросов не тратит его токен
+            if count_in_flight and self.in_flight >= self.max_in_flight:
+                return False, 1, "overloaded"
+            retry_after = self._bucket((client, group)).try_acquire()
+            if retry_after:
+                return False, retry_after, "rate_limited"
+            if not count_in_flight:
+                return True, 0, ""
+            self.in_flight += 1
+            metrics.set("admission_in_flight", self.in_flight)
+            return True, 0, ""
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            metrics.set("admission_in_flight", self.in_flight)
+
+
+admission_controller = AdmissionController(ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_BUCKETS)
+
+
+async def admission_middleware(request: Request, call_next):
+    if not ADMISSION_ENABLED or request.url.path.startswith(EXEMPT_PATHS):
+        return await call_next(request)
+
+    group = admission_controller.route_group(request)
+    long_lived = request.url.path.startswith(LONG_LIVED_PATHS)
+    admitted, retry_after, reason = admission_controller.try_admit(
+        admission_controller.client_key(request), group, count_in_flight=not long_lived
+    )
+    if not admitted:
+        metrics.inc("admission_rejected_total", {"group": group, "reason": reason})
+        detail = "Rate limit exceeded" if reason == "rate_limited" else "Server is overloaded, try again later"
+        return JSONResponse(
+            status_code=429,
+            content={"reason": detail},
+            headers={"Retry-After": str(max(1, math.ceil(min(retry_after, 3600))))}
+        )
+
+    metrics.inc("admission_admitted_total", {"group": group})
+    if long_lived:
+        return await call_next(request)
+    try:
+        response = await call_next(request)
+    except BaseException:
+        admission_controller.release()
+        raise
+    response.body_iterator = release_after_body(response.body_iterator)
+    return response
+
+
+async def release_after_body(body):
+    # Место освобождается, когда тело отправлено: потоковые ответы читают БД уже после возврата обработчика
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        admission_controller.release()
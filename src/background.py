@@ -0,0 +1,47 @@
+import logging
+import threading
+from typing import Callable
+
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Фоновый поток, вызывающий fn каждые interval секунд до остановки приложения."""
+
+    def __init__(self, name: str, interval: float, fn: Callable[[], None]):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.fn()
+            except Exception:
+                logger.exception("Background task '%s' failed", self.name)
+
+
+background_tasks: list[PeriodicTask] = []
+
+
+def start_background_tasks(tasks: list[PeriodicTask]):
+    for task in tasks:
+        task.start()
+        background_tasks.append(task)
+
+
+def stop_background_tasks():
+    while background_tasks:
+        background_tasks.pop().stop(timeout=5)
@@ -0,0 +1,57 @@
+import os
+import threading
+from typing import Any, Callable, Hashable
+
+from src.metrics import metrics
+
+
+COALESCING_ENABLED = os.getenv("COALESCING_ENABLED", "true").lower() == "true"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные одинаковые вызовы: пока выполняется запрос с ключом key,
+    остальные запросы с тем же ключом ждут и получают его результат (или его исключение).
+    Ключ должен включать маршрут, параметры запроса и контекст прав пользователя.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        if not COALESCING_ENABLED:
+            return fn()
+
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            metrics.inc("coalesced_requests_total", {"route": self.name})
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        metrics.inc("coalesced_executions_total", {"route": self.name})
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,139 @@
+import os
+import zlib
+
+from starlette.requests import Request
+
+from src.metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него ответы сжимаются только gzip
+    brotli = None
+
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# Потоковый ответ сбрасывается клиенту после каждых COMPRESSION_FLUSH_SIZE байт исходных данных
+COMPRESSION_FLUSH_SIZE = int(os.getenv("COMPRESSION_FLUSH_SIZE", "65536"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html")
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    encodings = set()
+    for item in accept_encoding.split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            encodings.add(name.lower())
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    encodings = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in encodings:
+        return "br"
+    if "gzip" in encodings:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+            self._zlib = None
+        else:
+            self._brotli = None
+            # wbits=31 — формат gzip (заголовок и контрольная сумма)
+            self._zlib = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+async def _chunks(chunks: list[bytes]):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _compressed(head: list[bytes], rest, compressor: _Compressor, encoding: str):
+    async def chunks():
+        for chunk in head:
+            yield chunk
+        async for chunk in rest:
+            yield chunk
+
+    # Сжатые данные сбрасываются порциями, поэтому потоковые ответы остаются потоковыми,
+    # а мелкие фрагменты (строки потокового JSON) не ухудшают степень сжатия
+    input_size = output_size = pending = 0
+    async for chunk in chunks():
+        input_size += len(chunk)
+        pending += len(chunk)
+        data = compressor.compress(chunk)
+        if pending >= COMPRESSION_FLUSH_SIZE:
+            data += compressor.flush()
+            pending = 0
+        if data:
+            output_size += len(data)
+            yield data
+    data = compressor.finish()
+    output_size += len(data)
+    yield data
+    metrics.inc("compressed_responses_total", {"encoding": encoding})
+    metrics.inc("compression_input_bytes_total", {"encoding": encoding}, input_size)
+    metrics.inc("compression_output_bytes_total", {"encoding": encoding}, output_size)
+
+
+async def compression_middleware(request: Request, call_next):
+    response = await call_next(request)
+    if not COMPRESSION_ENABLED:
+        return response
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    content_type = response.headers.get("content-type", "")
+    # text/event-stream не сжимается: сжатие буферизует события и задерживает их доставку
+    if (
+        encoding is None
+        or "content-encoding" in response.headers
+        or not content_type.startswith(COMPRESSIBLE_TYPES)
+    ):
+        return response
+
+    # Небольшие ответы дешевле отправить как есть; решение принимается по первым байтам тела
+    body_iterator = response.body_iterator
+    head, size = [], 0
+    async for chunk in body_iterator:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= COMPRESSION_MIN_SIZE:
+            break
+    else:
+        response.body_iterator = _chunks(head)
+        return response
+
+    response.body_iterator = _compressed(head, body_iterator, _Compressor(encoding), encoding)
+    del response.headers["content-length"]
+    response.headers["content-encoding"] = encoding
+    response.headers.append("vary", "Accept-Encoding")
+    return response
@@ -0,0 +1,104 @@
+import os
+from datetime import timedelta
+
+from sqlalchemy import Table, Column, Index, TIMESTAMP, func, select, insert, delete
+from sqlalchemy.orm import Session
+
+from src.db.database import BaseModel, shard_session_factories, database_now
+from src.db.history_journal import journal_enabled, flush_history_journal
+from src.metrics import metrics
+from src.db.models import Tender, TenderStatus, TenderHistory, Bid, BidHistory, BidDecision, BidFeedback
+
+
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "false").lower() == "true"
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "100"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+
+def _archive_table(source: Table, *indexes: str, primary_key: tuple[str, ...] | None = None) -> Table:
+    # Архивные таблицы повторяют колонки исходных, но без внешних ключей:
+    # строки переносятся пачками, и порядок вставки между ними не важен.
+    # primary_key задаётся, если первичный ключ архива отличается от ключа исходной таблицы.
+    columns = [
+        Column(column.name, column.type, nullable=column.nullable,
+               primary_key=column.name in primary_key if primary_key else column.primary_key)
+        for column in source.columns
+    ]
+    name = f"{source.name}_archive"
+    return Table(
+        name,
+        BaseModel.metadata,
+        *columns,
+        Column("archived_at", TIMESTAMP, server_default=func.now(), nullable=False),
+        *[Index(f"ix_{name}_{column}", column) for column in indexes],
+    )
+
+
+tender_archive = _archive_table(Tender.__table__, "organization_id")
+bid_archive = _archive_table(Bid.__table__, "tender_id")
+bid_decision_archive = _archive_table(BidDecision.__table__, "bid_id")
+bid_feedback_archive = _archive_table(BidFeedback.__table__, "bid_id")
+# Ключ истории в секционированных таблицах — (id, created_at); архив не секционирован
+# и сохраняет ключ из миграции 9e4b7d2c6a10
+tender_history_archive = _archive_table(TenderHistory.__table__, "tender_id", primary_key=("id", "tender_id"))
+bid_history_archive = _archive_table(BidHistory.__table__, "bid_id", primary_key=("id", "bid_id"))
+
+
+def _copy_rows(db: Session, source: Table, target: Table, condition):
+    columns = [column.name for column in source.columns]
+    db.execute(insert(target).from_select(columns, select(*[source.c[name] for name in columns]).where(condition)))
+
+
+def archive_tender_batch(db: Session, tender_ids: list) -> None:
+    """Переносит тендеры и все зависимые строки в архив одной транзакцией."""
+    bid_ids = select(Bid.id).where(Bid.tender_id.in_(tender_ids)).scalar_subquery()
+
+    if journal_enabled():
+        # История из журнала должна попасть в архив вместе с тендером, а не потеряться при удалении
+        flush_history_journal(db, list(tender_ids) + db.scalars(select(Bid.id).where(Bid.tender_id.in_(tender_ids))).all())
+
+    _copy_rows(db, Tender.__table__, tender_archive, Tender.id.in_(tender_ids))
+    _copy_rows(db, TenderHistory.__table__, tender_history_archive, TenderHistory.tender_id.in_(tender_ids))
+    _copy_rows(db, Bid.__table__, bid_archive, Bid.tender_id.in_(tender_ids))
+    _copy_rows(db, BidHistory.__table__, bid_history_archive, BidHistory.bid_id.in_(bid_ids))
+    _copy_rows(db, BidDecision.__table__, bid_decision_archive, BidDecision.bid_id.in_(bid_ids))
+    _copy_rows(db, BidFeedback.__table__, bid_feedback_archive, BidFeedback.bid_id.in_(bid_ids))
+
+    # Предложения, решения, отзывы и история удаляются каскадно (ON DELETE CASCADE)
+    db.execute(delete(Tender).where(Tender.id.in_(tender_ids)).execution_options(synchronize_session=False))
+    db.commit()
+
+
+def archive_closed_tenders(db: Session, older_than: timedelta, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    # Срок отсчитывается по часам базы: updated_at заполняет её now()
+    cutoff = database_now(db) - older_than
+    archived = 0
+    while True:
+        tender_ids = db.scalars(
+            select(Tender.id).where(
+                Tender.status == TenderStatus.CLOSED,
+                Tender.updated_at < cutoff
+            ).order_by(Tender.updated_at).limit(batch_size)
+        ).all()
+        if not tender_ids:
+            return archived
+        try:
+            archive_tender_batch(db, tender_ids)
+        except Exception:
+            db.rollback()
+            raise
+        archived += len(tender_ids)
+        if len(tender_ids) < batch_size:
+            return archived
+
+
+def run_archival():
+    # Тендер и все его строки лежат в одном шарде, поэтому каждый шард архивируется сам по себе
+    for session_factory in shard_session_factories:
+        db = session_factory()
+        try:
+            archived = archive_closed_tenders(db, timedelta(days=ARCHIVE_AFTER_DAYS))
+            metrics.inc("archived_tenders_total", value=archived)
+        finally:
+            db.close()
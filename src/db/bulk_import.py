@@ -0,0 +1,407 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import uuid
+from contextlib import ExitStack
+from typing import IO, Iterable, Iterator
+
+from sqlalchemy import Column, Connection, Integer, MetaData, String, Table, cast, exists, func, select, true
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.db.database import engine, engines
+from src.db.models import User, Organization, OrganizationResponsible, OrganizationType
+from src.db.types import UUID
+from src.metrics import metrics
+
+
+# Строк в одной порции COPY/INSERT в промежуточную таблицу
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "10000"))
+# Сколько отклонённых строк перечисляется в отчёте; всего отклонённых считается без ограничения
+IMPORT_REJECTED_REPORT_LIMIT = int(os.getenv("IMPORT_REJECTED_REPORT_LIMIT", "1000"))
+
+EMPLOYEES = "employees"
+ORGANIZATIONS = "organizations"
+RESPONSIBLES = "responsibles"
+CSV = "csv"
+NDJSON = "ndjson"
+# Команда копирования всех справочников с основного шарда на остальные
+SHARDS = "shards"
+
+# Промежуточные таблицы временные: видны только соединению импорта и исчезают с ним.
+# line — номер строки входного файла, по нему строка попадает в отчёт об отклонённых.
+staging_metadata = MetaData()
+
+employee_staging = Table(
+    "employee_import", staging_metadata,
+    Column("line", Integer, primary_key=True),
+    Column("id", UUID(), nullable=False),
+    Column("username", String(50), nullable=False),
+    Column("first_name", String(50), nullable=False),
+    Column("last_name", String(50), nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+organization_staging = Table(
+    "organization_import", staging_metadata,
+    Column("line", Integer, primary_key=True),
+    Column("id", UUID(), nullable=False),
+    Column("name", String(100), nullable=False),
+    Column("description", String),
+    Column("type", String(3)),
+    prefixes=["TEMPORARY"],
+)
+
+responsible_staging = Table(
+    "organization_responsible_import", staging_metadata,
+    Column("line", Integer, primary_key=True),
+    Column("id", UUID(), nullable=False),
+    Column("organization_id", UUID(), nullable=False),
+    Column("username", String(50), nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+
+class ImportReport:
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.received = 0
+        self.created = 0
+        self.updated = 0
+        self.rejected_total = 0
+        self.rejected: list[dict] = []
+
+    def reject(self, line: int, reason: str):
+        self.rejected_total += 1
+        if len(self.rejected) < IMPORT_REJECTED_REPORT_LIMIT:
+            self.rejected.append({"line": line, "reason": reason})
+
+    def as_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "received": self.received,
+            "created": self.created,
+            "updated": self.updated,
+            "rejectedTotal": self.rejected_total,
+            "rejected": sorted(self.rejected, key=lambda item: item["line"]),
+        }
+
+
+def read_records(stream: IO[str], format: str) -> Iterator[tuple[int, dict | None, str | None]]:
+    """Записи входного файла: (номер строки, поля или None, причина, если строку не удалось разобрать)."""
+    if format == CSV:
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            yield line, None, f"invalid JSON: {e}"
+            continue
+        if isinstance(record, dict):
+            yield line, record, None
+        else:
+            yield line, None, "JSON object expected"
+
+
+def text_field(record: dict, key: str, max_length: int | None, required: bool = True) -> str | None:
+    value = record.get(key)
+    value = None if value is None else str(value).strip()
+    if not value:
+        if required:
+            raise ValueError(f"'{key}' is required")
+        return None
+    if max_length is not None and len(value) > max_length:
+        raise ValueError(f"'{key}' is longer than {max_length} characters")
+    return value
+
+
+def uuid_field(record: dict, key: str, required: bool = True) -> uuid.UUID | None:
+    value = text_field(record, key, None, required)
+    if value is None:
+        return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        raise ValueError(f"'{key}' is not a valid UUID")
+
+
+def parse_employee(record: dict) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "username": text_field(record, "username", 50),
+        "first_name": text_field(record, "first_name", 50),
+        "last_name": text_field(record, "last_name", 50),
+    }
+
+
+def parse_organization(record: dict) -> dict:
+    organization_type = text_field(record, "type", None, required=False)
+    if organization_type is not None and organization_type not in OrganizationType.__members__:
+        raise ValueError(f"'type' must be one of {', '.join(OrganizationType.__members__)}")
+    return {
+        # Без id организация создаётся с новым id, с id — создаётся или обновляется
+        "id": uuid_field(record, "id", required=False) or uuid.uuid4(),
+        "name": text_field(record, "name", 100),
+        "description": text_field(record, "description", None, required=False),
+        "type": organization_type,
+    }
+
+
+def parse_responsible(record: dict) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "organization_id": uuid_field(record, "organization_id"),
+        "username": text_field(record, "username", 50),
+    }
+
+
+def copy_rows(connection: Connection, table: Table, rows: list[dict]):
+    """Порция строк в промежуточную таблицу: в PostgreSQL через COPY, в остальных базах — INSERT."""
+    if connection.dialect.name != "postgresql":
+        connection.execute(table.insert(), rows)
+        return
+    columns = [column.name for column in table.columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # Пустое поле без кавычек COPY читает как NULL
+        writer.writerow(["" if row[column] is None else row[column] for column in columns])
+    buffer.seek(0)
+    sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = connection.connection.cursor()
+    try:
+        if connection.dialect.driver == "psycopg":
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+        else:
+            cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+
+def load_staging(connection: Connection, table: Table, parse, records: Iterable, report: ImportReport):
+    batch = []
+    for line, record, error in records:
+        report.received += 1
+        if error is None:
+            try:
+                batch.append({"line": line, **parse(record)})
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            report.reject(line, error)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            copy_rows(connection, table, batch)
+            batch = []
+    if batch:
+        copy_rows(connection, table, batch)
+
+
+def reject_lines(connection: Connection, table: Table, condition, reason: str, report: ImportReport):
+    """Отклоняет строки промежуточной таблицы по условию одним запросом и удаляет их из неё."""
+    lines = connection.scalars(select(table.c.line).where(condition)).all()
+    for line in lines:
+        report.reject(line, reason)
+    if lines:
+        connection.execute(table.delete().where(condition))
+
+
+def duplicate_condition(table: Table, *keys):
+    """Повторы ключа внутри файла: действует последняя строка, предыдущие отклоняются."""
+    later = table.alias("later")
+    return exists().where(*(later.c[key] == table.c[key] for key in keys), later.c.line > table.c.line)
+
+
+def dialect_insert(connection: Connection):
+    # В SQLite INSERT ... SELECT с ON CONFLICT разбирается однозначно, только если у SELECT есть WHERE,
+    # поэтому запросы ниже добавляют WHERE true
+    return postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert
+
+
+def import_employees(connection: Connection, report: ImportReport):
+    staging = employee_staging
+    reject_lines(connection, staging, duplicate_condition(staging, "username"),
+                 "duplicate username, a later line wins", report)
+    report.updated = connection.scalar(
+        select(func.count()).select_from(staging).where(exists().where(User.username == staging.c.username))
+    )
+    query = dialect_insert(connection)(User).from_select(
+        ["id", "username", "first_name", "last_name"],
+        select(staging.c.id, staging.c.username, staging.c.first_name, staging.c.last_name).where(true()),
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[User.username],
+        set_={
+            "first_name": query.excluded.first_name,
+            "last_name": query.excluded.last_name,
+            "updated_at": func.now(),
+        },
+    )
+    report.created = connection.execute(query).rowcount - report.updated
+
+
+def import_organizations(connection: Connection, report: ImportReport):
+    staging = organization_staging
+    reject_lines(connection, staging, duplicate_condition(staging, "id"), "duplicate id, a later line wins", report)
+    report.updated = connection.scalar(
+        select(func.count()).select_from(staging).where(exists().where(Organization.id == staging.c.id))
+    )
+    query = dialect_insert(connection)(Organization).from_select(
+        ["id", "name", "description", "type"],
+        select(staging.c.id, staging.c.name, staging.c.description,
+               cast(staging.c.type, Organization.__table__.c.type.type)).where(true()),
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[Organization.id],
+        set_={
+            "name": query.excluded.name,
+            "description": query.excluded.description,
+            "type": query.excluded.type,
+            "updated_at": func.now(),
+        },
+    )
+    report.created = connection.execute(query).rowcount - report.updated
+
+
+def import_responsibles(connection: Connection, report: ImportReport):
+    staging = responsible_staging
+    reject_lines(connection, staging, ~exists().where(User.username == staging.c.username), "unknown username", report)
+    reject_lines(connection, staging, ~exists().where(Organization.id == staging.c.organization_id),
+                 "unknown organization_id", report)
+    reject_lines(connection, staging, duplicate_condition(staging, "organization_id", "username"),
+                 "duplicate responsibility", report)
+    query = dialect_insert(connection)(OrganizationResponsible).from_select(
+        ["id", "organization_id", "user_id"],
+        select(staging.c.id, staging.c.organization_id, User.id)
+        .join(User, User.username == staging.c.username).where(true()),
+    )
+    # Существующая связь не меняется: у неё нет полей, кроме ключа
+    query = query.on_conflict_do_nothing(index_elements=["organization_id", "user_id"])
+    report.created = connection.execute(query).rowcount
+
+
+def imported_employees():
+    return User.__table__, User.username.in_(select(employee_staging.c.username))
+
+
+def imported_organizations():
+    return Organization.__table__, Organization.id.in_(select(organization_staging.c.id))
+
+
+def imported_responsibles():
+    staging = responsible_staging
+    return OrganizationResponsible.__table__, exists().where(
+        staging.c.organization_id == OrganizationResponsible.organization_id,
+        User.username == staging.c.username,
+        User.id == OrganizationResponsible.user_id,
+    )
+
+
+# Вид импорта: промежуточная таблица, разбор строки, запись и строки справочника, затронутые импортом
+IMPORTS = {
+    EMPLOYEES: (employee_staging, parse_employee, import_employees, imported_employees),
+    ORGANIZATIONS: (organization_staging, parse_organization, import_organizations, imported_organizations),
+    RESPONSIBLES: (responsible_staging, parse_responsible, import_responsibles, imported_responsibles),
+}
+
+# Порядок копирования на шарды: ответственные ссылаются на сотрудников и организации
+REFERENCE_TABLES_ORDER = (User.__table__, Organization.__table__, OrganizationResponsible.__table__)
+
+
+def replicate_rows(connection: Connection, table: Table, condition, replicas: list[Connection]) -> int:
+    """
+    Копирует строки справочника с основного шарда на остальные с теми же id: внешние ключи тендеров
+    и предложений в каждом шарде ссылаются на его собственные справочники.
+    """
+    primary_key = [column.name for column in table.primary_key]
+    copied = 0
+    result = connection.execution_options(yield_per=IMPORT_BATCH_SIZE).execute(select(table).where(condition))
+    for rows in result.partitions():
+        batch = [dict(row._mapping) for row in rows]
+        for replica in replicas:
+            query = dialect_insert(replica)(table)
+            columns = {name: query.excluded[name] for name in batch[0] if name not in primary_key}
+            # У ответственного нет полей, кроме ключей, и существующая связь не меняется
+            if table is OrganizationResponsible.__table__:
+                query = query.on_conflict_do_nothing()
+            else:
+                query = query.on_conflict_do_update(index_elements=primary_key, set_=columns)
+            replica.execute(query, batch)
+        copied += len(batch)
+    return copied
+
+
+def replica_connections(stack: ExitStack) -> list[Connection]:
+    # Транзакции шардов фиксируются раньше основной: при сбое между ними на шардах остаются лишние
+    # строки справочника, а не тендеры без организации; повторный импорт их выравнивает
+    return [stack.enter_context(shard.begin()) for shard in engines[1:]]
+
+
+def sync_reference_shards() -> dict:
+    """Копирует все справочники с основного шарда на остальные, например после включения шардирования."""
+    with ExitStack() as stack:
+        connection = stack.enter_context(engine.connect())
+        replicas = replica_connections(stack)
+        return {table.name: replicate_rows(connection, table, true(), replicas) for table in REFERENCE_TABLES_ORDER}
+
+
+def run_import(kind: str, stream: IO[str], format: str) -> ImportReport:
+    """
+    Массовая загрузка справочников одной транзакцией: строки потоком попадают во временную таблицу,
+    проверки ссылок и повторов и сама запись выполняются запросами над всей таблицей сразу.
+    Строки с ошибками попадают в отчёт, остальные загружаются. Справочники читаются с основного шарда,
+    а записанные строки копируются на остальные шарды.
+    """
+    staging, parse, apply, imported = IMPORTS[kind]
+    report = ImportReport(kind)
+    with ExitStack() as stack:
+        connection = stack.enter_context(engine.begin())
+        replicas = replica_connections(stack)
+        # При ошибке откат транзакции убирает и временную таблицу
+        staging.create(connection)
+        load_staging(connection, staging, parse, read_records(stream, format), report)
+        apply(connection, report)
+        if replicas:
+            replicate_rows(connection, *imported(), replicas)
+        staging.drop(connection)
+    metrics.inc("bulk_import_rows_total", {"kind": kind, "result": "created"}, report.created)
+    metrics.inc("bulk_import_rows_total", {"kind": kind, "result": "updated"}, report.updated)
+    metrics.inc("bulk_import_rows_total", {"kind": kind, "result": "rejected"}, report.rejected_total)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовая загрузка сотрудников, организаций и ответственных.")
+    parser.add_argument("kind", choices=[*IMPORTS, SHARDS],
+                        help=f"Вид импорта; {SHARDS} — скопировать все справочники с шарда 0 на остальные шарды.")
+    parser.add_argument("path", nargs="?", help="Файл CSV или NDJSON; '-' — стандартный ввод.")
+    parser.add_argument("--format", choices=[CSV, NDJSON],
+                        help="Формат файла; по умолчанию определяется по расширению (.csv, .ndjson, .jsonl).")
+    args = parser.parse_args()
+    if args.kind == SHARDS:
+        json.dump(sync_reference_shards(), sys.stdout, indent=2)
+        print()
+        return
+    if args.path is None:
+        parser.error("path is required for an import")
+    format = args.format or (CSV if args.path.endswith(".csv") else NDJSON)
+    if args.path == "-":
+        report = run_import(args.kind, sys.stdin, format)
+    else:
+        with open(args.path, newline="", encoding="utf-8") as stream:
+            report = run_import(args.kind, stream, format)
+    json.dump(report.as_dict(), sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    # Права открытых потоков событий сервер перечитывает сам через EVENTS_PERMISSIONS_REFRESH_SECONDS
+    sys.exit(1 if report.rejected_total else 0)
+
+
+if __name__ == "__main__":
+    main()
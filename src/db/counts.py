@@ -0,0 +1,69 @@
+import json
+import os
+
+from sqlalchemy import select, func, Select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from src.db.sharding import all_shard_arguments
+from src.metrics import metrics
+
+
+# exact - COUNT(*) по фильтру, estimated - оценка планировщика PostgreSQL,
+# auto - оценка, а при оценке до COUNT_EXACT_THRESHOLD строк - точный подсчёт
+EXACT = "exact"
+ESTIMATED = "estimated"
+AUTO = "auto"
+COUNT_EXACT_THRESHOLD = int(os.getenv("COUNT_EXACT_THRESHOLD", "1000"))
+
+
+class ExplainJson(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) для запроса SQLAlchemy: параметры проходят обычную обработку типов."""
+
+    inherit_cache = False
+
+    def __init__(self, statement: Select):
+        self.statement = statement
+
+
+@compiles(ExplainJson, "postgresql")
+def _compile_explain_json(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def unpaginated(query: Select) -> Select:
+    return query.limit(None).offset(None).order_by(None)
+
+
+def exact_count(db: Session, query: Select) -> int:
+    count_query = select(func.count()).select_from(unpaginated(query).subquery())
+    # При шардировании число складывается из чисел всех шардов
+    return sum(db.execute(count_query, bind_arguments=arguments).scalar_one() for arguments in all_shard_arguments())
+
+
+def estimated_count(db: Session, query: Select) -> int | None:
+    """Число строк из плана запроса; без статистики (не PostgreSQL) - None."""
+    if db.get_bind(**all_shard_arguments()[0]).dialect.name != "postgresql":
+        return None
+    total = 0
+    for arguments in all_shard_arguments():
+        plan = db.execute(ExplainJson(unpaginated(query)), bind_arguments=arguments).scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        total += int(plan[0]["Plan"]["Plan Rows"])
+    return total
+
+
+def count_rows(db: Session, query: Select, mode: str) -> tuple[int, str]:
+    """
+    Общее число строк запроса без учёта limit/offset и способ, которым оно получено.
+    Если оценка недоступна, считается точно.
+    """
+    total = estimated_count(db, query) if mode in (ESTIMATED, AUTO) else None
+    if total is None or (mode == AUTO and total <= COUNT_EXACT_THRESHOLD):
+        total, mode = exact_count(db, query), EXACT
+    else:
+        mode = ESTIMATED
+    metrics.inc("total_counts_total", {"mode": mode})
+    return total, mode
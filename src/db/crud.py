@@ -1,39 +1,87 @@
 
-from sqlalchemy import select, update, or_, and_, func
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, delete, or_, func, exists, tuple_, union_all, lambda_stmt, true
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
 from uuid import UUID
 from src.db.models import Tender, User, TenderHistory, Organization, TenderServiceType, OrganizationResponsible, \
-    TenderStatus, Bid, BidStatus, BidHistory, AuthorType, BidDecisionStatus, BidDecision, BidFeedback
+    TenderStatus, Bid, BidStatus, BidHistory, AuthorType, BidDecisionStatus, BidDecision, BidFeedback, IdempotencyKey, \
+    TenderStats
 from src.exceptions import TenderNotFound, UserNotFound, PermissionDenied, TenderVersionNotFound, OrganizationNotFound, \
-    BidNotFound, BidVersionNotFound
+    BidNotFound, BidVersionNotFound, VersionConflict
 from src.db.schemas import TenderCreate, TenderUpdate, BidCreate, BidUpdate
-
+from src.db.archive import tender_archive, bid_archive
+from src.db.counts import count_rows
+from src.db.database import database_now
+from src.db.sharding import sharding_enabled, new_entity_id, fan_out_page, shard_arguments, \
+    primary_shard_arguments
+from src.db.stats import update_tender_stats, update_bid_status_stats, bid_status_column, decision_column
+from src.db.history_journal import journal_enabled, journal_tender_history, journal_bid_history, \
+    journal_bids_history, flush_history_journal
+from src.db.triggers import trigger_versioning_enabled, skip_trigger_versioning
+from src.events import publish_tender_change, publish_bid_change
+
+
+# Частые поиски одной строки собираются через lambda_stmt: SQLAlchemy строит конструкцию и ключ кеша
+# компиляции один раз на место вызова, а в запросе только подставляет параметры из замыкания.
+# Списки собираются обычными select из общих построителей (tenders_query и т.п.), чтобы условия не дублировались
 
 def is_user_responsible_for_organization(db: Session, user_id: UUID, organization_id: UUID) -> bool:
-    query = select(OrganizationResponsible).where(
+    query = lambda_stmt(lambda: select(OrganizationResponsible.id).where(
         OrganizationResponsible.user_id == user_id,
         OrganizationResponsible.organization_id == organization_id
-    )
+    ))
     result = db.execute(query).scalar_one_or_none()
     return result is not None
 
 
 def get_user_by_username(db: Session, username: str) -> User:
-    query = select(User).where(User.username == username)
+    query = lambda_stmt(lambda: select(User).where(User.username == username))
     user = db.execute(query).scalar_one_or_none()
     if not user:
         raise UserNotFound(f"User with username '{username}' not found")
     return user
 
 
-def get_tenders(db: Session, service_type: list[TenderServiceType] | None = None, limit: int = 5, offset: int = 0) -> list[Tender]:
-    query = select(Tender).where(Tender.status == TenderStatus.PUBLISHED).limit(limit).offset(offset).order_by(Tender.name)
+def project(query, entity, attributes: list[str] | None):
+    """Сужает SELECT до перечисленных атрибутов (fields=); без них запрос возвращает объекты целиком."""
+    if not attributes:
+        return query
+    return query.with_only_columns(*[getattr(entity, attribute) for attribute in attributes])
+
+
+def execute_rows(db: Session, query, **execution_options):
+    """Объекты для ORM-запроса к одной сущности, строки — для проекции или запроса к таблице (архиву)."""
+    result = db.execute(query, execution_options=execution_options)
+    descriptions = query.column_descriptions
+    if len(descriptions) == 1 and isinstance(descriptions[0]["type"], type):
+        return result.scalars()
+    return result
+
+
+def tenders_query(service_type: list[TenderServiceType] | None = None):
+    query = select(Tender).where(Tender.status == TenderStatus.PUBLISHED)
     if service_type:
         service_type_values = [st.value.upper() for st in service_type]
         query = query.where(Tender.service_type.in_(service_type_values))
-    return db.scalars(query).all()
+    return query
+
+
+def fetch_page(db: Session, query, entity, order_by: list, limit: int, offset: int, attributes: list[str] | None = None):
+    """Страница списка; при шардировании — слияние страниц всех шардов (проекция fields= не применяется)."""
+    if sharding_enabled():
+        return fan_out_page(db, query, order_by, limit, offset)
+    return execute_rows(db, project(query.order_by(*order_by).limit(limit).offset(offset), entity, attributes)).all()
+
+
+def get_tenders(db: Session, service_type: list[TenderServiceType] | None = None, limit: int = 5, offset: int = 0,
+                attributes: list[str] | None = None) -> list[Tender]:
+    return fetch_page(db, tenders_query(service_type), Tender, [Tender.name], limit, offset, attributes)
 
 
+def count_tenders(db: Session, service_type: list[TenderServiceType] | None, mode: str) -> tuple[int, str]:
+    return count_rows(db, tenders_query(service_type), mode)
+
 
 def get_tender_by_id(db: Session, tender_id: UUID) -> Tender:
     tender = db.get(Tender, tender_id)
@@ -42,7 +90,18 @@ def get_tender_by_id(db: Session, tender_id: UUID) -> Tender:
     return tender
 
 
-def create_tender(db: Session, tender_data: TenderCreate) -> Tender:
+def get_archived_tender(db: Session, tender_id: UUID):
+    return db.execute(select(tender_archive).where(tender_archive.c.id == tender_id)).one_or_none()
+
+
+def get_archived_bid(db: Session, bid_id: UUID):
+    query = select(bid_archive, tender_archive.c.organization_id).join(
+        tender_archive, tender_archive.c.id == bid_archive.c.tender_id
+    ).where(bid_archive.c.id == bid_id)
+    return db.execute(query).one_or_none()
+
+
+def create_tender(db: Session, tender_data: TenderCreate, commit: bool = True) -> Tender:
     user = get_user_by_username(db, tender_data.creatorUsername)
 
     organization = db.get(Organization, tender_data.organizationId)
@@ -53,6 +112,7 @@ def create_tender(db: Session, tender_data: TenderCreate) -> Tender:
         raise PermissionDenied(f"User '{tender_data.creatorUsername}' does not have permission to create tender for this organization")
 
     tender = Tender(
+        id=new_entity_id(tender_data.organizationId),
         name=tender_data.name,
         description=tender_data.description,
         service_type=tender_data.serviceType.value.upper(),
@@ -60,30 +120,65 @@ def create_tender(db: Session, tender_data: TenderCreate) -> Tender:
         status=TenderStatus.CREATED
     )
     db.add(tender)
-    db.commit()
+    # commit=False оставляет транзакцию открытой: вызывающий фиксирует тендер вместе со своими строками
+    if commit:
+        db.commit()
+    else:
+        db.flush()
     db.refresh(tender)
     return tender
 
 
-def get_tenders_by_user(db: Session, username: str, limit: int = 5, offset: int = 0) -> list[Tender]:
+def get_tenders_by_user(db: Session, username: str, limit: int = 5, offset: int = 0,
+                        attributes: list[str] | None = None) -> list[Tender]:
     user = get_user_by_username(db, username)
+    return fetch_page(db, tenders_by_user_query(user.id), Tender, [Tender.name], limit, offset, attributes)
 
-    query = select(Tender).join(Tender.organization).join(OrganizationResponsible).where(
-        OrganizationResponsible.user_id == user.id
+
+def tenders_by_user_query(user_id: UUID):
+    return select(Tender).join(Tender.organization).join(OrganizationResponsible).where(
+        OrganizationResponsible.user_id == user_id
     )
-    return db.scalars(query.limit(limit).offset(offset).order_by(Tender.name)).all()
+
+
+def count_tenders_by_user(db: Session, username: str, mode: str) -> tuple[int, str]:
+    user = get_user_by_username(db, username)
+    return count_rows(db, tenders_by_user_query(user.id), mode)
 
 
 
 def get_tender_status(db: Session, tender_id: UUID, username: str) -> TenderStatus:
     user = get_user_by_username(db, username)
-    tender = get_tender_by_id(db, tender_id)
+    # Закрытые тендеры могли быть перенесены в архив
+    tender = db.get(Tender, tender_id) or get_archived_tender(db, tender_id)
+    if tender is None:
+        raise TenderNotFound(f"Tender with id {tender_id} not found.")
     if tender.status != TenderStatus.PUBLISHED:
         if not is_user_responsible_for_organization(db, user.id, tender.organization_id):
             raise PermissionDenied(f"User '{username}' does not have permission to view the status of this tender")
     return tender.status
 
+def responsible_organizations_query(user_id: UUID):
+    return select(OrganizationResponsible.organization_id).where(OrganizationResponsible.user_id == user_id)
+
+
+def get_tender_statuses(db: Session, tender_ids: list[UUID], username: str):
+    """Статусы и версии видимых пользователю тендеров: два запроса независимо от размера списка."""
+    user = get_user_by_username(db, username)
+    query = select(Tender.id, Tender.status, Tender.version).where(
+        Tender.id.in_(tender_ids),
+        or_(
+            Tender.status == TenderStatus.PUBLISHED,
+            Tender.organization_id.in_(responsible_organizations_query(user.id))
+        )
+    )
+    return db.execute(query).all()
+
+
 def save_tender_history(db: Session, tender: Tender):
+    if journal_enabled():
+        journal_tender_history(db, tender)
+        return
     history = TenderHistory(
         tender_id=tender.id,
         name=tender.name,
@@ -93,10 +188,60 @@ def save_tender_history(db: Session, tender: Tender):
         version=tender.version
     )
     db.add(history)
+
+
+def history_period(db: Session, history, entity: Tender | Bid):
+    """
+    Версии сущности записаны не раньше её создания и не позже последнего изменения (now() в PostgreSQL
+    одно на транзакцию), поэтому условие на created_at оставляет только секции истории этого периода.
+    В SQLite секций нет, а now() вычисляется для каждого запроса, поэтому условие не добавляется.
+    """
+    if db.get_bind(**shard_arguments(entity.id)).dialect.name != "postgresql":
+        return true()
+    return history.created_at.between(entity.created_at, entity.updated_at)
+
+
+def check_expected_version(entity: Tender | Bid, expected_version: int | None):
+    if expected_version is not None and entity.version != expected_version:
+        raise VersionConflict(
+            f"Version mismatch for '{entity.id}': expected {expected_version}, current {entity.version}"
+        )
+
+
+def apply_tender_update(db: Session, tender: Tender, values: dict, expected_version: int | None = None) -> Tender:
+    """
+    Сохраняет текущую версию тендера в историю и применяет изменения одной транзакцией.
+    Если передан expected_version, UPDATE выполняется только при совпадении версии (compare-and-swap).
+    В режиме VERSIONING_MODE=trigger историю и версию ведёт триггер, и остаётся один UPDATE.
+    Закрытие тендера в той же транзакции отменяет его открытые предложения.
+    """
+    check_expected_version(tender, expected_version)
+    if not trigger_versioning_enabled():
+        save_tender_history(db, tender)
+        values = {**values, "version": Tender.version + 1}
+
+    query = update(Tender).where(Tender.id == tender.id)
+    if expected_version is not None:
+        query = query.where(Tender.version == expected_version)
+    query = query.values(**values).execution_options(synchronize_session="fetch")
+
+    if db.execute(query).rowcount == 0:
+        db.rollback()
+        raise VersionConflict(f"Tender '{tender.id}' was modified concurrently, expected version {expected_version}")
+    canceled_bids = []
+    # Статус приходит именем члена перечисления ("CLOSED") или членом из истории
+    if values.get("status") in (TenderStatus.CLOSED, TenderStatus.CLOSED.name):
+        canceled_bids = cancel_open_bids(db, tender)
     db.commit()
+    db.refresh(tender)
+    publish_tender_change(tender)
+    for canceled_bid in canceled_bids:
+        publish_bid_change(canceled_bid, tender.organization_id)
+    return tender
 
 
-def update_tender(db: Session, tender_id: UUID, tender_data: TenderUpdate, username: str) -> Tender:
+def update_tender(db: Session, tender_id: UUID, tender_data: TenderUpdate, username: str,
+                  expected_version: int | None = None) -> Tender:
     user = get_user_by_username(db, username)
     tender = get_tender_by_id(db, tender_id)
 
@@ -112,71 +257,101 @@ def update_tender(db: Session, tender_id: UUID, tender_data: TenderUpdate, usern
         update_values["service_type"] = tender_data.serviceType.value.upper()
 
     if update_values:
-        update_values["version"] = tender.version + 1
-
-        save_tender_history(db, tender)
-        query = update(Tender).where(Tender.id == tender_id).values(update_values).execution_options(
-            synchronize_session="fetch")
-        db.execute(query)
-        db.commit()
-        db.refresh(tender)
+        return apply_tender_update(db, tender, update_values, expected_version)
 
+    check_expected_version(tender, expected_version)
     return tender
 
 
-def update_tender_status(db: Session, tender_id: UUID, new_status: TenderStatus, username: str) -> Tender:
+def update_tender_status(db: Session, tender_id: UUID, new_status: TenderStatus, username: str,
+                         expected_version: int | None = None) -> Tender:
     user = get_user_by_username(db, username)
     tender = get_tender_by_id(db, tender_id)
 
     if not is_user_responsible_for_organization(db, user.id, tender.organization_id):
         raise PermissionDenied(f"User '{username}' does not have permission to update the status of this tender")
 
-    save_tender_history(db, tender)
-    query = update(Tender).where(Tender.id == tender_id).values(
-        status=new_status.value.upper(),
-        version=tender.version + 1
-    ).execution_options(synchronize_session="fetch")
-    db.execute(query)
-    db.commit()
-    db.refresh(tender)
-
-    return tender
+    return apply_tender_update(db, tender, {"status": new_status.value.upper()}, expected_version)
 
 
-def rollback_tender_version(db: Session, tender_id: UUID, version: int, username: str) -> Tender:
+def rollback_tender_version(db: Session, tender_id: UUID, version: int, username: str,
+                            expected_version: int | None = None) -> Tender:
     user = get_user_by_username(db, username)
     tender = get_tender_by_id(db, tender_id)
 
     if not is_user_responsible_for_organization(db, user.id, tender.organization_id):
         raise PermissionDenied(f"User '{username}' does not have permission to rollback this tender")
 
+    if journal_enabled():
+        flush_history_journal(db, [tender_id])
+
     query = select(TenderHistory).where(
         TenderHistory.tender_id == tender_id,
-        TenderHistory.version == version
+        TenderHistory.version == version,
+        history_period(db, TenderHistory, tender)
     )
     history_record = db.execute(query).scalar_one_or_none()
 
     if not history_record:
         raise TenderVersionNotFound(f"Tender version '{version}' not found for tender ID '{tender_id}'")
 
-    save_tender_history(db, tender)
-    query = update(Tender).where(Tender.id == tender_id).values(
-        name=history_record.name,
-        description=history_record.description,
-        service_type=history_record.service_type,
-        status=history_record.status,
-        version=tender.version + 1
-    ).execution_options(synchronize_session="fetch")
-    db.execute(query)
-    db.commit()
-    db.refresh(tender)
+    return apply_tender_update(db, tender, {
+        "name": history_record.name,
+        "description": history_record.description,
+        "service_type": history_record.service_type,
+        "status": history_record.status,
+    }, expected_version)
+
+
+def get_tender_stats(db: Session, tender_id: UUID, username: str) -> TenderStats:
+    """Сводка тендера для ответственных организации; тендер без изменений получает нулевую сводку."""
+    user = get_user_by_username(db, username)
+    tender = db.get(Tender, tender_id) or get_archived_tender(db, tender_id)
+    if tender is None:
+        raise TenderNotFound(f"Tender with id {tender_id} not found.")
+    if not is_user_responsible_for_organization(db, user.id, tender.organization_id):
+        raise PermissionDenied(f"User '{username}' does not have permission to view the statistics of this tender")
+    stats = db.get(TenderStats, tender_id)
+    if stats is None:
+        stats = TenderStats(tender_id=tender_id, bids_created=0, bids_published=0, bids_canceled=0,
+                            decisions_approved=0, decisions_rejected=0, feedbacks=0)
+    return stats
+
+
+def get_tender_for_history(db: Session, tender_id: UUID, username: str) -> Tender:
+    """Тендер, историю которого может читать пользователь; журнал истории тендера предварительно переносится."""
+    user = get_user_by_username(db, username)
+    tender = get_tender_by_id(db, tender_id)
+
+    if not is_user_responsible_for_organization(db, user.id, tender.organization_id):
+        raise PermissionDenied(f"User '{username}' does not have permission to view the history of this tender")
+
+    if journal_enabled() and flush_history_journal(db, [tender_id]):
+        db.commit()
     return tender
 
 
+def get_tender_history(db: Session, tender: Tender, limit: int, offset: int):
+    query = select(TenderHistory).where(
+        TenderHistory.tender_id == tender.id,
+        history_period(db, TenderHistory, tender)
+    ).order_by(TenderHistory.version).limit(limit).offset(offset)
+    return db.scalars(query).all()
+
 
+def get_tender_history_versions(db: Session, tender: Tender, versions: list[int]):
+    query = select(TenderHistory).where(
+        TenderHistory.tender_id == tender.id,
+        TenderHistory.version.in_(versions),
+        history_period(db, TenderHistory, tender)
+    )
+    return db.scalars(query).all()
 
 
-def create_bid(db: Session, bid_data: BidCreate) -> Bid:
+
+
+
+def create_bid(db: Session, bid_data: BidCreate, commit: bool = True) -> Bid:
     user = db.get(User, bid_data.authorId)
     tender = db.get(Tender, bid_data.tenderId)
 
@@ -189,6 +364,7 @@ def create_bid(db: Session, bid_data: BidCreate) -> Bid:
             raise PermissionDenied(f"User '{user.username}' does not have permission to create bids from an organization")
 
     bid = Bid(
+        id=new_entity_id(bid_data.tenderId),
         name=bid_data.name,
         description=bid_data.description,
         tender_id=bid_data.tenderId,
@@ -197,36 +373,59 @@ def create_bid(db: Session, bid_data: BidCreate) -> Bid:
         author_id=bid_data.authorId,
     )
     db.add(bid)
-    db.commit()
+    update_tender_stats(db, tender.id, **{bid_status_column(BidStatus.CREATED): 1})
+    if commit:
+        db.commit()
+    else:
+        db.flush()
     db.refresh(bid)
     return bid
 
 
 
-def get_bids_by_user(db: Session, username: str, limit: int = 5, offset: int = 0) -> list[Bid]:
-    user = get_user_by_username(db, username)
+def user_bids(user_id: UUID):
+    responsible_orgs = responsible_organizations_query(user_id)
+    # Вместо OR по двум условиям — UNION ALL веток, каждая из которых читает
+    # индекс bid(author_type, author_id, name, id) по своему префиксу
+    return aliased(Bid, union_all(
+        select(Bid).where(Bid.author_type == AuthorType.USER, Bid.author_id == user_id),
+        select(Bid).where(Bid.author_type == AuthorType.ORGANIZATION, Bid.author_id == user_id),
+        # Ответственный за организацию предложения
+        select(Bid).where(Bid.author_type == AuthorType.ORGANIZATION, Bid.author_id.in_(responsible_orgs)),
+    ).subquery("my_bids"))
 
-    responsible_orgs_query = select(OrganizationResponsible.organization_id).where(
-        OrganizationResponsible.user_id == user.id
-    )
-    responsible_orgs = db.scalars(responsible_orgs_query).all()
 
-    query = select(Bid).where(
-        or_(
-            Bid.author_id == user.id,
-            and_(Bid.author_type == AuthorType.ORGANIZATION, Bid.author_id.in_(responsible_orgs))  # Ответственный за организацию предложения
-        )
-    ).limit(limit).offset(offset).order_by(Bid.name)
+def bids_by_user_query(user_id: UUID, limit: int = 5, offset: int = 0, attributes: list[str] | None = None):
+    my_bids = user_bids(user_id)
+    return project(select(my_bids).order_by(my_bids.name, my_bids.id).limit(limit).offset(offset), my_bids, attributes)
 
-    return db.scalars(query).all()
+
+def get_bids_by_user(db: Session, username: str, limit: int = 5, offset: int = 0,
+                     attributes: list[str] | None = None) -> list[Bid]:
+    user = get_user_by_username(db, username)
+    my_bids = user_bids(user.id)
+    return fetch_page(db, select(my_bids), my_bids, [my_bids.name, my_bids.id], limit, offset, attributes)
 
 
-def get_bids_for_tender(db: Session, tender_id: UUID, username: str, limit: int = 5, offset: int = 0) -> list[Bid]:
+def count_bids_by_user(db: Session, username: str, mode: str) -> tuple[int, str]:
+    user = get_user_by_username(db, username)
+    return count_rows(db, bids_by_user_query(user.id), mode)
+
+
+def tender_bids_query(db: Session, tender_id: UUID, username: str, limit: int = 5, offset: int = 0,
+                      attributes: list[str] | None = None):
+    """
+    Запрос видимых пользователю предложений тендера; пользователь и тендер проверяются сразу.
+    Для архивного тендера запрос читает архив и возвращает строки, а не объекты Bid.
+    """
     user = get_user_by_username(db, username)
     tender = db.get(Tender, tender_id)
 
     if not tender:
-        raise TenderNotFound(f"Tender with id {tender_id} not found")
+        archived_tender = get_archived_tender(db, tender_id)
+        if not archived_tender:
+            raise TenderNotFound(f"Tender with id {tender_id} not found")
+        return project(archived_bids_for_tender_query(db, archived_tender, user, limit, offset), bid_archive.c, attributes)
 
     is_responsible = is_user_responsible_for_organization(db, user.id, tender.organization_id)
     query = select(Bid).where(
@@ -238,18 +437,44 @@ def get_bids_for_tender(db: Session, tender_id: UUID, username: str, limit: int
             is_responsible
         )
     ).limit(limit).offset(offset).order_by(Bid.name)
+    return project(query, Bid, attributes)
 
-    return db.scalars(query).all()
+
+def get_bids_for_tender(db: Session, tender_id: UUID, username: str, limit: int = 5, offset: int = 0,
+                        attributes: list[str] | None = None) -> list[Bid]:
+    return execute_rows(db, tender_bids_query(db, tender_id, username, limit, offset, attributes)).all()
+
+
+def count_bids_for_tender(db: Session, tender_id: UUID, username: str, mode: str) -> tuple[int, str]:
+    return count_rows(db, tender_bids_query(db, tender_id, username), mode)
+
+
+def archived_bids_for_tender_query(db: Session, archived_tender, user: User, limit: int = 5, offset: int = 0):
+    is_responsible = is_user_responsible_for_organization(db, user.id, archived_tender.organization_id)
+    return select(bid_archive).where(
+        bid_archive.c.tender_id == archived_tender.id
+    ).where(
+        or_(
+            bid_archive.c.status == BidStatus.PUBLISHED,
+            bid_archive.c.author_id == user.id,
+            is_responsible
+        )
+    ).limit(limit).offset(offset).order_by(bid_archive.c.name)
 
 
 def get_bid_status(db: Session, bid_id: UUID, username: str) -> BidStatus:
     user = get_user_by_username(db, username)
     bid = db.get(Bid, bid_id)
 
-    if not bid:
-        raise BidNotFound(f"Bid with id {bid_id} not found")
+    if bid:
+        organization_id = bid.tender.organization_id
+    else:
+        bid = get_archived_bid(db, bid_id)
+        if not bid:
+            raise BidNotFound(f"Bid with id {bid_id} not found")
+        organization_id = bid.organization_id
 
-    is_responsible = is_user_responsible_for_organization(db, user.id, bid.tender.organization_id)
+    is_responsible = is_user_responsible_for_organization(db, user.id, organization_id)
 
     if bid.status == BidStatus.PUBLISHED or bid.author_id == user.id or is_responsible:
         return bid.status
@@ -258,7 +483,24 @@ def get_bid_status(db: Session, bid_id: UUID, username: str) -> BidStatus:
 
 
 
+def get_bid_statuses(db: Session, bid_ids: list[UUID], username: str):
+    """Статусы и версии видимых пользователю предложений: два запроса независимо от размера списка."""
+    user = get_user_by_username(db, username)
+    query = select(Bid.id, Bid.status, Bid.version).join(Tender, Tender.id == Bid.tender_id).where(
+        Bid.id.in_(bid_ids),
+        or_(
+            Bid.status == BidStatus.PUBLISHED,
+            Bid.author_id == user.id,
+            Tender.organization_id.in_(responsible_organizations_query(user.id))
+        )
+    )
+    return db.execute(query).all()
+
+
 def save_bid_history(db: Session, bid: Bid):
+    if journal_enabled():
+        journal_bid_history(db, bid)
+        return
     history = BidHistory(
         bid_id=bid.id,
         name=bid.name,
@@ -267,10 +509,92 @@ def save_bid_history(db: Session, bid: Bid):
         version=bid.version
     )
     db.add(history)
+
+
+def cancel_open_bids(db: Session, tender: Tender, keep_bid_id: UUID | None = None) -> list:
+    """
+    Отменяет открытые предложения закрываемого тендера (кроме keep_bid_id): выборка с блокировкой,
+    многострочная вставка истории и один UPDATE с новыми версиями независимо от числа предложений.
+    Транзакцию не фиксирует; возвращает отменённые предложения (id, status, version, tender_id,
+    author_id) для событий после фиксации.
+    """
+    bind_arguments = shard_arguments(tender.id)
+    query = select(Bid.id, Bid.name, Bid.description, Bid.status, Bid.version).where(
+        Bid.tender_id == tender.id,
+        Bid.status.in_([BidStatus.CREATED, BidStatus.PUBLISHED])
+    )
+    if keep_bid_id is not None:
+        query = query.where(Bid.id != keep_bid_id)
+    open_bids = db.execute(query.with_for_update(), bind_arguments=bind_arguments).all()
+    if not open_bids:
+        return []
+
+    values = {"status": BidStatus.CANCELED}
+    if not trigger_versioning_enabled():
+        if journal_enabled():
+            journal_bids_history(db, tender.id, open_bids)
+        else:
+            # Core-вставка в таблицу: многострочный INSERT, который ShardedSession выполняет в шарде из bind_arguments
+            db.execute(insert(BidHistory.__table__), [
+                {"bid_id": bid.id, "name": bid.name, "description": bid.description, "status": bid.status,
+                 "version": bid.version}
+                for bid in open_bids
+            ], bind_arguments=bind_arguments)
+        values["version"] = Bid.version + 1
+
+    # Объекты сессии устаревают при фиксации транзакции, синхронизировать их не нужно
+    canceled_bids = db.execute(
+        update(Bid).where(Bid.id.in_([bid.id for bid in open_bids])).values(**values)
+        .returning(Bid.id, Bid.status, Bid.version, Bid.tender_id, Bid.author_id)
+        .execution_options(synchronize_session=False),
+        bind_arguments=bind_arguments
+    ).all()
+
+    deltas = {bid_status_column(BidStatus.CANCELED): len(open_bids)}
+    for bid in open_bids:
+        deltas[bid_status_column(bid.status)] = deltas.get(bid_status_column(bid.status), 0) - 1
+    update_tender_stats(db, tender.id, **deltas)
+    return canceled_bids
+
+
+def locked_bid_status(db: Session, bid_id: UUID) -> BidStatus:
+    """Текущий статус предложения с блокировкой строки до конца транзакции: сводка тендера не разойдётся с данными."""
+    return db.scalar(select(Bid.status).where(Bid.id == bid_id).with_for_update())
+
+
+def apply_bid_update(db: Session, bid: Bid, values: dict, expected_version: int | None = None) -> Bid:
+    """
+    Сохраняет текущую версию предложения в историю и применяет изменения одной транзакцией.
+    Если передан expected_version, UPDATE выполняется только при совпадении версии (compare-and-swap).
+    В режиме VERSIONING_MODE=trigger историю и версию ведёт триггер, и остаётся один UPDATE.
+    """
+    check_expected_version(bid, expected_version)
+    organization_id = bid.tender.organization_id
+    old_status = locked_bid_status(db, bid.id) if "status" in values else None
+    if not trigger_versioning_enabled():
+        save_bid_history(db, bid)
+        values = {**values, "version": Bid.version + 1}
+
+    query = update(Bid).where(Bid.id == bid.id)
+    if expected_version is not None:
+        query = query.where(Bid.version == expected_version)
+    query = query.values(**values).execution_options(synchronize_session="fetch")
+
+    if db.execute(query).rowcount == 0:
+        db.rollback()
+        raise VersionConflict(f"Bid '{bid.id}' was modified concurrently, expected version {expected_version}")
+    if old_status is not None:
+        # Статус приходит именем члена перечисления ("PUBLISHED") или членом из истории
+        new_status = values["status"] if isinstance(values["status"], BidStatus) else BidStatus[values["status"]]
+        update_bid_status_stats(db, bid.tender_id, old_status, new_status)
     db.commit()
+    db.refresh(bid)
+    publish_bid_change(bid, organization_id)
+    return bid
 
 
-def update_bid(db: Session, bid_id: UUID, bid_data: BidUpdate, username: str) -> Bid:
+def update_bid(db: Session, bid_id: UUID, bid_data: BidUpdate, username: str,
+               expected_version: int | None = None) -> Bid:
     user = get_user_by_username(db, username)
     bid = db.get(Bid, bid_id)
 
@@ -289,19 +613,15 @@ def update_bid(db: Session, bid_id: UUID, bid_data: BidUpdate, username: str) ->
         update_values["description"] = bid_data.description
 
     if update_values:
-        save_bid_history(db, bid)
-        update_values["version"] = bid.version + 1
-
-        query = update(Bid).where(Bid.id == bid_id).values(update_values).execution_options(synchronize_session="fetch")
-        db.execute(query)
-        db.commit()
-        db.refresh(bid)
+        return apply_bid_update(db, bid, update_values, expected_version)
 
+    check_expected_version(bid, expected_version)
     return bid
 
 
 
-def update_bid_status(db: Session, bid_id: UUID, new_status: BidStatus, username: str) -> Bid:
+def update_bid_status(db: Session, bid_id: UUID, new_status: BidStatus, username: str,
+                      expected_version: int | None = None) -> Bid:
     user = get_user_by_username(db, username)
     bid = db.get(Bid, bid_id)
 
@@ -313,21 +633,12 @@ def update_bid_status(db: Session, bid_id: UUID, new_status: BidStatus, username
     if bid.author_id != user.id and not is_responsible:
         raise PermissionDenied(f"User '{username}' does not have permission to update the status of this bid")
 
-    save_bid_history(db, bid)
-
-    query = update(Bid).where(Bid.id == bid_id).values(
-        status=new_status.value.upper(),
-        version=bid.version + 1
-    ).execution_options(synchronize_session="fetch")
-    db.execute(query)
-    db.commit()
-    db.refresh(bid)
-
-    return bid
+    return apply_bid_update(db, bid, {"status": new_status.value.upper()}, expected_version)
 
 
 
-def rollback_bid_version(db: Session, bid_id: UUID, version: int, username: str) -> Bid:
+def rollback_bid_version(db: Session, bid_id: UUID, version: int, username: str,
+                         expected_version: int | None = None) -> Bid:
     user = get_user_by_username(db, username)
     bid = db.get(Bid, bid_id)
 
@@ -339,31 +650,62 @@ def rollback_bid_version(db: Session, bid_id: UUID, version: int, username: str)
     if bid.author_id != user.id and not is_responsible:
         raise PermissionDenied(f"User '{username}' does not have permission to rollback this bid")
 
+    if journal_enabled():
+        flush_history_journal(db, [bid_id])
+
     query = select(BidHistory).where(
         BidHistory.bid_id == bid_id,
-        BidHistory.version == version
+        BidHistory.version == version,
+        history_period(db, BidHistory, bid)
     )
     history_record = db.execute(query).scalar_one_or_none()
 
     if not history_record:
         raise BidVersionNotFound(f"Bid version '{version}' not found for bid ID '{bid_id}'")
 
-    save_bid_history(db, bid)
-
     # Откат предложения к указанной версии и инкремент новой версии
-    query = update(Bid).where(Bid.id == bid_id).values(
-        name=history_record.name,
-        description=history_record.description,
-        status=history_record.status,
-        version=bid.version + 1
-    ).execution_options(synchronize_session="fetch")
-    db.execute(query)
-    db.commit()
-    db.refresh(bid)
+    return apply_bid_update(db, bid, {
+        "name": history_record.name,
+        "description": history_record.description,
+        "status": history_record.status,
+    }, expected_version)
+
+
+def get_bid_for_history(db: Session, bid_id: UUID, username: str) -> Bid:
+    """Предложение, историю которого может читать пользователь; журнал истории предложения предварительно переносится."""
+    user = get_user_by_username(db, username)
+    bid = db.get(Bid, bid_id)
 
+    if not bid:
+        raise BidNotFound(f"Bid with id {bid_id} not found")
+
+    is_responsible = is_user_responsible_for_organization(db, user.id, bid.tender.organization_id)
+
+    if bid.author_id != user.id and not is_responsible:
+        raise PermissionDenied(f"User '{username}' does not have permission to view the history of this bid")
+
+    if journal_enabled() and flush_history_journal(db, [bid_id]):
+        db.commit()
     return bid
 
 
+def get_bid_history(db: Session, bid: Bid, limit: int, offset: int):
+    query = select(BidHistory).where(
+        BidHistory.bid_id == bid.id,
+        history_period(db, BidHistory, bid)
+    ).order_by(BidHistory.version).limit(limit).offset(offset)
+    return db.scalars(query).all()
+
+
+def get_bid_history_versions(db: Session, bid: Bid, versions: list[int]):
+    query = select(BidHistory).where(
+        BidHistory.bid_id == bid.id,
+        BidHistory.version.in_(versions),
+        history_period(db, BidHistory, bid)
+    )
+    return db.scalars(query).all()
+
+
 def submit_bid_decision(db: Session, bid_id: UUID, decision: BidDecisionStatus, username: str) -> Bid:
     user = get_user_by_username(db, username)
     bid = db.get(Bid, bid_id)
@@ -371,7 +713,8 @@ def submit_bid_decision(db: Session, bid_id: UUID, decision: BidDecisionStatus,
     if not bid:
         raise BidNotFound(f"Bid with id {bid_id} not found")
 
-    if not is_user_responsible_for_organization(db, user.id, bid.tender.organization_id):
+    organization_id = bid.tender.organization_id
+    if not is_user_responsible_for_organization(db, user.id, organization_id):
         raise PermissionDenied(f"User '{username}' does not have permission to make decisions on this bid")
 
     bid_decision = BidDecision(
@@ -380,6 +723,7 @@ def submit_bid_decision(db: Session, bid_id: UUID, decision: BidDecisionStatus,
         decision=decision
     )
     db.add(bid_decision)
+    update_tender_stats(db, bid.tender_id, **{decision_column(decision): 1})
     db.commit()
 
     rejected_decision = db.scalars(
@@ -387,13 +731,17 @@ def submit_bid_decision(db: Session, bid_id: UUID, decision: BidDecisionStatus,
     ).one_or_none()
 
     if rejected_decision:
+        # Статус по решению меняется без новой версии
+        skip_trigger_versioning(db, bid.id)
+        update_bid_status_stats(db, bid.tender_id, locked_bid_status(db, bid.id), BidStatus.CANCELED)
         bid.status = BidStatus.CANCELED
         db.commit()
+        publish_bid_change(bid, organization_id)
         return bid
 
     responsible_count = db.scalar(
         select(func.count()).select_from(OrganizationResponsible).where(
-            OrganizationResponsible.organization_id == bid.tender.organization_id
+            OrganizationResponsible.organization_id == organization_id
         )
     )
 
@@ -405,8 +753,14 @@ def submit_bid_decision(db: Session, bid_id: UUID, decision: BidDecisionStatus,
     )
 
     if approved_count >= quorum:
+        # Остальные предложения отменяются с новыми версиями до отключения триггера
+        canceled_bids = cancel_open_bids(db, bid.tender, keep_bid_id=bid.id)
+        skip_trigger_versioning(db, bid.id)
         bid.tender.status = TenderStatus.CLOSED
         db.commit()
+        publish_tender_change(bid.tender)
+        for canceled_bid in canceled_bids:
+            publish_bid_change(canceled_bid, organization_id)
 
     return bid
 
@@ -427,6 +781,7 @@ def submit_bid_feedback(db: Session, bid_id: UUID, feedback_text: str, username:
         feedback=feedback_text
     )
     db.add(feedback)
+    update_tender_stats(db, bid.tender_id, feedbacks=1)
     db.commit()
 
     db.refresh(bid)
@@ -434,7 +789,7 @@ def submit_bid_feedback(db: Session, bid_id: UUID, feedback_text: str, username:
 
 
 def get_bid_feedbacks(db: Session, tender_id: UUID, author_username: str, requester_username: str, limit: int = 5,
-                      offset: int = 0) -> list[BidFeedback]:
+                      offset: int = 0, after: tuple[datetime, UUID] | None = None) -> list[BidFeedback]:
     requester = get_user_by_username(db, requester_username)
     author = get_user_by_username(db, author_username)
 
@@ -445,22 +800,88 @@ def get_bid_feedbacks(db: Session, tender_id: UUID, author_username: str, reques
     if not is_user_responsible_for_organization(db, requester.id, tender.organization_id):
         raise PermissionDenied(f"User '{requester_username}' does not have permission to view feedback for this tender")
 
-    bids_query = select(Bid).where(
+    # Один запрос по индексам bid(tender_id, author_id) и bid_feedback(bid_id, created_at, id)
+    # вместо загрузки всех предложений автора и длинного IN (...)
+    feedback_query = select(BidFeedback).join(Bid, Bid.id == BidFeedback.bid_id).where(
+        Bid.tender_id == tender_id,
         Bid.author_id == author.id
-    )
-    bids = db.scalars(bids_query).all()
-
-    if not bids:
-        raise BidNotFound(f"No bids found for author '{author_username}'")
+    ).order_by(BidFeedback.created_at, BidFeedback.id).limit(limit)
 
-    feedback_query = select(BidFeedback).where(
-        BidFeedback.bid_id.in_([bid.id for bid in bids])
-    ).limit(limit).offset(offset)
+    if after is not None:
+        # Keyset-пагинация: следующая страница начинается строго после последнего отзыва предыдущей
+        feedback_query = feedback_query.where(tuple_(BidFeedback.created_at, BidFeedback.id) > tuple_(*after))
+    else:
+        feedback_query = feedback_query.offset(offset)
 
     feedbacks = db.scalars(feedback_query).all()
 
+    if not feedbacks and after is None and offset == 0:
+        has_bids = db.scalar(select(exists().where(Bid.tender_id == tender_id, Bid.author_id == author.id)))
+        if not has_bids:
+            raise BidNotFound(f"No bids found for author '{author_username}' in tender '{tender_id}'")
+
     return feedbacks
 
 
+def claim_idempotency_key(db: Session, endpoint: str, key: str, request_hash: str, ttl: timedelta,
+                          pending_timeout: timedelta) -> IdempotencyKey | None:
+    """
+    Пытается занять ключ идемпотентности. Возвращает None, если ключ занят этим запросом,
+    иначе — существующую запись (завершённую или ещё выполняющуюся).
+    Одновременные повторы разрешаются уникальным первичным ключом, без блокировок.
+    """
+    for _ in range(2):
+        # Сроки ключа по часам базы, как и у остальных отметок времени
+        now = database_now(db, **primary_shard_arguments())
+        db.add(IdempotencyKey(endpoint=endpoint, key=key, request_hash=request_hash, created_at=now,
+                              expires_at=now + ttl))
+        try:
+            db.commit()
+            return None
+        except IntegrityError:
+            db.rollback()
+
+        existing = db.get(IdempotencyKey, (endpoint, key))
+        if existing is None:
+            continue
+        # Ответ сохраняется в транзакции создания сущности, поэтому незавершённый ключ означает, что она
+        # не создана, и запрос можно выполнить заново. С шардами сущность и ключ в разных базах и
+        # фиксируются не атомарно: брошенный ключ не переиспользуется, пока не истечёт
+        is_abandoned = existing.response_status is None and existing.created_at < now - pending_timeout \
+            and not sharding_enabled()
+        if existing.expires_at > now and not is_abandoned:
+            return existing
+        # Просроченный или брошенный ключ удаляется условно: если его уже занял другой запрос, ничего не произойдёт
+        db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.endpoint == endpoint,
+            IdempotencyKey.key == key,
+            IdempotencyKey.created_at == existing.created_at
+        ))
+        db.commit()
+    return db.get(IdempotencyKey, (endpoint, key))
+
+
+def complete_idempotency_key(db: Session, endpoint: str, key: str, response_status: int, response_body: str,
+                              commit: bool = True):
+    db.execute(update(IdempotencyKey).where(
+        IdempotencyKey.endpoint == endpoint,
+        IdempotencyKey.key == key
+    ).values(response_status=response_status, response_body=response_body))
+    if commit:
+        db.commit()
+
 
+def release_idempotency_key(db: Session, endpoint: str, key: str):
+    db.rollback()
+    db.execute(delete(IdempotencyKey).where(
+        IdempotencyKey.endpoint == endpoint,
+        IdempotencyKey.key == key,
+        IdempotencyKey.response_status.is_(None)
+    ))
+    db.commit()
 
+
+def purge_expired_idempotency_keys(db: Session) -> int:
+    result = db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < func.localtimestamp()))
+    db.commit()
+    return result.rowcount
@@ -1,9 +1,19 @@
 import os
+import uuid
+from datetime import datetime
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql.functions import now, localtimestamp
+
+from src.db.sharding import SHARD_URLS, SHARD_IDS, sharding_enabled, shard_chooser, identity_chooser, execute_chooser
+from src.db.types import UUID
 
 
 load_dotenv()
@@ -14,9 +24,83 @@ POSTGRES_HOST = os.getenv("POSTGRES_HOST")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT")
 POSTGRES_DB = os.getenv("POSTGRES_DATABASE")
 
-DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Для драйвера psycopg 3 (postgresql+psycopg://): запрос, выполненный столько раз на соединении,
+# готовится на сервере (PREPARE) и дальше не разбирается и не планируется заново; off — отключить,
+# например за PgBouncer в режиме транзакций. psycopg2 серверных подготовленных запросов не поддерживает.
+DB_PREPARE_THRESHOLD = os.getenv("DB_PREPARE_THRESHOLD", "5")
+
+# DATABASE_URL задаёт базу целиком, например sqlite:///./tender.db или sqlite:// (в памяти);
+# без него используется PostgreSQL из POSTGRES_* переменных
+DATABASE_URL = os.getenv("DATABASE_URL") or \
+    f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+
+
+def engine_options(url: str) -> dict:
+    if make_url(url).get_backend_name() != "sqlite":
+        options = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}
+        if make_url(url).get_driver_name() == "psycopg":
+            prepare_threshold = None if DB_PREPARE_THRESHOLD.lower() == "off" else int(DB_PREPARE_THRESHOLD)
+            options["connect_args"] = {"prepare_threshold": prepare_threshold}
+        return options
+    options = {"connect_args": {"check_same_thread": False}}
+    if make_url(url).database in (None, "", ":memory:"):
+        # База в памяти живёт, пока открыто соединение, поэтому все потоки делят одно
+        options["poolclass"] = StaticPool
+    return options
+
+
+if sharding_enabled():
+    # Шард 0 — основной: на нём справочники, и им пользуются код и миграции, которым нужна одна база
+    engines = [create_engine(url, **engine_options(url)) for url in SHARD_URLS]
+    engine = engines[0]
+    SessionLocal = sessionmaker(
+        class_=ShardedSession,
+        autocommit=False,
+        autoflush=False,
+        shards=dict(zip(SHARD_IDS, engines)),
+        shard_chooser=shard_chooser,
+        identity_chooser=identity_chooser,
+        execute_chooser=execute_chooser,
+    )
+else:
+    engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+    engines = [engine]
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Сессии отдельных шардов для фоновых задач, которые обрабатывают каждый шард своими запросами
+shard_session_factories = [sessionmaker(autocommit=False, autoflush=False, bind=shard) for shard in engines] \
+    if sharding_enabled() else [SessionLocal]
+
+# Колонки с аннотацией Mapped[uuid.UUID] без явного типа тоже получают переносимый UUID
+BaseModel = declarative_base(type_annotation_map={uuid.UUID: UUID})
+
+
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # Каскадное удаление (архивирование, удаление организаций) опирается на внешние ключи
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+for sqlite_engine in engines:
+    if sqlite_engine.dialect.name == "sqlite":
+        event.listen(sqlite_engine, "connect", configure_sqlite_connection)
+
+
+@compiles(now, "sqlite")
+@compiles(localtimestamp, "sqlite")
+def compile_sqlite_now(element, compiler, **kw):
+    # CURRENT_TIMESTAMP в SQLite без долей секунды, а SQLAlchemy хранит datetime с микросекундами:
+    # строки разного формата неверно сравниваются, например в курсорах пагинации
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-BaseModel = declarative_base()
\ No newline at end of file
+def database_now(db: Session, **bind_arguments) -> datetime:
+    """
+    Текущее время по часам базы в том же виде, в каком server_default now() записывает его
+    в колонки TIMESTAMP: сроки сравниваются с этими колонками, а часы приложения могут отличаться.
+    """
+    return db.scalar(select(localtimestamp()), bind_arguments=bind_arguments or None)
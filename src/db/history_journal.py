@@ -0,0 +1,150 @@
+import os
+
+from sqlalchemy import select, insert, delete, exists, cast
+from sqlalchemy.orm import Session
+
+from src.db.database import shard_session_factories
+from src.db.models import HistoryJournalEntry, Tender, TenderHistory, Bid, BidHistory
+from src.db.sharding import sharding_enabled, shard_for_key, shard_arguments
+from src.metrics import metrics
+
+
+# sync - история пишется в tender_history/bid_history внутри запроса (по умолчанию),
+# journal - в журнал history_journal, откуда переносится фоновой задачей пачками
+HISTORY_MODE = os.getenv("HISTORY_MODE", "sync").lower()
+HISTORY_FLUSH_INTERVAL_SECONDS = float(os.getenv("HISTORY_FLUSH_INTERVAL_SECONDS", "1"))
+HISTORY_FLUSH_BATCH_SIZE = int(os.getenv("HISTORY_FLUSH_BATCH_SIZE", "1000"))
+
+TENDER_ENTITY = "tender"
+BID_ENTITY = "bid"
+
+
+def journal_enabled() -> bool:
+    return HISTORY_MODE == "journal"
+
+
+def journal_tender_history(db: Session, tender: Tender):
+    db.add(HistoryJournalEntry(
+        entity_type=TENDER_ENTITY,
+        entity_id=tender.id,
+        name=tender.name,
+        description=tender.description,
+        service_type=tender.service_type.name,
+        status=tender.status.name,
+        version=tender.version
+    ))
+
+
+def journal_bid_history(db: Session, bid: Bid):
+    db.add(HistoryJournalEntry(
+        entity_type=BID_ENTITY,
+        entity_id=bid.id,
+        name=bid.name,
+        description=bid.description,
+        status=bid.status.name,
+        version=bid.version
+    ))
+
+
+def journal_bids_history(db: Session, tender_id, bids: list):
+    """Записи журнала для предложений одного тендера одной многострочной вставкой."""
+    db.execute(insert(HistoryJournalEntry.__table__), [
+        {
+            "entity_type": BID_ENTITY,
+            "entity_id": bid.id,
+            "name": bid.name,
+            "description": bid.description,
+            "status": bid.status.name,
+            "version": bid.version,
+        }
+        for bid in bids
+    ], bind_arguments=shard_arguments(tender_id))
+
+
+def flush_history_journal(db: Session, entity_ids: list | None = None,
+                          batch_size: int = HISTORY_FLUSH_BATCH_SIZE) -> int:
+    """
+    Переносит записи журнала в таблицы истории двумя многострочными INSERT ... SELECT и удаляет их из журнала.
+    Без entity_ids переносится не более batch_size самых старых записей, строки, захваченные
+    параллельным переносом, пропускаются (SKIP LOCKED). С entity_ids переносятся все записи этих сущностей:
+    так чтение истории перед откатом видит каждую версию, даже если фоновая задача ещё не отработала.
+    Транзакцию не фиксирует - это делает вызывающий код.
+    """
+    if entity_ids is None:
+        return flush_journal_entries(db, None, batch_size, {})
+    # id записей журнала у каждого шарда свои, поэтому запросы по ним выполняются только в шарде сущностей
+    shard_entity_ids = {}
+    for entity_id in entity_ids:
+        shard_entity_ids.setdefault(shard_for_key(entity_id) if sharding_enabled() else None, []).append(entity_id)
+    return sum(
+        flush_journal_entries(db, ids, batch_size, shard_arguments(ids[0]))
+        for ids in shard_entity_ids.values()
+    )
+
+
+def flush_journal_entries(db: Session, entity_ids: list | None, batch_size: int, bind_arguments: dict) -> int:
+    journal = HistoryJournalEntry
+    bind_arguments = bind_arguments or None
+    query = select(journal.id).order_by(journal.id)
+    if entity_ids is None:
+        query = query.limit(batch_size).with_for_update(skip_locked=True)
+    else:
+        query = query.where(journal.entity_id.in_(entity_ids)).with_for_update()
+    ids = db.scalars(query, bind_arguments=bind_arguments).all()
+    if not ids:
+        return 0
+
+    # Записи сущностей, удалённых до переноса, отбрасываются вместе с журналом
+    db.execute(insert(TenderHistory).from_select(
+        ["id", "tender_id", "name", "description", "service_type", "status", "version", "created_at"],
+        select(
+            journal.history_id,
+            journal.entity_id,
+            journal.name,
+            journal.description,
+            cast(journal.service_type, TenderHistory.service_type.type),
+            cast(journal.status, TenderHistory.status.type),
+            journal.version,
+            journal.created_at
+        ).where(
+            journal.id.in_(ids),
+            journal.entity_type == TENDER_ENTITY,
+            exists().where(Tender.id == journal.entity_id)
+        )
+    ), bind_arguments=bind_arguments)
+    db.execute(insert(BidHistory).from_select(
+        ["id", "bid_id", "name", "description", "status", "version", "created_at"],
+        select(
+            journal.history_id,
+            journal.entity_id,
+            journal.name,
+            journal.description,
+            cast(journal.status, BidHistory.status.type),
+            journal.version,
+            journal.created_at
+        ).where(
+            journal.id.in_(ids),
+            journal.entity_type == BID_ENTITY,
+            exists().where(Bid.id == journal.entity_id)
+        )
+    ), bind_arguments=bind_arguments)
+    db.execute(delete(journal).where(journal.id.in_(ids)), bind_arguments=bind_arguments)
+    metrics.inc("history_journal_flushed_total", value=len(ids))
+    return len(ids)
+
+
+def run_history_flush():
+    # Журнал каждого шарда переносится в историю того же шарда
+    for session_factory in shard_session_factories:
+        db = session_factory()
+        try:
+            while True:
+                flushed = flush_history_journal(db)
+                db.commit()
+                if flushed < HISTORY_FLUSH_BATCH_SIZE:
+                    break
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
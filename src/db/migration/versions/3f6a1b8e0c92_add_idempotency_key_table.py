@@ -0,0 +1,37 @@
+"""Add idempotency key table
+
+Revision ID: 3f6a1b8e0c92
+Revises: e27a9c4d8f15
+Create Date: 2026-10-19 13:15:41.067318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6a1b8e0c92'
+down_revision: Union[str, None] = 'e27a9c4d8f15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('idempotency_key',
+    sa.Column('endpoint', sa.String(length=100), nullable=False),
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('request_hash', sa.String(length=64), nullable=False),
+    sa.Column('response_status', sa.Integer(), nullable=True),
+    sa.Column('response_body', sa.String(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('expires_at', sa.TIMESTAMP(), nullable=False),
+    sa.PrimaryKeyConstraint('endpoint', 'key')
+    )
+    op.create_index('ix_idempotency_key_expires_at', 'idempotency_key', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_idempotency_key_expires_at', table_name='idempotency_key')
+    op.drop_table('idempotency_key')
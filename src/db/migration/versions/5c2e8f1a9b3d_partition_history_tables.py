@@ -0,0 +1,99 @@
+"""Partition history tables by hash of parent id
+
+Revision ID: 5c2e8f1a9b3d
+Revises: 18a0130a1676
+Create Date: 2026-10-19 10:12:03.418207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2e8f1a9b3d'
+down_revision: Union[str, None] = '18a0130a1676'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Число секций HISTORY_PARTITIONS по умолчанию на момент этой миграции
+HISTORY_PARTITIONS = 8
+
+
+def create_history_partitions(connection, table_name: str, modulus: int):
+    for remainder in range(modulus):
+        connection.execute(sa.text(
+            f"CREATE TABLE IF NOT EXISTS {table_name}_p{remainder} PARTITION OF {table_name} "
+            f"FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+        ))
+
+
+HISTORY_TABLES = {
+    "tender_history": {
+        "parent_column": "tender_id",
+        "parent_table": "tender",
+        "columns": "id, tender_id, name, description, service_type, status, version, created_at",
+        "definition": """
+            id UUID NOT NULL,
+            tender_id UUID NOT NULL REFERENCES tender (id) ON DELETE CASCADE,
+            name VARCHAR(100) NOT NULL,
+            description VARCHAR NOT NULL,
+            service_type tenderservicetype NOT NULL,
+            status tenderstatus NOT NULL,
+            version INTEGER NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL
+        """,
+    },
+    "bid_history": {
+        "parent_column": "bid_id",
+        "parent_table": "bid",
+        "columns": "id, bid_id, name, description, status, version, created_at",
+        "definition": """
+            id UUID NOT NULL,
+            bid_id UUID NOT NULL REFERENCES bid (id) ON DELETE CASCADE,
+            name VARCHAR(100) NOT NULL,
+            description VARCHAR NOT NULL,
+            status bidstatus NOT NULL,
+            version INTEGER NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL
+        """,
+    },
+}
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    for table, spec in HISTORY_TABLES.items():
+        parent_column = spec["parent_column"]
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+        op.execute(f"ALTER TABLE {table}_old RENAME CONSTRAINT {table}_pkey TO {table}_old_pkey")
+        op.execute(f"""
+            CREATE TABLE {table} (
+                {spec["definition"]},
+                CONSTRAINT {table}_pkey PRIMARY KEY (id, {parent_column})
+            ) PARTITION BY HASH ({parent_column})
+        """)
+        create_history_partitions(connection, table, HISTORY_PARTITIONS)
+        op.create_index(f"ix_{table}_{parent_column}_version", table, [parent_column, "version"])
+        op.execute(f"INSERT INTO {table} ({spec['columns']}) SELECT {spec['columns']} FROM {table}_old")
+        op.execute(f"DROP TABLE {table}_old")
+
+
+def downgrade() -> None:
+    for table, spec in HISTORY_TABLES.items():
+        parent_column = spec["parent_column"]
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_partitioned")
+        op.execute(f"ALTER TABLE {table}_partitioned RENAME CONSTRAINT {table}_pkey TO {table}_partitioned_pkey")
+        op.execute(f"ALTER INDEX ix_{table}_{parent_column}_version RENAME TO ix_{table}_partitioned_{parent_column}_version")
+        op.execute(f"""
+            CREATE TABLE {table} (
+                {spec["definition"]},
+                CONSTRAINT {table}_pkey PRIMARY KEY (id)
+            )
+        """)
+        op.create_index(f"ix_{table}_{parent_column}_version", table, [parent_column, "version"])
+        op.execute(f"INSERT INTO {table} ({spec['columns']}) SELECT {spec['columns']} FROM {table}_partitioned")
+        # Секции удаляются вместе с родительской таблицей
+        op.execute(f"DROP TABLE {table}_partitioned")
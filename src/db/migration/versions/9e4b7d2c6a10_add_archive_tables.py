@@ -0,0 +1,111 @@
+"""Add archive tables for closed tenders
+
+Revision ID: 9e4b7d2c6a10
+Revises: 5c2e8f1a9b3d
+Create Date: 2026-10-19 11:03:47.920531
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4b7d2c6a10'
+down_revision: Union[str, None] = '5c2e8f1a9b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+tender_service_type = postgresql.ENUM('CONSTRUCTION', 'DELIVERY', 'MANUFACTURE', name='tenderservicetype', create_type=False)
+tender_status = postgresql.ENUM('CREATED', 'PUBLISHED', 'CLOSED', name='tenderstatus', create_type=False)
+bid_status = postgresql.ENUM('CREATED', 'PUBLISHED', 'CANCELED', name='bidstatus', create_type=False)
+author_type = postgresql.ENUM('USER', 'ORGANIZATION', name='authortype', create_type=False)
+bid_decision_status = postgresql.ENUM('APPROVED', 'REJECTED', name='biddecisionstatus', create_type=False)
+
+
+def upgrade() -> None:
+    op.create_table('tender_archive',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('service_type', tender_service_type, nullable=False),
+    sa.Column('status', tender_status, nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('organization_id', sa.UUID(), nullable=False),
+    sa.Column('archived_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tender_archive_organization_id', 'tender_archive', ['organization_id'])
+    op.create_table('bid_archive',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('status', bid_status, nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('tender_id', sa.UUID(), nullable=False),
+    sa.Column('author_type', author_type, nullable=False),
+    sa.Column('author_id', sa.Uuid(), nullable=False),
+    sa.Column('archived_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_bid_archive_tender_id', 'bid_archive', ['tender_id'])
+    op.create_table('bid_decision_archive',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('bid_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('decision', bid_decision_status, nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('archived_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_bid_decision_archive_bid_id', 'bid_decision_archive', ['bid_id'])
+    op.create_table('bid_feedback_archive',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('bid_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('feedback', sa.String(length=1000), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('archived_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_bid_feedback_archive_bid_id', 'bid_feedback_archive', ['bid_id'])
+    op.create_table('tender_history_archive',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('tender_id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('service_type', tender_service_type, nullable=False),
+    sa.Column('status', tender_status, nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('archived_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'tender_id')
+    )
+    op.create_index('ix_tender_history_archive_tender_id', 'tender_history_archive', ['tender_id'])
+    op.create_table('bid_history_archive',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('bid_id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('status', bid_status, nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('archived_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'bid_id')
+    )
+    op.create_index('ix_bid_history_archive_bid_id', 'bid_history_archive', ['bid_id'])
+
+
+def downgrade() -> None:
+    op.drop_table('bid_history_archive')
+    op.drop_table('tender_history_archive')
+    op.drop_table('bid_feedback_archive')
+    op.drop_table('bid_decision_archive')
+    op.drop_table('bid_archive')
+    op.drop_table('tender_archive')
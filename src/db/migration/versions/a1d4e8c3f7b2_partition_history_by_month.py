@@ -0,0 +1,113 @@
+"""Partition history tables by month of created_at
+
+Revision ID: a1d4e8c3f7b2
+Revises: f3c9a7d1e2b6
+Create Date: 2026-10-19 21:05:44.180326
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1d4e8c3f7b2'
+down_revision: Union[str, None] = 'f3c9a7d1e2b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Секции по хешу делят сущности, а не время: отсоединение секции убирало историю части живых
+# тендеров и предложений. Месячные секции по created_at позволяют убирать только старую историю.
+HISTORY_TABLES = {
+    "tender_history": {
+        "parent_column": "tender_id",
+        "columns": "id, tender_id, name, description, service_type, status, version, created_at",
+        "definition": """
+            id UUID NOT NULL,
+            tender_id UUID NOT NULL REFERENCES tender (id) ON DELETE CASCADE,
+            name VARCHAR(100) NOT NULL,
+            description VARCHAR NOT NULL,
+            service_type tenderservicetype NOT NULL,
+            status tenderstatus NOT NULL,
+            version INTEGER NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL
+        """,
+    },
+    "bid_history": {
+        "parent_column": "bid_id",
+        "columns": "id, bid_id, name, description, status, version, created_at",
+        "definition": """
+            id UUID NOT NULL,
+            bid_id UUID NOT NULL REFERENCES bid (id) ON DELETE CASCADE,
+            name VARCHAR(100) NOT NULL,
+            description VARCHAR NOT NULL,
+            status bidstatus NOT NULL,
+            version INTEGER NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL
+        """,
+    },
+}
+HASH_PARTITIONS = 8
+# Секции вперёд на момент миграции; дальше их создаёт фоновая задача (HISTORY_PARTITIONS_AHEAD)
+MONTHS_AHEAD = 3
+
+
+def _replace_table(table: str, spec: dict, partition_by: str, primary_key: str, create_partitions):
+    parent_column = spec["parent_column"]
+    index = f"ix_{table}_{parent_column}_version"
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    op.execute(f"ALTER TABLE {table}_old RENAME CONSTRAINT {table}_pkey TO {table}_old_pkey")
+    op.execute(f"ALTER INDEX {index} RENAME TO {index}_old")
+    op.execute(f"""
+        CREATE TABLE {table} (
+            {spec["definition"]},
+            CONSTRAINT {table}_pkey PRIMARY KEY ({primary_key})
+        ) PARTITION BY {partition_by}
+    """)
+    create_partitions(table)
+    op.create_index(index, table, [parent_column, "version"])
+    op.execute(f"INSERT INTO {table} ({spec['columns']}) SELECT {spec['columns']} FROM {table}_old")
+    # Секции старой таблицы удаляются вместе с ней
+    op.execute(f"DROP TABLE {table}_old")
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    for table, spec in HISTORY_TABLES.items():
+        # Секции создаются с месяца самой старой записи, чтобы ничего не попало в секцию по умолчанию
+        months = connection.scalars(sa.text(f"""
+            SELECT CAST(month AS date) FROM generate_series(
+                date_trunc('month', (SELECT coalesce(min(created_at), now()) FROM {table})),
+                date_trunc('month', now()) + interval '{MONTHS_AHEAD} months',
+                interval '1 month'
+            ) AS month
+        """)).all()
+
+        def create_month_partitions(name: str):
+            for month in months:
+                next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+                connection.execute(sa.text(
+                    f"CREATE TABLE {name}_y{month.year:04d}m{month.month:02d} PARTITION OF {name} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+                ))
+            connection.execute(sa.text(f"CREATE TABLE {name}_default PARTITION OF {name} DEFAULT"))
+
+        _replace_table(table, spec, "RANGE (created_at)", "id, created_at", create_month_partitions)
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+
+    def create_hash_partitions(name: str):
+        for remainder in range(HASH_PARTITIONS):
+            connection.execute(sa.text(
+                f"CREATE TABLE {name}_p{remainder} PARTITION OF {name} "
+                f"FOR VALUES WITH (MODULUS {HASH_PARTITIONS}, REMAINDER {remainder})"
+            ))
+
+    for table, spec in HISTORY_TABLES.items():
+        _replace_table(table, spec, f"HASH ({spec['parent_column']})", f"id, {spec['parent_column']}",
+                       create_hash_partitions)
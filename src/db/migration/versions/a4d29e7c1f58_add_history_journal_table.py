@@ -0,0 +1,39 @@
+"""Add history journal table
+
+Revision ID: a4d29e7c1f58
+Revises: 3f6a1b8e0c92
+Create Date: 2026-10-19 14:02:17.514209
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d29e7c1f58'
+down_revision: Union[str, None] = '3f6a1b8e0c92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('history_journal',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('entity_type', sa.String(length=10), nullable=False),
+    sa.Column('entity_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('history_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('service_type', sa.String(length=20), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('history_journal')
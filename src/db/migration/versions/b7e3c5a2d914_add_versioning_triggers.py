@@ -0,0 +1,33 @@
+"""Add versioning triggers on tender and bid
+
+Revision ID: b7e3c5a2d914
+Revises: a4d29e7c1f58
+Create Date: 2026-10-19 14:41:52.730164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.db.triggers import VERSIONED_TABLES, create_versioning_trigger, drop_versioning_trigger
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3c5a2d914'
+down_revision: Union[str, None] = 'a4d29e7c1f58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Триггеры работают только в сессиях с VERSIONING_MODE=trigger, остальным они не мешают
+    connection = op.get_bind()
+    for table_name in VERSIONED_TABLES:
+        create_versioning_trigger(connection, table_name)
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+    for table_name in VERSIONED_TABLES:
+        drop_versioning_trigger(connection, table_name)
@@ -0,0 +1,28 @@
+"""Add indexes for tender-scoped bid feedback lookups
+
+Revision ID: c81d3f5e2b47
+Revises: 9e4b7d2c6a10
+Create Date: 2026-10-19 11:48:20.114093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81d3f5e2b47'
+down_revision: Union[str, None] = '9e4b7d2c6a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_bid_tender_id_author_id', 'bid', ['tender_id', 'author_id'])
+    op.create_index('ix_bid_feedback_bid_id_created_at_id', 'bid_feedback', ['bid_id', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_bid_feedback_bid_id_created_at_id', table_name='bid_feedback')
+    op.drop_index('ix_bid_tender_id_author_id', table_name='bid')
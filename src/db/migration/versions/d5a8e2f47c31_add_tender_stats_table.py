@@ -0,0 +1,68 @@
+"""Add tender stats summary table
+
+Revision ID: d5a8e2f47c31
+Revises: b7e3c5a2d914
+Create Date: 2026-10-19 16:12:08.392417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a8e2f47c31'
+down_revision: Union[str, None] = 'b7e3c5a2d914'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Сводка пересчитывается один раз по живым и архивным таблицам, дальше её ведёт приложение
+BACKFILL = """
+WITH bids AS (
+    SELECT tender_id,
+           count(*) FILTER (WHERE status = 'CREATED') AS created,
+           count(*) FILTER (WHERE status = 'PUBLISHED') AS published,
+           count(*) FILTER (WHERE status = 'CANCELED') AS canceled
+    FROM {bid} GROUP BY tender_id
+), decisions AS (
+    SELECT b.tender_id,
+           count(*) FILTER (WHERE d.decision = 'APPROVED') AS approved,
+           count(*) FILTER (WHERE d.decision = 'REJECTED') AS rejected
+    FROM {bid_decision} d JOIN {bid} b ON b.id = d.bid_id GROUP BY b.tender_id
+), feedbacks AS (
+    SELECT b.tender_id, count(*) AS total
+    FROM {bid_feedback} f JOIN {bid} b ON b.id = f.bid_id GROUP BY b.tender_id
+)
+INSERT INTO tender_stats (tender_id, bids_created, bids_published, bids_canceled,
+                          decisions_approved, decisions_rejected, feedbacks)
+SELECT bids.tender_id, bids.created, bids.published, bids.canceled,
+       coalesce(decisions.approved, 0), coalesce(decisions.rejected, 0), coalesce(feedbacks.total, 0)
+FROM bids
+LEFT JOIN decisions ON decisions.tender_id = bids.tender_id
+LEFT JOIN feedbacks ON feedbacks.tender_id = bids.tender_id
+ON CONFLICT (tender_id) DO NOTHING
+"""
+
+
+def upgrade() -> None:
+    op.create_table('tender_stats',
+    sa.Column('tender_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('bids_created', sa.Integer(), nullable=False),
+    sa.Column('bids_published', sa.Integer(), nullable=False),
+    sa.Column('bids_canceled', sa.Integer(), nullable=False),
+    sa.Column('decisions_approved', sa.Integer(), nullable=False),
+    sa.Column('decisions_rejected', sa.Integer(), nullable=False),
+    sa.Column('feedbacks', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('tender_id')
+    )
+    op.execute(BACKFILL.format(bid="bid", bid_decision="bid_decision", bid_feedback="bid_feedback"))
+    op.execute(BACKFILL.format(bid="bid_archive", bid_decision="bid_decision_archive",
+                               bid_feedback="bid_feedback_archive"))
+
+
+def downgrade() -> None:
+    op.drop_table('tender_stats')
@@ -0,0 +1,26 @@
+"""Add bid author index for the my bids query
+
+Revision ID: e27a9c4d8f15
+Revises: c81d3f5e2b47
+Create Date: 2026-10-19 12:31:09.552876
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e27a9c4d8f15'
+down_revision: Union[str, None] = 'c81d3f5e2b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_bid_author_type_author_id_name_id', 'bid', ['author_type', 'author_id', 'name', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_bid_author_type_author_id_name_id', table_name='bid')
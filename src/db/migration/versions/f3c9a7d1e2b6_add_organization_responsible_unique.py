@@ -0,0 +1,32 @@
+"""Add unique constraint on organization responsibles
+
+Revision ID: f3c9a7d1e2b6
+Revises: d5a8e2f47c31
+Create Date: 2026-10-19 18:40:27.513906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c9a7d1e2b6'
+down_revision: Union[str, None] = 'd5a8e2f47c31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Повторные связи сотрудника с организацией ничего не добавляют к правам, остаётся одна из них
+    op.execute("""
+        DELETE FROM organization_responsible a
+        USING organization_responsible b
+        WHERE a.organization_id = b.organization_id AND a.user_id = b.user_id AND a.ctid > b.ctid
+    """)
+    op.create_unique_constraint('uq_organization_responsible_organization_id_user_id', 'organization_responsible',
+                                ['organization_id', 'user_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_organization_responsible_organization_id_user_id', 'organization_responsible', type_='unique')
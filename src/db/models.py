@@ -1,8 +1,11 @@
-from sqlalchemy import ForeignKey, String, Enum, TIMESTAMP, func
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import ForeignKey, String, Enum, TIMESTAMP, func, Index, event, BigInteger, Integer, UniqueConstraint
+from src.db.types import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 import uuid
+from datetime import datetime
 from src.db.database import BaseModel
+from src.db.partitions import HISTORY_PARTITION_COLUMN, create_partitions_after_create
+from src.db.triggers import create_versioning_trigger_after_create
 import enum
 
 
@@ -14,8 +17,12 @@ class OrganizationType(enum.Enum):
 
 class OrganizationResponsible(BaseModel):
     __tablename__ = "organization_responsible"
+    __table_args__ = (
+        # Проверка прав ожидает не больше одной связи; по этому ключу идёт upsert массовой загрузки
+        UniqueConstraint("organization_id", "user_id", name="uq_organization_responsible_organization_id_user_id"),
+    )
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(), primary_key=True, default=uuid.uuid4)
     organization_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("organization.id", ondelete="CASCADE"))
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("employee.id", ondelete="CASCADE"))
 
@@ -27,7 +34,7 @@ class OrganizationResponsible(BaseModel):
 class User(BaseModel):
     __tablename__ = "employee"
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(), primary_key=True, default=uuid.uuid4)
     username: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
     first_name: Mapped[str] = mapped_column(String(50))
     last_name: Mapped[str] = mapped_column(String(50))
@@ -39,7 +46,7 @@ class User(BaseModel):
 class Organization(BaseModel):
     __tablename__ = "organization"
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(), primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     description: Mapped[str] = mapped_column(String, nullable=True)
     type: Mapped[OrganizationType] = mapped_column(Enum(OrganizationType), nullable=True)
@@ -64,15 +71,20 @@ class TenderServiceType(enum.Enum):
 
 class TenderHistory(BaseModel):
     __tablename__ = "tender_history"
+    __table_args__ = (
+        Index("ix_tender_history_tender_id_version", "tender_id", "version"),
+        {"postgresql_partition_by": f"RANGE ({HISTORY_PARTITION_COLUMN})"},
+    )
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(), primary_key=True, default=uuid.uuid4)
     tender_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("tender.id", ondelete="CASCADE"), nullable=False)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     description: Mapped[str] = mapped_column(String, nullable=False)
     service_type: Mapped[TenderServiceType] = mapped_column(Enum(TenderServiceType), nullable=False)
     status: Mapped[TenderStatus] = mapped_column(Enum(TenderStatus), nullable=False)
     version: Mapped[int] = mapped_column(nullable=False)
-    created_at: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP, server_default=func.now(), nullable=False)
+    # Ключ секционирования обязан входить в первичный ключ секционированной таблицы
+    created_at: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP, server_default=func.now(), primary_key=True, nullable=False)
 
     tender: Mapped["Tender"] = relationship("Tender", back_populates="history")
 
@@ -80,7 +92,7 @@ class TenderHistory(BaseModel):
 class Tender(BaseModel):
     __tablename__ = "tender"
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(), primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     description: Mapped[str] = mapped_column(String, nullable=False)
     service_type: Mapped[TenderServiceType] = mapped_column(Enum(TenderServiceType), nullable=False)
@@ -107,22 +119,31 @@ class AuthorType(enum.Enum):
 
 class BidHistory(BaseModel):
     __tablename__ = "bid_history"
+    __table_args__ = (
+        Index("ix_bid_history_bid_id_version", "bid_id", "version"),
+        {"postgresql_partition_by": f"RANGE ({HISTORY_PARTITION_COLUMN})"},
+    )
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(), primary_key=True, default=uuid.uuid4)
     bid_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("bid.id", ondelete="CASCADE"), nullable=False)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     description: Mapped[str] = mapped_column(String, nullable=False)
     status: Mapped[BidStatus] = mapped_column(Enum(BidStatus), nullable=False)
     version: Mapped[int] = mapped_column(nullable=False)
-    created_at: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP, server_default=func.now(), nullable=False)
+    # Ключ секционирования обязан входить в первичный ключ секционированной таблицы
+    created_at: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP, server_default=func.now(), primary_key=True, nullable=False)
 
     bid: Mapped["Bid"] = relationship("Bid", back_populates="history")
 
 
 class Bid(BaseModel):
     __tablename__ = "bid"
+    __table_args__ = (
+        Index("ix_bid_tender_id_author_id", "tender_id", "author_id"),
+        Index("ix_bid_author_type_author_id_name_id", "author_type", "author_id", "name", "id"),
+    )
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(), primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     description: Mapped[str] = mapped_column(String, nullable=False)
     status: Mapped[BidStatus] = mapped_column(Enum(BidStatus), nullable=False, default=BidStatus.CREATED)
@@ -142,6 +163,12 @@ class Bid(BaseModel):
     feedbacks: Mapped[list["BidFeedback"]] = relationship("BidFeedback", back_populates="bid", cascade="all, delete-orphan")
 
 
+event.listen(TenderHistory.__table__, "after_create", create_partitions_after_create)
+event.listen(BidHistory.__table__, "after_create", create_partitions_after_create)
+event.listen(Tender.__table__, "after_create", create_versioning_trigger_after_create)
+event.listen(Bid.__table__, "after_create", create_versioning_trigger_after_create)
+
+
 class BidDecisionStatus(enum.Enum):
     APPROVED = "Approved"
     REJECTED = "Rejected"
@@ -150,7 +177,7 @@ class BidDecisionStatus(enum.Enum):
 class BidDecision(BaseModel):
     __tablename__ = "bid_decision"
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(), primary_key=True, default=uuid.uuid4)
     bid_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("bid.id", ondelete="CASCADE"), nullable=False)
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("employee.id", ondelete="CASCADE"), nullable=False)
     decision: Mapped[BidDecisionStatus] = mapped_column(Enum(BidDecisionStatus), nullable=False)
@@ -162,8 +189,11 @@ class BidDecision(BaseModel):
 
 class BidFeedback(BaseModel):
     __tablename__ = "bid_feedback"
+    __table_args__ = (
+        Index("ix_bid_feedback_bid_id_created_at_id", "bid_id", "created_at", "id"),
+    )
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(), primary_key=True, default=uuid.uuid4)
     bid_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("bid.id", ondelete="CASCADE"), nullable=False)
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("employee.id", ondelete="CASCADE"), nullable=False)
     feedback: Mapped[str] = mapped_column(String(1000), nullable=False)
@@ -171,3 +201,57 @@ class BidFeedback(BaseModel):
 
     bid: Mapped["Bid"] = relationship("Bid", back_populates="feedbacks")
     user: Mapped["User"] = relationship("User")
+
+
+class IdempotencyKey(BaseModel):
+    __tablename__ = "idempotency_key"
+    __table_args__ = (
+        Index("ix_idempotency_key_expires_at", "expires_at"),
+    )
+
+    # Первичный ключ (endpoint, key) гарантирует, что из одновременных повторов выполнится только один
+    endpoint: Mapped[str] = mapped_column(String(100), primary_key=True)
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    response_status: Mapped[int] = mapped_column(nullable=True)
+    response_body: Mapped[str] = mapped_column(String, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
+
+
+class HistoryJournalEntry(BaseModel):
+    """
+    Журнал записей истории в режиме HISTORY_MODE=journal. Запись добавляется в той же транзакции,
+    что и изменение сущности, и переносится в tender_history/bid_history фоновой задачей пачками.
+    У таблицы нет внешних ключей и вторичных индексов, чтобы вставка была максимально дешёвой.
+    """
+    __tablename__ = "history_journal"
+
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer(), "sqlite"), primary_key=True, autoincrement=True)
+    entity_type: Mapped[str] = mapped_column(String(10), nullable=False)
+    entity_id: Mapped[uuid.UUID] = mapped_column(UUID(), nullable=False)
+    history_id: Mapped[uuid.UUID] = mapped_column(UUID(), nullable=False, default=uuid.uuid4)
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    description: Mapped[str] = mapped_column(String, nullable=False)
+    service_type: Mapped[str] = mapped_column(String(20), nullable=True)
+    status: Mapped[str] = mapped_column(String(20), nullable=False)
+    version: Mapped[int] = mapped_column(nullable=False)
+    created_at: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP, server_default=func.now(), nullable=False)
+
+
+class TenderStats(BaseModel):
+    """
+    Сводка по тендеру для дашбордов организации: предложения по статусам, решения и отзывы.
+    Обновляется приращениями в тех же транзакциях, что и изменения, поэтому чтение — одна строка.
+    Внешнего ключа нет: сводка остаётся доступной после переноса тендера в архив.
+    """
+    __tablename__ = "tender_stats"
+
+    tender_id: Mapped[uuid.UUID] = mapped_column(UUID(), primary_key=True)
+    bids_created: Mapped[int] = mapped_column(nullable=False, default=0)
+    bids_published: Mapped[int] = mapped_column(nullable=False, default=0)
+    bids_canceled: Mapped[int] = mapped_column(nullable=False, default=0)
+    decisions_approved: Mapped[int] = mapped_column(nullable=False, default=0)
+    decisions_rejected: Mapped[int] = mapped_column(nullable=False, default=0)
+    feedbacks: Mapped[int] = mapped_column(nullable=False, default=0)
+    updated_at: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -0,0 +1,92 @@
+import os
+import re
+from datetime import date
+
+from sqlalchemy import Connection, Table, text
+
+from src.db.database import engines
+
+
+HISTORY_PARTITIONS_AHEAD = int(os.getenv("HISTORY_PARTITIONS_AHEAD", "3"))
+HISTORY_PARTITION_INTERVAL_SECONDS = float(os.getenv("HISTORY_PARTITION_INTERVAL_SECONDS", "3600"))
+
+# Таблицы истории секционируются по месяцам created_at: секция прошлого месяца больше не меняется,
+# и старую историю можно отсоединить целиком. Поиск версии сущности ограничивается по created_at
+# периодом жизни сущности, поэтому затрагивает только секции этого периода.
+HISTORY_PARTITION_COLUMN = "created_at"
+PARTITIONED_HISTORY_TABLES = ("tender_history", "bid_history")
+
+_PARTITION_MONTH = re.compile(r"_y(\d{4})m(\d{2})$")
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table_name: str, month: date) -> str:
+    return f"{table_name}_y{month.year:04d}m{month.month:02d}"
+
+
+def current_month(connection: Connection) -> date:
+    # Месяц по часам базы: created_at заполняется её now()
+    return connection.scalar(text("SELECT CAST(date_trunc('month', now()) AS date)"))
+
+
+def create_history_partition(connection: Connection, table_name: str, month: date):
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table_name, month)} PARTITION OF {table_name} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+def create_history_partitions(connection: Connection, table_name: str, start: date | None = None,
+                              ahead: int = HISTORY_PARTITIONS_AHEAD):
+    """
+    Секции с месяца start (по умолчанию текущего) по текущий месяц плюс ahead месяцев и секция
+    по умолчанию. Строки попадают в секцию по умолчанию, только если секции не создавались дольше
+    ahead месяцев; пока в ней есть строки этого месяца, его секцию создать нельзя.
+    """
+    this_month = current_month(connection)
+    month = date(start.year, start.month, 1) if start is not None else this_month
+    while month <= add_months(this_month, ahead):
+        create_history_partition(connection, table_name, month)
+        month = add_months(month, 1)
+    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {table_name}_default PARTITION OF {table_name} DEFAULT"))
+
+
+def detach_history_partitions(connection: Connection, table_name: str, before: date) -> list[str]:
+    """
+    Отсоединяет месячные секции, целиком лежащие до before, без перезаписи данных: они остаются
+    обычными таблицами, которые можно выгрузить или удалить. Версии из них больше не читаются
+    и недоступны для отката.
+    """
+    partitions = connection.scalars(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table_name"
+    ), {"table_name": table_name}).all()
+    detached = []
+    for partition in sorted(partitions):
+        match = _PARTITION_MONTH.search(partition)
+        if match and add_months(date(int(match[1]), int(match[2]), 1), 1) <= before:
+            connection.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {partition}"))
+            detached.append(partition)
+    return detached
+
+
+def create_partitions_after_create(target: Table, connection: Connection, **kw):
+    # Секции создаются сразу вместе с родительской таблицей (metadata.create_all на старте)
+    if connection.dialect.name == "postgresql":
+        create_history_partitions(connection, target.name)
+
+
+def run_history_partitioning():
+    """Поддерживает секции истории на HISTORY_PARTITIONS_AHEAD месяцев вперёд в каждом шарде."""
+    for shard_engine in engines:
+        if shard_engine.dialect.name != "postgresql":
+            continue
+        with shard_engine.begin() as connection:
+            for table_name in PARTITIONED_HISTORY_TABLES:
+                create_history_partitions(connection, table_name)
@@ -0,0 +1,143 @@
+import heapq
+import os
+import uuid
+from itertools import islice
+
+from sqlalchemy import Table
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, ColumnClause
+from sqlalchemy.sql.visitors import iterate
+
+
+# Адреса баз шардов через запятую; номер шарда — позиция в списке, шард 0 — основной.
+# Без SHARD_URLS приложение работает с одной базой (DATABASE_URL или POSTGRES_*).
+SHARD_URLS = [url.strip() for url in os.getenv("SHARD_URLS", "").split(",") if url.strip()]
+SHARD_IDS = [str(index) for index in range(len(SHARD_URLS))]
+PRIMARY_SHARD = "0"
+
+# Справочные таблицы есть в каждом шарде (массовая загрузка копирует их с основного шарда,
+# src.db.bulk_import), а читаются через основной; ключи идемпотентности хранятся только в нём
+REFERENCE_TABLES = {"employee", "organization", "organization_responsible", "idempotency_key"}
+
+# Колонки, первый байт значения которых — ключ шарда. Id тендера получает первый байт id
+# организации, id предложения — первый байт id тендера, поэтому тендер, его предложения
+# и все их дочерние строки живут в шарде организации.
+SHARD_KEY_COLUMNS = {
+    "tender": ("id", "organization_id"),
+    "tender_history": ("tender_id",),
+    "tender_stats": ("tender_id",),
+    "bid": ("id", "tender_id"),
+    "bid_history": ("bid_id",),
+    "bid_decision": ("bid_id",),
+    "bid_feedback": ("bid_id",),
+    "history_journal": ("entity_id",),
+}
+
+
+def sharding_enabled() -> bool:
+    return bool(SHARD_URLS)
+
+
+def shard_for_key(value) -> str:
+    key = value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+    return SHARD_IDS[key.bytes[0] % len(SHARD_IDS)]
+
+
+def new_entity_id(parent_id) -> uuid.UUID:
+    """Id новой сущности в шарде родителя (организации для тендера, тендера для предложения)."""
+    entity_id = uuid.uuid4()
+    if not sharding_enabled():
+        return entity_id
+    parent = parent_id if isinstance(parent_id, uuid.UUID) else uuid.UUID(str(parent_id))
+    # Первый байт не затрагивает биты версии и варианта, id остаётся корректным UUID4
+    return uuid.UUID(bytes=parent.bytes[:1] + entity_id.bytes[1:])
+
+
+def shard_arguments(key) -> dict:
+    """bind_arguments для Session.execute с Core-запросом к строкам сущности с ключом key."""
+    return {"shard_id": shard_for_key(key)} if sharding_enabled() else {}
+
+
+def primary_shard_arguments() -> dict:
+    """bind_arguments для Core-запроса к справочникам и запросов без таблиц."""
+    return {"shard_id": PRIMARY_SHARD} if sharding_enabled() else {}
+
+
+def all_shard_arguments() -> list[dict]:
+    return [{"shard_id": shard_id} for shard_id in SHARD_IDS] if sharding_enabled() else [{}]
+
+
+def shard_chooser(mapper, instance, clause=None, **kw):
+    """Шард для новой строки — по ключу шарда её родителя; без сущности — основной."""
+    if instance is not None:
+        for column in SHARD_KEY_COLUMNS.get(mapper.local_table.name, ()):
+            value = getattr(instance, column, None)
+            if value is not None:
+                return shard_for_key(value)
+    return PRIMARY_SHARD
+
+
+def identity_chooser(mapper, primary_key, *, lazy_loaded_from=None, **kw):
+    if lazy_loaded_from is not None:
+        return [lazy_loaded_from.identity_token]
+    table = mapper.local_table.name
+    if table in REFERENCE_TABLES:
+        return [PRIMARY_SHARD]
+    keys = SHARD_KEY_COLUMNS.get(table, ())
+    for column, value in zip(mapper.primary_key, primary_key):
+        if column.name in keys and value is not None:
+            return [shard_for_key(value)]
+    return SHARD_IDS
+
+
+def _statement_shards(statement, parameters: dict) -> tuple[set[str], set[str]]:
+    """Шарды из условий "ключ = значение" / "ключ IN (...)" и имена таблиц запроса."""
+    shards, tables = set(), set()
+    for element in iterate(statement):
+        if isinstance(element, Table):
+            tables.add(element.name)
+        elif isinstance(element, ColumnClause) and isinstance(getattr(element, "table", None), Table):
+            tables.add(element.table.name)
+        elif (
+            isinstance(element, BinaryExpression)
+            and element.operator in (operators.eq, operators.in_op)
+            and isinstance(element.right, BindParameter)
+            and isinstance(getattr(element.left, "table", None), Table)
+            and element.left.name in SHARD_KEY_COLUMNS.get(element.left.table.name, ())
+        ):
+            # Session.get передаёт значения первичного ключа параметрами выполнения
+            value = parameters.get(element.right.key, element.right.effective_value)
+            if value is None:
+                continue
+            shards.update(shard_for_key(item) for item in (value if isinstance(value, (list, tuple)) else [value]))
+    return shards, tables
+
+
+def execute_chooser(orm_context):
+    """
+    Шарды ORM-запроса: по ключам шарда в условиях, основной — для запросов только к справочникам,
+    иначе все шарды. Значения lambda_stmt в разобранной конструкции относятся к первому вызову,
+    поэтому по ним маршрутизируются только запросы без ключей шарда.
+    """
+    statement = orm_context.statement
+    is_lambda = hasattr(statement, "_resolved")
+    parameters = orm_context.parameters if isinstance(orm_context.parameters, dict) else {}
+    shards, tables = _statement_shards(statement._resolved if is_lambda else statement, parameters)
+    if shards and not is_lambda:
+        return sorted(shards)
+    if tables and tables <= REFERENCE_TABLES:
+        return [PRIMARY_SHARD]
+    return SHARD_IDS
+
+
+def fan_out_page(db, query, order_by: list, limit: int, offset: int) -> list:
+    """
+    Страница списка по всем шардам: каждый шард отдаёт первые offset + limit строк в том же
+    порядке, страницы сливаются сортировкой слиянием. Порядок сравнивается в Python, поэтому
+    сортировка строк должна совпадать с сортировкой (collation) баз.
+    """
+    keys = [column.key for column in order_by]
+    query = query.order_by(*order_by).limit(offset + limit)
+    pages = [db.scalars(query, bind_arguments={"shard_id": shard_id}).all() for shard_id in SHARD_IDS]
+    merged = heapq.merge(*pages, key=lambda row: tuple(getattr(row, key) for key in keys))
+    return list(islice(merged, offset, offset + limit))
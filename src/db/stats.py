@@ -0,0 +1,40 @@
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from src.db.models import TenderStats, BidStatus, BidDecisionStatus
+from src.db.sharding import shard_arguments
+
+
+def bid_status_column(status: BidStatus) -> str:
+    return f"bids_{status.name.lower()}"
+
+
+def decision_column(decision: BidDecisionStatus) -> str:
+    return f"decisions_{decision.name.lower()}"
+
+
+def update_tender_stats(db: Session, tender_id, **deltas: int):
+    """
+    Прибавляет приращения к сводке тендера одним INSERT ... ON CONFLICT DO UPDATE:
+    строка создаётся при первом изменении, а параллельные приращения не теряются.
+    Не фиксирует транзакцию — сводка меняется вместе с данными, из которых она считается.
+    """
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    dialect = postgresql if db.get_bind(**shard_arguments(tender_id)).dialect.name == "postgresql" else sqlite
+    query = dialect.insert(TenderStats).values(tender_id=tender_id, **deltas)
+    query = query.on_conflict_do_update(
+        index_elements=[TenderStats.tender_id],
+        set_={
+            **{column: getattr(TenderStats, column) + delta for column, delta in deltas.items()},
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(query, bind_arguments=shard_arguments(tender_id))
+
+
+def update_bid_status_stats(db: Session, tender_id, old_status: BidStatus, new_status: BidStatus, count: int = 1):
+    if old_status != new_status:
+        update_tender_stats(db, tender_id, **{bid_status_column(old_status): -count, bid_status_column(new_status): count})
@@ -0,0 +1,95 @@
+import os
+
+from sqlalchemy import Connection, Table, event, text
+from sqlalchemy.orm import Session
+
+from src.db.database import engines
+from src.db.sharding import shard_arguments
+
+
+# app - версия и история ведутся в crud (по умолчанию),
+# trigger - триггером BEFORE UPDATE на tender и bid, crud выполняет только UPDATE
+VERSIONING_MODE = os.getenv("VERSIONING_MODE", "app").lower()
+
+# Триггеры установлены всегда, но работают только в сессиях, где эта настройка равна 'trigger'.
+# Так процессы в режиме app не получают двойную историю, а отдельные изменения
+# (например, отмена предложения по решению) можно выполнить без новой версии.
+VERSIONING_SETTING = "tender_service.versioning"
+
+VERSIONED_TABLES = {
+    "tender": {
+        "history_table": "tender_history",
+        "parent_column": "tender_id",
+        "columns": ["name", "description", "service_type", "status"],
+    },
+    "bid": {
+        "history_table": "bid_history",
+        "parent_column": "bid_id",
+        "columns": ["name", "description", "status"],
+    },
+}
+
+
+def trigger_versioning_enabled() -> bool:
+    return VERSIONING_MODE == "trigger"
+
+
+def _function_name(table_name: str) -> str:
+    return f"{table_name}_versioning"
+
+
+def create_versioning_trigger(connection: Connection, table_name: str):
+    spec = VERSIONED_TABLES[table_name]
+    columns = spec["columns"]
+    history_columns = ", ".join(["id", spec["parent_column"], *columns, "version", "created_at"])
+    old_values = ", ".join(["gen_random_uuid()", "OLD.id", *[f"OLD.{column}" for column in columns], "OLD.version", "now()"])
+    function = _function_name(table_name)
+
+    connection.execute(text(f"""
+        CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+        BEGIN
+            IF current_setting('{VERSIONING_SETTING}', true) IS DISTINCT FROM 'trigger' THEN
+                RETURN NEW;
+            END IF;
+            INSERT INTO {spec["history_table"]} ({history_columns}) VALUES ({old_values});
+            NEW.version := OLD.version + 1;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """))
+    connection.execute(text(f"DROP TRIGGER IF EXISTS {function} ON {table_name}"))
+    connection.execute(text(
+        f"CREATE TRIGGER {function} BEFORE UPDATE OF {', '.join(columns)} ON {table_name} "
+        f"FOR EACH ROW EXECUTE FUNCTION {function}()"
+    ))
+
+
+def drop_versioning_trigger(connection: Connection, table_name: str):
+    function = _function_name(table_name)
+    connection.execute(text(f"DROP TRIGGER IF EXISTS {function} ON {table_name}"))
+    connection.execute(text(f"DROP FUNCTION IF EXISTS {function}()"))
+
+
+def create_versioning_trigger_after_create(target: Table, connection: Connection, **kw):
+    if connection.dialect.name == "postgresql":
+        create_versioning_trigger(connection, target.name)
+
+
+def skip_trigger_versioning(db: Session, entity_id):
+    """Отключает триггер до конца текущей транзакции в шарде сущности: изменение не создаёт новую версию."""
+    if trigger_versioning_enabled() and db.get_bind(**shard_arguments(entity_id)).dialect.name == "postgresql":
+        db.execute(text(f"SET LOCAL {VERSIONING_SETTING} = 'off'"), bind_arguments=shard_arguments(entity_id))
+
+
+def enable_trigger_versioning(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"SET {VERSIONING_SETTING} = 'trigger'")
+    cursor.close()
+    # SET внутри неявно открытой транзакции отменился бы при возврате соединения в пул
+    dbapi_connection.commit()
+
+
+if trigger_versioning_enabled():
+    for shard_engine in engines:
+        if shard_engine.dialect.name == "postgresql":
+            event.listen(shard_engine, "connect", enable_trigger_versioning)
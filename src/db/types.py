@@ -0,0 +1,17 @@
+import uuid
+
+from sqlalchemy import TypeDecorator, Uuid
+
+
+class UUID(TypeDecorator):
+    """
+    Переносимый UUID: нативный тип в PostgreSQL, CHAR(32) в SQLite.
+    Принимает и строки — идентификаторы из запросов приходят в crud строками.
+    """
+    impl = Uuid
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            return uuid.UUID(value)
+        return value
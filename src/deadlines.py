@@ -0,0 +1,117 @@
+import os
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import Engine, event
+from sqlalchemy.orm import sessionmaker
+
+from src.exceptions import DeadlineExceeded
+from src.metrics import metrics
+from src.request_context import current_route, request_started_at
+
+
+# Бюджет времени запроса по умолчанию, мс; 0 — без ограничения
+REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", "10000"))
+# Бюджеты отдельных маршрутов через запятую: "GET /api/bids/my=2000,GET /api/tenders/=1000"
+ROUTE_DEADLINES_MS = {
+    route.strip(): float(budget)
+    for route, budget in (item.rsplit("=", 1) for item in os.getenv("ROUTE_DEADLINES_MS", "").split(",") if item.strip())
+}
+
+# SQLSTATE query_canceled: запрос прерван по statement_timeout
+QUERY_CANCELED = "57014"
+
+
+def route_budget_ms(route: str | None) -> float:
+    return ROUTE_DEADLINES_MS.get(route, REQUEST_DEADLINE_MS) if route else REQUEST_DEADLINE_MS
+
+
+def request_deadline() -> float | None:
+    """Дедлайн текущего запроса по time.monotonic или None, если маршрут не ограничен."""
+    budget_ms = route_budget_ms(current_route())
+    if not budget_ms:
+        return None
+    started_at = request_started_at.get() or time.monotonic()
+    return started_at + budget_ms / 1000
+
+
+def deadline_exceeded() -> DeadlineExceeded:
+    route = current_route()
+    metrics.inc("deadline_exceeded_total", {"route": route or "unknown"})
+    return DeadlineExceeded(f"Request deadline of {route_budget_ms(route):.0f} ms exceeded")
+
+
+def apply_deadline(session, transaction, connection):
+    """
+    Транзакция сессии запроса передаёт соединению свой session.info: дедлайн читается
+    перед каждым запросом (limit_statement), поэтому without_deadline действует и внутри
+    уже начатой транзакции. Если время уже вышло, транзакция не начинается.
+    """
+    deadline = session.info.get("deadline")
+    if deadline is None:
+        connection.info.pop("deadline_session_info", None)
+        return
+    if deadline <= time.monotonic():
+        raise deadline_exceeded()
+    connection.info["deadline_session_info"] = session.info
+
+
+def limit_statement(conn, cursor, statement, parameters, context, executemany):
+    """
+    Перед каждым запросом транзакции оставшееся до дедлайна время становится statement_timeout
+    (SET LOCAL действует до конца транзакции): PostgreSQL прерывает запрос и освобождает соединение,
+    а транзакция из нескольких запросов не выходит за дедлайн. Если время вышло, запрос не отправляется.
+    SET выполняется тем же курсором DBAPI, а не через Connection: события движка не вызываются повторно.
+    """
+    session_info = conn.info.get("deadline_session_info")
+    if session_info is None:
+        return
+    deadline = session_info.get("deadline")
+    is_postgresql = conn.dialect.name == "postgresql"
+    if deadline is None:
+        # Служебные запросы под without_deadline: ограничение, выставленное раньше в этой транзакции, снимается
+        if is_postgresql and conn.info.pop("statement_timeout_set", False):
+            cursor.execute("SET LOCAL statement_timeout TO DEFAULT")
+        return
+    remaining_ms = int((deadline - time.monotonic()) * 1000)
+    if remaining_ms <= 0:
+        raise deadline_exceeded()
+    if is_postgresql:
+        cursor.execute(f"SET LOCAL statement_timeout = {remaining_ms}")
+        conn.info["statement_timeout_set"] = True
+
+
+def release_connection(conn):
+    # conn.info живёт вместе с соединением пула: дедлайн не должен достаться следующей транзакции
+    conn.info.pop("deadline_session_info", None)
+    conn.info.pop("statement_timeout_set", None)
+
+
+@contextmanager
+def without_deadline(session):
+    """
+    Служебные запросы после истечения дедлайна (например, откат занятого ключа идемпотентности)
+    выполняются без него: иначе apply_deadline и limit_statement не дадут их выполнить.
+    """
+    deadline = session.info.pop("deadline", None)
+    try:
+        yield session
+    finally:
+        session.info["deadline"] = deadline
+
+
+def translate_query_canceled(exception_context):
+    if getattr(exception_context.original_exception, "pgcode", None) == QUERY_CANCELED:
+        return deadline_exceeded()
+    return None
+
+
+def install_deadlines(engines: list[Engine], session_factory: sessionmaker):
+    event.listen(session_factory, "after_begin", apply_deadline)
+    for engine in engines:
+        # Первым среди before_cursor_execute: SET не входит во время запроса в журнале медленных запросов,
+        # а отклонённый запрос не оставляет там незавершённого замера
+        event.listen(engine, "before_cursor_execute", limit_statement, insert=True)
+        event.listen(engine, "commit", release_connection)
+        event.listen(engine, "rollback", release_connection)
+        event.listen(engine, "handle_error", translate_query_canceled)
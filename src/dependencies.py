@@ -1,11 +1,114 @@
+import hmac
+import os
+
+from fastapi import Header, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
 from src.db.database import SessionLocal
+from src.deadlines import request_deadline
+from src.models import PaginationParameters, SparseFieldSet, CountMode
+
+
+# Токен для диагностических эндпоинтов /api/internal; без него они недоступны
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+PAGE_LIMIT = int(os.getenv("PAGE_LIMIT", "50"))
+# Доверенные сервисы: "токен:максимальный limit" через запятую, например "sync-service-token:1000"
+SERVICE_TOKENS = {
+    token.strip(): int(limit)
+    for token, limit in (item.rsplit(":", 1) for item in os.getenv("SERVICE_TOKENS", "").split(",") if item.strip())
+}
 
 
 def get_db() -> Session:
     db = SessionLocal()
+    # Транзакции сессии запроса ограничены дедлайном маршрута (src.deadlines)
+    db.info["deadline"] = request_deadline()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def check_page_limit(limit: int, offset: int, max_limit: int) -> PaginationParameters:
+    if limit > max_limit:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"limit must be less than or equal to {max_limit}")
+    return PaginationParameters(limit=limit, offset=offset)
+
+
+def get_pagination(
+    limit: int = Query(5, ge=0, description="Максимальное число возвращаемых объектов."),
+    offset: int = Query(0, ge=0, description="Сколько объектов пропустить с начала."),
+) -> PaginationParameters:
+    return check_page_limit(limit, offset, PAGE_LIMIT)
+
+
+def get_streaming_pagination(
+    limit: int = Query(5, ge=0, description="Максимальное число возвращаемых объектов."),
+    offset: int = Query(0, ge=0, description="Сколько объектов пропустить с начала."),
+    x_service_token: str | None = Header(None, description="Токен доверенного сервиса, разрешающий большие страницы.")
+) -> PaginationParameters:
+    """
+    Пагинация списков, которые страницы больше PAGE_LIMIT отдают потоком: только для них лимит
+    сервисного токена безопасен, остальные списки собирают страницу в памяти целиком.
+    """
+    max_limit = PAGE_LIMIT
+    if x_service_token is not None:
+        for token, token_limit in SERVICE_TOKENS.items():
+            if hmac.compare_digest(x_service_token, token):
+                max_limit = max(max_limit, token_limit)
+    return check_page_limit(limit, offset, max_limit)
+
+
+def sparse_fields(field_set: SparseFieldSet):
+    def get_fields(
+        fields: str | None = Query(None, description="Поля ответа через запятую, например id,name,status,version.")
+    ) -> list[str] | None:
+        try:
+            return field_set.parse(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return get_fields
+
+
+def get_expected_version(if_match: str | None = Header(None, description="Ожидаемая версия сущности (ETag).")) -> int | None:
+    """Разбирает If-Match ("3", W/"3" или 3) в ожидаемую версию; '*' и отсутствие заголовка — без проверки."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid If-Match header: '{if_match}'")
+
+
+def set_etag(response: Response, version: int):
+    response.headers["ETag"] = f'"{version}"'
+
+
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def set_cache_control(response: Response, immutable: bool):
+    """Исторические версии не меняются и кешируются клиентом бессрочно, остальное перепроверяется."""
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else "private, no-cache"
+
+
+def get_count_mode(
+    count: CountMode | None = Query(None, description="Общее число объектов в X-Total-Count: exact, estimated или auto.")
+) -> str | None:
+    return count.value if count else None
+
+
+def set_total_count(response: Response, total: tuple[int, str] | None) -> Response:
+    """Общее число объектов и способ подсчёта (exact или estimated), если клиент его запросил."""
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total[0])
+        response.headers["X-Total-Count-Mode"] = total[1]
+    return response
+
+
+def require_admin_token(x_admin_token: str | None = Header(None, description="Токен администратора.")):
+    if not ADMIN_TOKEN or x_admin_token is None or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
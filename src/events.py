@@ -0,0 +1,97 @@
+import asyncio
+import json
+import os
+import threading
+from uuid import UUID
+
+from src.metrics import metrics
+
+
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, keys: set[tuple[str, UUID]]):
+        self.loop = loop
+        self.keys = keys
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+
+    def deliver(self, event: dict):
+        # Вызывается в потоке event loop подписчика
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            metrics.inc("events_dropped_total")
+
+
+class EventBroker:
+    """
+    Внутрипроцессный брокер изменений статусов и версий тендеров и предложений.
+    Публикация вызывается из синхронного кода (пул потоков), доставка — в event loop подписчика.
+    """
+
+    def __init__(self):
+        self._subscriptions: dict[tuple[str, UUID], set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, keys: set[tuple[str, UUID]]) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop(), keys)
+        with self._lock:
+            for key in keys:
+                self._subscriptions.setdefault(key, set()).add(subscription)
+        metrics.inc("events_subscriptions_total")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for key in subscription.keys:
+                subscribers = self._subscriptions.get(key)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[key]
+
+    def publish(self, event: dict):
+        with self._lock:
+            subscribers = list(self._subscriptions.get((event["type"], event["id"]), ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+        metrics.inc("events_published_total", {"type": event["type"]})
+
+
+broker = EventBroker()
+
+
+def tender_event(tender) -> dict:
+    return {
+        "type": "tender",
+        "id": tender.id,
+        "status": tender.status.value,
+        "version": tender.version,
+        "organizationId": tender.organization_id,
+    }
+
+
+def bid_event(bid, organization_id: UUID) -> dict:
+    return {
+        "type": "bid",
+        "id": bid.id,
+        "status": bid.status.value,
+        "version": bid.version,
+        "tenderId": bid.tender_id,
+        "authorId": bid.author_id,
+        "organizationId": organization_id,
+    }
+
+
+def publish_tender_change(tender):
+    broker.publish(tender_event(tender))
+
+
+def publish_bid_change(bid, organization_id: UUID):
+    broker.publish(bid_event(bid, organization_id))
+
+
+def format_sse(event: dict) -> str:
+    data = json.dumps({key: str(value) if isinstance(value, UUID) else value for key, value in event.items()})
+    return f"id: {event['type']}:{event['id']}:{event['version']}\nevent: {event['type']}\ndata: {data}\n\n"
@@ -18,3 +18,18 @@ class BidNotFound(Exception):
 
 class BidVersionNotFound(Exception):
     pass
+
+class VersionConflict(Exception):
+    pass
+
+class IdempotencyKeyInProgress(Exception):
+    pass
+
+class IdempotencyKeyReused(Exception):
+    pass
+
+class DeadlineExceeded(Exception):
+    pass
+
+class InvalidCursor(Exception):
+    pass
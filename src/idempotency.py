@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+from datetime import timedelta
+from typing import Any, Callable
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+from starlette.responses import JSONResponse
+
+from src.db.crud import claim_idempotency_key, complete_idempotency_key, release_idempotency_key, \
+    purge_expired_idempotency_keys
+from src.db.database import SessionLocal
+from src.deadlines import without_deadline
+from src.exceptions import IdempotencyKeyInProgress, IdempotencyKeyReused
+from src.metrics import metrics
+
+
+IDEMPOTENCY_TTL = timedelta(hours=float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")))
+IDEMPOTENCY_PENDING_TIMEOUT = timedelta(seconds=float(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", "60")))
+IDEMPOTENCY_PURGE_INTERVAL_SECONDS = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "600"))
+
+
+def request_fingerprint(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys=True).encode()).hexdigest()
+
+
+def run_idempotent(db: Session, endpoint: str, key: str | None, payload: Any, fn: Callable[[], Any]) -> Any:
+    """
+    Выполняет fn не более одного раза для пары (endpoint, key).
+    Повтор с тем же ключом получает сохранённый ответ без повторного выполнения fn.
+    fn не фиксирует транзакцию: её фиксирует run_idempotent вместе с сохранённым ответом,
+    поэтому созданная сущность и завершённый ключ появляются в базе одновременно.
+    """
+    if key is None:
+        result = fn()
+        db.commit()
+        return result
+
+    request_hash = request_fingerprint(payload)
+    existing = claim_idempotency_key(db, endpoint, key, request_hash, IDEMPOTENCY_TTL, IDEMPOTENCY_PENDING_TIMEOUT)
+    if existing is not None:
+        if existing.request_hash != request_hash:
+            raise IdempotencyKeyReused(f"Idempotency-Key '{key}' was already used with a different request")
+        if existing.response_status is None:
+            raise IdempotencyKeyInProgress(f"Request with Idempotency-Key '{key}' is still in progress")
+        metrics.inc("idempotency_replays_total", {"endpoint": endpoint})
+        return JSONResponse(
+            status_code=existing.response_status,
+            content=json.loads(existing.response_body),
+            headers={"Idempotent-Replayed": "true"}
+        )
+
+    try:
+        result = fn()
+        complete_idempotency_key(db, endpoint, key, 200, json.dumps(jsonable_encoder(result)), commit=False)
+        # Один коммит атомарен только с одной базой: при шардировании ключ (шард 0) и сущность
+        # фиксируются по очереди (см. README, «Идемпотентность создания»)
+        db.commit()
+    except BaseException:
+        # Неуспешный запрос не сохраняется: клиент может повторить его с тем же ключом.
+        # Ключ освобождается и после DeadlineExceeded, поэтому без дедлайна запроса
+        with without_deadline(db):
+            release_idempotency_key(db, endpoint, key)
+        raise
+    return result
+
+
+def run_idempotency_purge():
+    db = SessionLocal()
+    try:
+        metrics.inc("idempotency_keys_purged_total", value=purge_expired_idempotency_keys(db))
+    finally:
+        db.close()
@@ -4,18 +4,59 @@ from starlette.requests import Request
 from starlette.responses import PlainTextResponse, JSONResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
-from src.db.database import engine, BaseModel
+from src.admission import admission_middleware
+from src.background import PeriodicTask, start_background_tasks, stop_background_tasks
+from src.compression import compression_middleware
+from src.db.archive import ARCHIVE_ENABLED, ARCHIVE_INTERVAL_SECONDS, run_archival
+from src.db.database import engines, BaseModel, SessionLocal
+from src.deadlines import install_deadlines
+from src.exceptions import DeadlineExceeded
+from src.db.history_journal import HISTORY_FLUSH_INTERVAL_SECONDS, journal_enabled, run_history_flush
+from src.db.partitions import HISTORY_PARTITION_INTERVAL_SECONDS, run_history_partitioning
+from src.idempotency import IDEMPOTENCY_PURGE_INTERVAL_SECONDS, run_idempotency_purge
+from src.profiling import profiling_middleware
+from src.request_context import request_context_middleware
+from src.slow_queries import install_slow_query_log
 from src.routes.tenders import router as tenders_router
 from src.routes.bids import router as bids_router
+from src.routes.internal import router as internal_router
+from src.routes.events import router as events_router
 
 
 app = FastAPI()
+app.middleware("http")(admission_middleware)
+app.middleware("http")(profiling_middleware)
+app.middleware("http")(compression_middleware)
+# Добавленный последним middleware выполняется первым: контекст запроса виден в остальных
+app.middleware("http")(request_context_middleware)
+for engine in engines:
+    install_slow_query_log(engine)
+install_deadlines(engines, SessionLocal)
 
 
 @app.on_event("startup")
 def startup_event():
     print("Creating all tables in the database if they do not exist...")
-    BaseModel.metadata.create_all(bind=engine)
+    for engine in engines:
+        BaseModel.metadata.create_all(bind=engine)
+    # Записи, оставшиеся в журнале истории после сбоя или смены режима, переносятся до приёма запросов
+    run_history_flush()
+
+    tasks = [PeriodicTask("purge-idempotency-keys", IDEMPOTENCY_PURGE_INTERVAL_SECONDS, run_idempotency_purge)]
+    if ARCHIVE_ENABLED:
+        tasks.append(PeriodicTask("archive-closed-tenders", ARCHIVE_INTERVAL_SECONDS, run_archival))
+    if journal_enabled():
+        tasks.append(PeriodicTask("flush-history-journal", HISTORY_FLUSH_INTERVAL_SECONDS, run_history_flush))
+    if any(engine.dialect.name == "postgresql" for engine in engines):
+        # Секции истории создаются заранее: на следующие месяцы, пока приложение работает
+        tasks.append(PeriodicTask("create-history-partitions", HISTORY_PARTITION_INTERVAL_SECONDS,
+                                  run_history_partitioning))
+    start_background_tasks(tasks)
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    stop_background_tasks()
 
 
 @app.exception_handler(StarletteHTTPException)
@@ -25,6 +66,13 @@ async def custom_http_exception_handler(request: Request, exc: StarletteHTTPExce
         content={"reason": exc.detail}
     )
 
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(
+        status_code=504,
+        content={"reason": str(exc)}
+    )
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     return JSONResponse(
@@ -34,6 +82,8 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 app.include_router(tenders_router)
 app.include_router(bids_router)
+app.include_router(internal_router)
+app.include_router(events_router)
 
 @app.get("/api/ping", response_class=PlainTextResponse)
 def ping():
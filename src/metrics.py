@@ -0,0 +1,46 @@
+import threading
+from collections import defaultdict
+
+
+class Metrics:
+    """Потокобезопасный реестр счётчиков и gauge-метрик в формате Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple, float] = defaultdict(float)
+        self._gauges: dict[tuple, float] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict[str, str] | None) -> tuple:
+        return name, tuple(sorted((labels or {}).items()))
+
+    def inc(self, name: str, labels: dict[str, str] | None = None, value: float = 1):
+        with self._lock:
+            self._counters[self._key(name, labels)] += value
+
+    def set(self, name: str, value: float, labels: dict[str, str] | None = None):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def get(self, name: str, labels: dict[str, str] | None = None) -> float:
+        key = self._key(name, labels)
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0))
+
+    def render(self) -> str:
+        with self._lock:
+            samples = [("counter", key, value) for key, value in self._counters.items()]
+            samples += [("gauge", key, value) for key, value in self._gauges.items()]
+
+        lines = []
+        declared = set()
+        for metric_type, (name, labels), value in sorted(samples, key=lambda sample: sample[1]):
+            if name not in declared:
+                lines.append(f"# TYPE {name} {metric_type}")
+                declared.add(name)
+            label_str = ",".join(f'{label}="{label_value}"' for label, label_value in labels)
+            lines.append(f"{name}{{{label_str}}} {value:g}" if label_str else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
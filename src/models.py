@@ -1,6 +1,10 @@
-from datetime import timezone
+import base64
+from datetime import datetime, timezone
 from enum import Enum
+from typing import Any, Callable
+from uuid import UUID
 from pydantic import BaseModel, Field
+from src.exceptions import InvalidCursor
 
 class TenderStatus(str, Enum):
     CREATED = "Created"
@@ -56,10 +60,68 @@ class TenderOut(BaseModel):
             dt = dt.replace(tzinfo=timezone.utc)
         return dt.isoformat().replace("+00:00", "Z")
 
+class SparseFieldSet:
+    """Поля ответа, доступные в параметре fields=, и атрибуты модели БД, из которых они строятся."""
+
+    def __init__(self, fields: dict[str, tuple[str, Callable[[Any], Any]]]):
+        self.fields = fields
+
+    def parse(self, fields: str | None) -> list[str] | None:
+        if not fields:
+            return None
+        names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(self.fields)}")
+        return names
+
+    def attributes(self, names: list[str] | None) -> list[str] | None:
+        return [self.fields[name][0] for name in names] if names else None
+
+    def serialize(self, row, names: list[str]) -> dict:
+        result = {}
+        for name in names:
+            attribute, convert = self.fields[name]
+            result[name] = convert(getattr(row, attribute))
+        return result
+
+
+def _same(value):
+    return value
+
+
+def _enum_value(value):
+    return value.value
+
+
+TENDER_FIELDS = SparseFieldSet({
+    "id": ("id", str),
+    "name": ("name", _same),
+    "description": ("description", _same),
+    "serviceType": ("service_type", _enum_value),
+    "status": ("status", _enum_value),
+    "organizationId": ("organization_id", str),
+    "version": ("version", _same),
+    "createdAt": ("created_at", TenderOut.format_rfc3339),
+})
+
+
 class PaginationParameters(BaseModel):
-    limit: int = Field(5, ge=0, le=50)
+    # Верхняя граница limit зависит от клиента и списка и проверяется в get_pagination / get_streaming_pagination
+    limit: int = Field(5, ge=0)
     offset: int = Field(0, ge=0)
 
+class CountMode(str, Enum):
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    AUTO = "auto"
+
+
+class ImportKind(str, Enum):
+    EMPLOYEES = "employees"
+    ORGANIZATIONS = "organizations"
+    RESPONSIBLES = "responsibles"
+
 
 class TenderStatusResponse(BaseModel):
     status: TenderStatus
@@ -68,6 +130,60 @@ class TenderStatusResponse(BaseModel):
         orm_mode = True
 
 
+class StatusBatchRequest(BaseModel):
+    ids: list[UUID] = Field(..., min_length=1, max_length=500)
+
+
+class TenderStatusItem(BaseModel):
+    id: str = Field(..., max_length=100)
+    status: TenderStatus
+    version: int = Field(..., ge=1)
+
+    @classmethod
+    def from_orm(cls, obj):
+        return cls(id=str(obj.id), status=obj.status.value, version=obj.version)
+
+
+class TenderVersionOut(BaseModel):
+    version: int = Field(..., ge=1)
+    name: str = Field(..., max_length=100)
+    description: str = Field(..., max_length=500)
+    serviceType: TenderServiceType
+    status: TenderStatus
+
+    @classmethod
+    def from_orm(cls, obj):
+        # Подходит и для записи истории, и для текущего состояния тендера
+        return cls(
+            version=obj.version,
+            name=obj.name,
+            description=obj.description,
+            serviceType=obj.service_type.value,
+            status=obj.status.value
+        )
+
+
+class VersionChange(BaseModel):
+    field: str
+    old: Any
+    new: Any
+
+
+class VersionDiffOut(BaseModel):
+    fromVersion: int = Field(..., ge=1)
+    toVersion: int = Field(..., ge=1)
+    changes: list[VersionChange]
+
+    @classmethod
+    def between(cls, old: BaseModel, new: BaseModel):
+        old_values, new_values = old.model_dump(mode="json"), new.model_dump(mode="json")
+        changes = [
+            VersionChange(field=field, old=old_values[field], new=new_values[field])
+            for field in old_values
+            if field != "version" and old_values[field] != new_values[field]
+        ]
+        return cls(fromVersion=old.version, toVersion=new.version, changes=changes)
+
 
 class BidStatus(str, Enum):
     CREATED = "Created"
@@ -124,6 +240,65 @@ class BidOut(BaseModel):
         return dt.isoformat().replace("+00:00", "Z")
 
 
+BID_FIELDS = SparseFieldSet({
+    "id": ("id", str),
+    "name": ("name", _same),
+    "description": ("description", _same),
+    "status": ("status", _enum_value),
+    "tenderId": ("tender_id", str),
+    "authorType": ("author_type", _enum_value),
+    "authorId": ("author_id", str),
+    "version": ("version", _same),
+    "createdAt": ("created_at", BidOut.format_rfc3339),
+})
+
+
+class TenderStatsOut(BaseModel):
+    tenderId: str = Field(..., max_length=100)
+    bidsByStatus: dict[BidStatus, int]
+    decisions: dict[str, int]
+    feedbackCount: int = Field(..., ge=0)
+    updatedAt: str | None = None
+
+    @classmethod
+    def from_orm(cls, obj):
+        return cls(
+            tenderId=str(obj.tender_id),
+            bidsByStatus={
+                BidStatus.CREATED: obj.bids_created,
+                BidStatus.PUBLISHED: obj.bids_published,
+                BidStatus.CANCELED: obj.bids_canceled,
+            },
+            decisions={
+                "Approved": obj.decisions_approved,
+                "Rejected": obj.decisions_rejected,
+            },
+            feedbackCount=obj.feedbacks,
+            updatedAt=TenderOut.format_rfc3339(obj.updated_at) if obj.updated_at else None
+        )
+
+
+class BidStatusItem(BaseModel):
+    id: str = Field(..., max_length=100)
+    status: BidStatus
+    version: int = Field(..., ge=1)
+
+    @classmethod
+    def from_orm(cls, obj):
+        return cls(id=str(obj.id), status=obj.status.value, version=obj.version)
+
+
+class BidVersionOut(BaseModel):
+    version: int = Field(..., ge=1)
+    name: str = Field(..., max_length=100)
+    description: str = Field(..., max_length=500)
+    status: BidStatus
+
+    @classmethod
+    def from_orm(cls, obj):
+        return cls(version=obj.version, name=obj.name, description=obj.description, status=obj.status.value)
+
+
 class BidFeedbackOut(BaseModel):
     id: str = Field(..., max_length=100)
     description: str = Field(..., max_length=1000)
@@ -144,4 +319,18 @@ class BidFeedbackOut(BaseModel):
     def format_rfc3339(dt):
         if dt.tzinfo is None:
             dt = dt.replace(tzinfo=timezone.utc)
-        return dt.isoformat().replace("+00:00", "Z")
\ No newline at end of file
+        return dt.isoformat().replace("+00:00", "Z")
+
+
+def encode_feedback_cursor(feedback) -> str:
+    raw = f"{feedback.created_at.isoformat()}|{feedback.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_feedback_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        created_at, feedback_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(feedback_id)
+    except ValueError:
+        # Ошибки base64, UTF-8, разбора даты и UUID — все наследники ValueError
+        raise InvalidCursor("Malformed cursor: pass the value of the X-Next-Cursor header unchanged")
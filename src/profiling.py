@@ -0,0 +1,164 @@
+import functools
+import hmac
+import inspect
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+
+from src.dependencies import ADMIN_TOKEN
+from src.metrics import metrics
+from src.request_context import current_route
+
+
+# Доля запросов, профилируемых без заголовка; по умолчанию только по запросу администратора
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "1"))
+PROFILES_MAX = int(os.getenv("PROFILES_MAX", "100"))
+
+PROFILE_HEADER = "x-profile"
+ADMIN_TOKEN_HEADER = "x-admin-token"
+
+active_profile: ContextVar["RequestProfile | None"] = ContextVar("active_profile", default=None)
+
+
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+class RequestProfile:
+    """
+    Семплирующий профиль одного запроса. Раз в PROFILING_INTERVAL_MS снимаются стеки потока
+    event loop (middleware, разбор и валидация запроса) и рабочих потоков, выполняющих endpoint.
+    Результат — свёрнутые стеки ("a;b;c 12"), которые принимают flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, route: str | None):
+        self.id = uuid.uuid4().hex
+        self.route = route
+        self.duration_ms = 0.0
+        self.samples: Counter[str] = Counter()
+        self._threads: dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.id[:8]}", daemon=True)
+
+    @contextmanager
+    def thread(self, role: str):
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = role
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads.pop(ident, None)
+
+    def _run(self):
+        interval = PROFILING_INTERVAL_MS / 1000
+        while not self._stopped.wait(interval):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads.items())
+            for ident, role in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                self.samples[";".join([role, *reversed(stack)])] += 1
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._sampler.join()
+        self.duration_ms = (time.perf_counter() - self._started_at) * 1000
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+class ProfileStore:
+    def __init__(self, max_size: int = PROFILES_MAX):
+        self.max_size = max_size
+        self._profiles: OrderedDict[str, RequestProfile] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.max_size:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> RequestProfile | None:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> list[RequestProfile]:
+        with self._lock:
+            return list(reversed(self._profiles.values()))
+
+
+profile_store = ProfileStore()
+
+
+def profiling_requested(request: Request) -> bool:
+    if PROFILING_SAMPLE_RATE and random.random() < PROFILING_SAMPLE_RATE:
+        return True
+    if request.headers.get(PROFILE_HEADER, "").lower() not in ("1", "true"):
+        return False
+    token = request.headers.get(ADMIN_TOKEN_HEADER)
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+async def profiling_middleware(request: Request, call_next):
+    if not profiling_requested(request):
+        return await call_next(request)
+
+    profile = RequestProfile(current_route())
+    contextvar_token = active_profile.set(profile)
+    profile.start()
+    try:
+        with profile.thread("event_loop"):
+            response = await call_next(request)
+    finally:
+        profile.stop()
+        active_profile.reset(contextvar_token)
+    # Маршрут известен только после маршрутизации
+    profile.route = current_route()
+    profile_store.add(profile)
+    metrics.inc("profiled_requests_total")
+    response.headers["X-Profile-Id"] = profile.id
+    return response
+
+
+def profiled(endpoint):
+    """Регистрирует рабочий поток синхронного endpoint в профиле запроса, если он профилируется."""
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = active_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        with profile.thread("worker"):
+            return endpoint(*args, **kwargs)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """Маршрут, синхронный endpoint которого попадает в профиль запроса вместе с потоком из пула."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
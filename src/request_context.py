@@ -0,0 +1,40 @@
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+
+from starlette.requests import Request
+
+
+# ASGI scope текущего запроса. Роутер дописывает в него найденный endpoint,
+# поэтому маршрут известен и коду, выполняющемуся после middleware (crud, события движка БД).
+current_scope: ContextVar[dict | None] = ContextVar("current_scope", default=None)
+# Момент начала обработки запроса (time.monotonic), от него отсчитывается дедлайн
+request_started_at: ContextVar[float | None] = ContextVar("request_started_at", default=None)
+
+
+@lru_cache(maxsize=None)
+def _route_path(app, endpoint) -> str | None:
+    for route in app.routes:
+        if getattr(route, "endpoint", None) is endpoint:
+            return route.path
+    return None
+
+
+def current_route() -> str | None:
+    """Маршрут текущего запроса в виде 'PATCH /api/bids/{bidId}/edit' или None вне запроса."""
+    scope = current_scope.get()
+    if scope is None:
+        return None
+    endpoint = scope.get("endpoint")
+    path = _route_path(scope["app"], endpoint) if endpoint is not None else None
+    return f"{scope['method']} {path or scope['path']}"
+
+
+async def request_context_middleware(request: Request, call_next):
+    token = current_scope.set(request.scope)
+    started_at_token = request_started_at.set(time.monotonic())
+    try:
+        return await call_next(request)
+    finally:
+        request_started_at.reset(started_at_token)
+        current_scope.reset(token)
@@ -1,41 +1,86 @@
+import json
+
 import fastapi
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, Header
 from sqlalchemy.orm import Session
+from starlette.responses import JSONResponse
 from uuid import UUID
 
+from src.coalescing import SingleFlight
 from src.db.models import BidDecisionStatus, BidFeedback
-from src.models import BidCreate, BidOut, BidUpdate, BidStatus, PaginationParameters, BidFeedbackOut
+from src.models import BidCreate, BidOut, BidUpdate, BidStatus, PaginationParameters, BidFeedbackOut, \
+    encode_feedback_cursor, decode_feedback_cursor, StatusBatchRequest, BidStatusItem, BidVersionOut, VersionDiffOut, BID_FIELDS
 from src.db.crud import (
     create_bid,
     get_bids_by_user,
     get_bids_for_tender,
+    tender_bids_query,
     get_bid_status,
+    get_bid_statuses,
     update_bid_status,
     update_bid,
     rollback_bid_version,
     submit_bid_feedback,
     submit_bid_decision,
     get_bid_feedbacks,
+    get_bid_for_history,
+    get_bid_history,
+    get_bid_history_versions,
+    count_bids_by_user,
+    count_bids_for_tender,
 )
-from src.dependencies import get_db
-from src.exceptions import UserNotFound, PermissionDenied, TenderNotFound, BidNotFound, BidVersionNotFound
+from src.dependencies import get_db, get_expected_version, set_etag, set_cache_control, get_pagination, \
+    get_streaming_pagination, PAGE_LIMIT, sparse_fields, get_count_mode, set_total_count
+from src.idempotency import run_idempotent
+from src.profiling import ProfiledRoute
+from src.snapshots import SnapshotCache
+from src.streaming import stream_json_array
+from src.exceptions import UserNotFound, PermissionDenied, TenderNotFound, BidNotFound, BidVersionNotFound, VersionConflict, \
+    IdempotencyKeyInProgress, IdempotencyKeyReused, DeadlineExceeded, InvalidCursor
+
+router = APIRouter(prefix="/api/bids", tags=["Bids"], route_class=ProfiledRoute)
 
-router = APIRouter(prefix="/api/bids", tags=["Bids"])
+tender_bids_flight = SingleFlight("tender_bids")
+bid_snapshots = SnapshotCache("bid_versions")
 
 def handle_exception(e: Exception, status_code: int):
+    if isinstance(e, DeadlineExceeded):
+        # Превышение дедлайна не зависит от ветки except: ответ 504 формирует обработчик приложения
+        raise e
     raise HTTPException(
         status_code=status_code,
         detail=str(e)
     )
 
+def load_bid_versions(db: Session, bid, versions: list[int]) -> dict[int, BidVersionOut]:
+    # Текущая версия может измениться без смены номера (отмена по решению), поэтому в кеш не попадает
+    snapshots = {bid.version: BidVersionOut.from_orm(bid)} if bid.version in versions else {}
+    snapshots.update(bid_snapshots.get_many(
+        bid.id,
+        [version for version in versions if version < bid.version],
+        lambda missing: {
+            record.version: BidVersionOut.from_orm(record)
+            for record in get_bid_history_versions(db=db, bid=bid, versions=missing)
+        }
+    ))
+    for version in versions:
+        if version not in snapshots:
+            raise BidVersionNotFound(f"Bid version '{version}' not found for bid ID '{bid.id}'")
+    return snapshots
+
 @router.post("/new", response_model=BidOut)
 def create_new_bid(
     bid_data: BidCreate,
+    idempotency_key: str | None = Header(None, max_length=255, description="Ключ идемпотентности повторов."),
     db: Session = Depends(get_db)
 ):
     try:
-        bid = create_bid(db=db, bid_data=bid_data)
-        return BidOut.from_orm(bid)
+        return run_idempotent(db, "bids.new", idempotency_key, bid_data,
+                              lambda: BidOut.from_orm(create_bid(db=db, bid_data=bid_data, commit=False)))
+    except IdempotencyKeyInProgress as e:
+        handle_exception(e, fastapi.status.HTTP_409_CONFLICT)
+    except IdempotencyKeyReused as e:
+        handle_exception(e, fastapi.status.HTTP_422_UNPROCESSABLE_ENTITY)
     except UserNotFound as e:
         handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
     except PermissionDenied as e:
@@ -47,12 +92,20 @@ def create_new_bid(
 
 @router.get("/my", response_model=list[BidOut])
 def get_user_bids(
+    response: Response,
     username: str,
-    pagination: PaginationParameters = Depends(),
+    pagination: PaginationParameters = Depends(get_pagination),
+    fields: list[str] | None = Depends(sparse_fields(BID_FIELDS)),
+    count: str | None = Depends(get_count_mode),
     db: Session = Depends(get_db)
 ):
     try:
-        bids = get_bids_by_user(db=db, username=username, limit=pagination.limit, offset=pagination.offset)
+        bids = get_bids_by_user(db=db, username=username, limit=pagination.limit, offset=pagination.offset,
+                                attributes=BID_FIELDS.attributes(fields))
+        total = count_bids_by_user(db=db, username=username, mode=count) if count else None
+        if fields:
+            return set_total_count(JSONResponse([BID_FIELDS.serialize(bid, fields) for bid in bids]), total)
+        set_total_count(response, total)
         return [BidOut.from_orm(bid) for bid in bids]
     except UserNotFound as e:
         handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
@@ -61,14 +114,37 @@ def get_user_bids(
 
 @router.get("/{tenderId}/list", response_model=list[BidOut])
 def get_bids_for_tender_endpoint(
+    response: Response,
     tenderId: UUID,
     username: str,
-    pagination: PaginationParameters = Depends(),
+    pagination: PaginationParameters = Depends(get_streaming_pagination),
+    fields: list[str] | None = Depends(sparse_fields(BID_FIELDS)),
+    count: str | None = Depends(get_count_mode),
     db: Session = Depends(get_db)
 ):
     try:
-        bids = get_bids_for_tender(db=db, tender_id=tenderId, username=username, limit=pagination.limit, offset=pagination.offset)
-        return [BidOut.from_orm(bid) for bid in bids]
+        attributes = BID_FIELDS.attributes(fields)
+        if pagination.limit > PAGE_LIMIT:
+            # Большие страницы доверенных клиентов отдаются потоком, не собираясь в памяти целиком
+            query = tender_bids_query(db=db, tender_id=tenderId, username=username, limit=pagination.limit,
+                                      offset=pagination.offset, attributes=attributes)
+            total = count_bids_for_tender(db=db, tender_id=tenderId, username=username, mode=count) if count else None
+            if fields:
+                serialize = lambda bid: json.dumps(BID_FIELDS.serialize(bid, fields), ensure_ascii=False)
+            else:
+                serialize = lambda bid: BidOut.from_orm(bid).model_dump_json()
+            return set_total_count(stream_json_array(query, serialize), total)
+        key = (tenderId, username, pagination.limit, pagination.offset, tuple(fields or ()), count)
+        bids, total = tender_bids_flight.do(key, lambda: ([
+            BID_FIELDS.serialize(bid, fields) if fields else BidOut.from_orm(bid)
+            for bid in get_bids_for_tender(db=db, tender_id=tenderId, username=username, limit=pagination.limit,
+                                           offset=pagination.offset, attributes=attributes)
+        ], count_bids_for_tender(db=db, tender_id=tenderId, username=username, mode=count) if count else None))
+        if fields:
+            # Неполные объекты не проходят проверку response_model и отдаются как есть
+            return set_total_count(JSONResponse(bids), total)
+        set_total_count(response, total)
+        return bids
     except UserNotFound as e:
         handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
     except PermissionDenied as e:
@@ -96,20 +172,40 @@ def get_bid_status_endpoint(
     except Exception as e:
         handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
 
+@router.post("/status/batch", response_model=list[BidStatusItem])
+def get_bid_statuses_batch(
+    request: StatusBatchRequest,
+    username: str,
+    db: Session = Depends(get_db)
+):
+    try:
+        bids = get_bid_statuses(db=db, bid_ids=request.ids, username=username)
+        return [BidStatusItem.from_orm(bid) for bid in bids]
+    except UserNotFound as e:
+        handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
+    except Exception as e:
+        handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
+
 @router.put("/{bidId}/status", response_model=BidOut)
 def update_bid_status_endpoint(
     bidId: UUID,
     status: BidStatus,
     username: str,
+    response: Response,
+    expected_version: int | None = Depends(get_expected_version),
     db: Session = Depends(get_db)
 ):
     try:
-        bid = update_bid_status(db=db, bid_id=bidId, new_status=status, username=username)
+        bid = update_bid_status(db=db, bid_id=bidId, new_status=status, username=username,
+                                expected_version=expected_version)
+        set_etag(response, bid.version)
         return BidOut.from_orm(bid)
     except UserNotFound as e:
         handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
     except PermissionDenied as e:
         handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except VersionConflict as e:
+        handle_exception(e, fastapi.status.HTTP_412_PRECONDITION_FAILED)
     except BidNotFound as e:  # Исправлено: проверка на существование предложения
         handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
     except Exception as e:
@@ -124,15 +220,21 @@ def edit_bid(
     bidId: UUID,
     bid_data: BidUpdate,
     username: str,
+    response: Response,
+    expected_version: int | None = Depends(get_expected_version),
     db: Session = Depends(get_db)
 ):
     try:
-        bid = update_bid(db=db, bid_id=bidId, bid_data=bid_data, username=username)
+        bid = update_bid(db=db, bid_id=bidId, bid_data=bid_data, username=username,
+                         expected_version=expected_version)
+        set_etag(response, bid.version)
         return BidOut.from_orm(bid)
     except UserNotFound as e:
         handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
     except PermissionDenied as e:
         handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except VersionConflict as e:
+        handle_exception(e, fastapi.status.HTTP_412_PRECONDITION_FAILED)
     except BidNotFound as e:
         handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
     except Exception as e:
@@ -184,15 +286,21 @@ def rollback_bid_version_endpoint(
     bidId: UUID,
     version: int,
     username: str,
+    response: Response,
+    expected_version: int | None = Depends(get_expected_version),
     db: Session = Depends(get_db)
 ):
     try:
-        bid = rollback_bid_version(db=db, bid_id=bidId, version=version, username=username)
+        bid = rollback_bid_version(db=db, bid_id=bidId, version=version, username=username,
+                                   expected_version=expected_version)
+        set_etag(response, bid.version)
         return BidOut.from_orm(bid)
     except UserNotFound as e:
         handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
     except PermissionDenied as e:
         handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except VersionConflict as e:
+        handle_exception(e, fastapi.status.HTTP_412_PRECONDITION_FAILED)
     except BidVersionNotFound as e:
         handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
     except BidNotFound as e:
@@ -206,7 +314,9 @@ def get_bid_reviews(
     tenderId: UUID,
     authorUsername: str,
     requesterUsername: str,
-    pagination: PaginationParameters = Depends(),
+    response: Response,
+    cursor: str | None = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor."),
+    pagination: PaginationParameters = Depends(get_pagination),
     db: Session = Depends(get_db)
 ):
     try:
@@ -216,9 +326,14 @@ def get_bid_reviews(
             author_username=authorUsername,
             requester_username=requesterUsername,
             limit=pagination.limit,
-            offset=pagination.offset
+            offset=pagination.offset,
+            after=decode_feedback_cursor(cursor) if cursor else None
         )
+        if feedbacks and len(feedbacks) == pagination.limit:
+            response.headers["X-Next-Cursor"] = encode_feedback_cursor(feedbacks[-1])
         return [BidFeedbackOut.from_orm(feedback) for feedback in feedbacks]
+    except InvalidCursor as e:
+        handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
     except UserNotFound as e:
         handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
     except PermissionDenied as e:
@@ -226,4 +341,75 @@ def get_bid_reviews(
     except TenderNotFound as e:
         handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
     except Exception as e:
-        handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
+
+
+@router.get("/{bidId}/versions", response_model=list[BidVersionOut])
+def get_bid_versions(
+    bidId: UUID,
+    username: str,
+    response: Response,
+    pagination: PaginationParameters = Depends(get_pagination),
+    db: Session = Depends(get_db)
+):
+    try:
+        bid = get_bid_for_history(db=db, bid_id=bidId, username=username)
+        history = get_bid_history(db=db, bid=bid, limit=pagination.limit, offset=pagination.offset)
+        # Новые версии добавляются только в конец истории, поэтому заполненная страница уже не изменится
+        set_cache_control(response, immutable=pagination.limit > 0 and len(history) == pagination.limit)
+        return [BidVersionOut.from_orm(record) for record in history]
+    except UserNotFound as e:
+        handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
+    except PermissionDenied as e:
+        handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except BidNotFound as e:
+        handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
+
+
+@router.get("/{bidId}/versions/{version}", response_model=BidVersionOut)
+def get_bid_version(
+    bidId: UUID,
+    version: int,
+    username: str,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    try:
+        bid = get_bid_for_history(db=db, bid_id=bidId, username=username)
+        snapshot = load_bid_versions(db, bid, [version])[version]
+        set_cache_control(response, immutable=version < bid.version)
+        return snapshot
+    except UserNotFound as e:
+        handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
+    except PermissionDenied as e:
+        handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except (BidNotFound, BidVersionNotFound) as e:
+        handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
+
+
+@router.get("/{bidId}/diff", response_model=VersionDiffOut)
+def get_bid_diff(
+    bidId: UUID,
+    username: str,
+    response: Response,
+    fromVersion: int = Query(..., ge=1, description="Исходная версия."),
+    toVersion: int = Query(..., ge=1, description="Версия, с которой сравнивается исходная."),
+    db: Session = Depends(get_db)
+):
+    try:
+        bid = get_bid_for_history(db=db, bid_id=bidId, username=username)
+        snapshots = load_bid_versions(db, bid, [fromVersion, toVersion])
+        set_cache_control(response, immutable=max(fromVersion, toVersion) < bid.version)
+        return VersionDiffOut.between(snapshots[fromVersion], snapshots[toVersion])
+    except UserNotFound as e:
+        handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
+    except PermissionDenied as e:
+        handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except (BidNotFound, BidVersionNotFound) as e:
+        handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import time
+from uuid import UUID
+
+import fastapi
+from fastapi import APIRouter, HTTPException, Query
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+from src.db.crud import get_user_by_username, get_tender_status, get_bid_status
+from src.db.database import SessionLocal
+from src.db.models import OrganizationResponsible, Tender, Bid, TenderStatus, BidStatus
+from src.events import broker, tender_event, bid_event, format_sse
+from src.exceptions import UserNotFound, PermissionDenied, TenderNotFound, BidNotFound, DeadlineExceeded
+
+router = APIRouter(prefix="/api/events", tags=["Events"])
+
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_PERMISSIONS_REFRESH_SECONDS = float(os.getenv("EVENTS_PERMISSIONS_REFRESH_SECONDS", "60"))
+EVENTS_MAX_SUBSCRIPTIONS = int(os.getenv("EVENTS_MAX_SUBSCRIPTIONS", "100"))
+
+
+def handle_exception(e: Exception, status_code: int):
+    if isinstance(e, DeadlineExceeded):
+        # Превышение дедлайна не зависит от ветки except: ответ 504 формирует обработчик приложения
+        raise e
+    raise HTTPException(
+        status_code=status_code,
+        detail=str(e)
+    )
+
+
+class StreamPermissions:
+    """
+    Права пользователя на момент подключения: id пользователя и организаций, за которые он отвечает.
+    Каждое событие проверяется по этим данным без обращения к БД; набор организаций периодически обновляется.
+    """
+
+    # Меняется при массовом изменении ответственных: все потоки перечитывают права при следующем событии
+    generation = 0
+
+    def __init__(self, user_id: UUID, organization_ids: set[UUID]):
+        self.user_id = user_id
+        self.organization_ids = organization_ids
+        self.loaded_at = time.monotonic()
+        self.loaded_generation = StreamPermissions.generation
+
+    def is_stale(self) -> bool:
+        return self.loaded_generation != StreamPermissions.generation or \
+            time.monotonic() - self.loaded_at > EVENTS_PERMISSIONS_REFRESH_SECONDS
+
+    def can_view(self, event: dict) -> bool:
+        if event["organizationId"] in self.organization_ids:
+            return True
+        if event["type"] == "tender":
+            return event["status"] == TenderStatus.PUBLISHED.value
+        return event["status"] == BidStatus.PUBLISHED.value or event["authorId"] == self.user_id
+
+
+def invalidate_stream_permissions():
+    StreamPermissions.generation += 1
+
+
+def load_responsible_organizations(db, user_id: UUID) -> set[UUID]:
+    return set(db.scalars(
+        select(OrganizationResponsible.organization_id).where(OrganizationResponsible.user_id == user_id)
+    ).all())
+
+
+def authorize_subscription(username: str, tender_ids: list[UUID], bid_ids: list[UUID]) -> tuple[StreamPermissions, list[dict]]:
+    db = SessionLocal()
+    try:
+        user = get_user_by_username(db, username)
+        snapshots = []
+        for tender_id in tender_ids:
+            # Те же правила доступа, что и у GET /api/tenders/{tenderId}/status
+            get_tender_status(db, tender_id, username)
+            tender = db.get(Tender, tender_id)
+            if tender is not None:
+                snapshots.append(tender_event(tender))
+        for bid_id in bid_ids:
+            get_bid_status(db, bid_id, username)
+            bid = db.get(Bid, bid_id)
+            if bid is not None:
+                snapshots.append(bid_event(bid, bid.tender.organization_id))
+        return StreamPermissions(user.id, load_responsible_organizations(db, user.id)), snapshots
+    finally:
+        db.close()
+
+
+def refresh_permissions(permissions: StreamPermissions):
+    generation = StreamPermissions.generation
+    db = SessionLocal()
+    try:
+        permissions.organization_ids = load_responsible_organizations(db, permissions.user_id)
+        permissions.loaded_at = time.monotonic()
+        permissions.loaded_generation = generation
+    finally:
+        db.close()
+
+
+@router.get("/stream")
+async def stream_status_changes(
+    request: Request,
+    username: str,
+    tenderId: list[UUID] = Query([], description="Тендеры, изменения статуса и версии которых нужно получать."),
+    bidId: list[UUID] = Query([], description="Предложения, изменения статуса и версии которых нужно получать.")
+):
+    if not tenderId and not bidId:
+        handle_exception(ValueError("At least one tenderId or bidId is required"), fastapi.status.HTTP_400_BAD_REQUEST)
+    if len(tenderId) + len(bidId) > EVENTS_MAX_SUBSCRIPTIONS:
+        handle_exception(ValueError(f"At most {EVENTS_MAX_SUBSCRIPTIONS} subscriptions per stream"),
+                         fastapi.status.HTTP_400_BAD_REQUEST)
+
+    try:
+        permissions, snapshots = await run_in_threadpool(authorize_subscription, username, tenderId, bidId)
+    except UserNotFound as e:
+        handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
+    except PermissionDenied as e:
+        handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except (TenderNotFound, BidNotFound) as e:
+        handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
+
+    keys = {("tender", tender_id) for tender_id in tenderId} | {("bid", bid_id) for bid_id in bidId}
+    subscription = broker.subscribe(keys)
+
+    async def event_stream():
+        try:
+            # Текущее состояние отправляется сразу, чтобы клиенту не нужен был отдельный запрос статуса
+            for snapshot in snapshots:
+                yield format_sse(snapshot)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if permissions.is_stale():
+                    await run_in_threadpool(refresh_permissions, permissions)
+                if permissions.can_view(event):
+                    yield format_sse(event)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,74 @@
+import io
+import os
+import tempfile
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+
+from src.db.bulk_import import CSV, NDJSON, run_import
+from src.dependencies import require_admin_token
+from src.metrics import metrics
+from src.models import ImportKind
+from src.profiling import profile_store
+from src.routes.events import invalidate_stream_permissions
+from src.slow_queries import slow_query_log
+
+router = APIRouter(prefix="/api/internal", tags=["Internal"])
+
+# Тело импорта до этого размера держится в памяти, больше — во временном файле
+IMPORT_SPOOL_BYTES = int(os.getenv("IMPORT_SPOOL_BYTES", str(16 * 1024 * 1024)))
+IMPORT_FORMATS = {"text/csv": CSV, "application/x-ndjson": NDJSON, "application/jsonl": NDJSON}
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return metrics.render()
+
+
+@router.get("/slow-queries", dependencies=[Depends(require_admin_token)])
+def get_slow_queries(limit: int = Query(20, ge=1, le=200, description="Количество самых тяжёлых запросов.")):
+    return slow_query_log.worst(limit)
+
+
+@router.get("/profiles", dependencies=[Depends(require_admin_token)])
+def get_profiles():
+    return [
+        {"id": profile.id, "route": profile.route, "durationMs": profile.duration_ms, "samples": sum(profile.samples.values())}
+        for profile in profile_store.list()
+    ]
+
+
+@router.get("/profiles/{profileId}", response_class=PlainTextResponse, dependencies=[Depends(require_admin_token)])
+def get_profile(profileId: str):
+    """Профиль в формате свёрнутых стеков: flamegraph.pl, speedscope, inferno."""
+    profile = profile_store.get(profileId)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Profile '{profileId}' not found")
+    return profile.folded()
+
+
+@router.post("/import/{kind}", dependencies=[Depends(require_admin_token)])
+async def import_reference_data(kind: ImportKind, request: Request):
+    """
+    Массовая загрузка сотрудников, организаций или ответственных из тела запроса в формате CSV
+    (Content-Type: text/csv) или NDJSON (application/x-ndjson). В ответе — число созданных
+    и обновлённых строк и отклонённые строки с номером и причиной.
+    """
+    format = IMPORT_FORMATS.get(request.headers.get("content-type", "").split(";")[0].strip())
+    if format is None:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail=f"Content-Type must be one of {', '.join(IMPORT_FORMATS)}")
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as body:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+        stream = io.TextIOWrapper(body, encoding="utf-8", newline="")
+        try:
+            report = await run_in_threadpool(run_import, kind.value, stream, format)
+        except UnicodeDecodeError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Body is not valid UTF-8: {e}")
+    # Права открытых потоков событий зависят от ответственных и перечитываются при следующем событии
+    invalidate_stream_permissions()
+    return report.as_dict()
@@ -1,50 +1,106 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, Header
 import fastapi
 from uuid import UUID
 
 from src.models import TenderCreate, TenderOut, TenderUpdate, TenderStatus, PaginationParameters, \
-    TenderServiceType
+    TenderServiceType, StatusBatchRequest, TenderStatusItem, TenderVersionOut, VersionDiffOut, TENDER_FIELDS, \
+    TenderStatsOut
 from src.db.crud import (
     get_tenders,
     create_tender,
     get_tender_status,
+    get_tender_statuses,
     get_tenders_by_user,
     update_tender,
     update_tender_status,
-    rollback_tender_version
+    rollback_tender_version,
+    get_tender_for_history,
+    get_tender_history,
+    get_tender_history_versions,
+    count_tenders,
+    count_tenders_by_user,
+    get_tender_stats,
 )
 from sqlalchemy.orm import Session
-from src.dependencies import get_db
-from src.exceptions import UserNotFound, PermissionDenied, TenderNotFound, TenderVersionNotFound
+from starlette.responses import JSONResponse
+from src.coalescing import SingleFlight
+from src.dependencies import get_db, get_expected_version, set_etag, set_cache_control, get_pagination, \
+    sparse_fields, get_count_mode, set_total_count
+from src.idempotency import run_idempotent
+from src.profiling import ProfiledRoute
+from src.snapshots import SnapshotCache
+from src.exceptions import UserNotFound, PermissionDenied, TenderNotFound, TenderVersionNotFound, VersionConflict, \
+    IdempotencyKeyInProgress, IdempotencyKeyReused, DeadlineExceeded
 
-router = APIRouter(prefix="/api/tenders", tags=["Tenders"])
+router = APIRouter(prefix="/api/tenders", tags=["Tenders"], route_class=ProfiledRoute)
+
+tenders_feed_flight = SingleFlight("tenders_feed")
+tender_snapshots = SnapshotCache("tender_versions")
 
 def handle_exception(e: Exception, status_code: int):
+    if isinstance(e, DeadlineExceeded):
+        # Превышение дедлайна не зависит от ветки except: ответ 504 формирует обработчик приложения
+        raise e
     raise HTTPException(
         status_code=status_code,
         detail=str(e)
     )
 
+def load_tender_versions(db: Session, tender, versions: list[int]) -> dict[int, TenderVersionOut]:
+    # Текущая версия может измениться без смены номера (закрытие по решению), поэтому в кеш не попадает
+    snapshots = {tender.version: TenderVersionOut.from_orm(tender)} if tender.version in versions else {}
+    snapshots.update(tender_snapshots.get_many(
+        tender.id,
+        [version for version in versions if version < tender.version],
+        lambda missing: {
+            record.version: TenderVersionOut.from_orm(record)
+            for record in get_tender_history_versions(db=db, tender=tender, versions=missing)
+        }
+    ))
+    for version in versions:
+        if version not in snapshots:
+            raise TenderVersionNotFound(f"Tender version '{version}' not found for tender ID '{tender.id}'")
+    return snapshots
+
 @router.get("/", response_model=list[TenderOut])
 def get_all_tenders(
+    response: Response,
     service_type: list[TenderServiceType] | None = Query(None, description="Тип услуг для фильтрации тендеров."),
-    pagination: PaginationParameters = Depends(),
+    pagination: PaginationParameters = Depends(get_pagination),
+    fields: list[str] | None = Depends(sparse_fields(TENDER_FIELDS)),
+    count: str | None = Depends(get_count_mode),
     db: Session = Depends(get_db)
 ):
     try:
-        tenders = get_tenders(db=db, service_type=service_type, limit=pagination.limit, offset=pagination.offset)
-        return [TenderOut.from_orm(tender) for tender in tenders]
+        # Публичная лента одинакова для всех пользователей, поэтому контекст прав в ключ не входит
+        key = (tuple(sorted(st.value for st in service_type or [])), pagination.limit, pagination.offset,
+               tuple(fields or ()), count)
+        tenders, total = tenders_feed_flight.do(key, lambda: ([
+            TENDER_FIELDS.serialize(tender, fields) if fields else TenderOut.from_orm(tender)
+            for tender in get_tenders(db=db, service_type=service_type, limit=pagination.limit, offset=pagination.offset,
+                                      attributes=TENDER_FIELDS.attributes(fields))
+        ], count_tenders(db=db, service_type=service_type, mode=count) if count else None))
+        if fields:
+            # Неполные объекты не проходят проверку response_model и отдаются как есть
+            return set_total_count(JSONResponse(tenders), total)
+        set_total_count(response, total)
+        return tenders
     except Exception as e:
         handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
 
 @router.post("/new", response_model=TenderOut)
 def create_new_tender(
     tender_data: TenderCreate,
+    idempotency_key: str | None = Header(None, max_length=255, description="Ключ идемпотентности повторов."),
     db: Session = Depends(get_db)
 ):
     try:
-        tender = create_tender(db=db, tender_data=tender_data)
-        return TenderOut.from_orm(tender)
+        return run_idempotent(db, "tenders.new", idempotency_key, tender_data,
+                              lambda: TenderOut.from_orm(create_tender(db=db, tender_data=tender_data, commit=False)))
+    except IdempotencyKeyInProgress as e:
+        handle_exception(e, fastapi.status.HTTP_409_CONFLICT)
+    except IdempotencyKeyReused as e:
+        handle_exception(e, fastapi.status.HTTP_422_UNPROCESSABLE_ENTITY)
     except UserNotFound as e:
         handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
     except PermissionDenied as e:
@@ -54,12 +110,20 @@ def create_new_tender(
 
 @router.get("/my", response_model=list[TenderOut])
 def get_user_tenders(
+    response: Response,
     username: str,
-    pagination: PaginationParameters = Depends(),
+    pagination: PaginationParameters = Depends(get_pagination),
+    fields: list[str] | None = Depends(sparse_fields(TENDER_FIELDS)),
+    count: str | None = Depends(get_count_mode),
     db: Session = Depends(get_db)
 ):
     try:
-        tenders = get_tenders_by_user(db=db, username=username, limit=pagination.limit, offset=pagination.offset)
+        tenders = get_tenders_by_user(db=db, username=username, limit=pagination.limit, offset=pagination.offset,
+                                      attributes=TENDER_FIELDS.attributes(fields))
+        total = count_tenders_by_user(db=db, username=username, mode=count) if count else None
+        if fields:
+            return set_total_count(JSONResponse([TENDER_FIELDS.serialize(tender, fields) for tender in tenders]), total)
+        set_total_count(response, total)
         return [TenderOut.from_orm(tender) for tender in tenders]
     except UserNotFound as e:
         handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
@@ -82,20 +146,55 @@ def get_tender_current_status(
     except TenderNotFound as e:
         handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
 
+@router.get("/{tenderId}/stats", response_model=TenderStatsOut)
+def get_tender_stats_endpoint(
+    tenderId: UUID,
+    username: str,
+    db: Session = Depends(get_db)
+):
+    try:
+        return TenderStatsOut.from_orm(get_tender_stats(db=db, tender_id=tenderId, username=username))
+    except UserNotFound as e:
+        handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
+    except PermissionDenied as e:
+        handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except TenderNotFound as e:
+        handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
+
+@router.post("/status/batch", response_model=list[TenderStatusItem])
+def get_tender_statuses_batch(
+    request: StatusBatchRequest,
+    username: str,
+    db: Session = Depends(get_db)
+):
+    try:
+        tenders = get_tender_statuses(db=db, tender_ids=request.ids, username=username)
+        return [TenderStatusItem.from_orm(tender) for tender in tenders]
+    except UserNotFound as e:
+        handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
+    except Exception as e:
+        handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
+
 @router.put("/{tenderId}/status", response_model=TenderOut)
 def update_tender_status_endpoint(
     tenderId: UUID,
     status: TenderStatus,
     username: str,
+    response: Response,
+    expected_version: int | None = Depends(get_expected_version),
     db: Session = Depends(get_db)
 ):
     try:
-        tender = update_tender_status(db=db, tender_id=tenderId, new_status=status, username=username)
+        tender = update_tender_status(db=db, tender_id=tenderId, new_status=status, username=username,
+                                      expected_version=expected_version)
+        set_etag(response, tender.version)
         return TenderOut.from_orm(tender)
     except UserNotFound as e:
         handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
     except PermissionDenied as e:
         handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except VersionConflict as e:
+        handle_exception(e, fastapi.status.HTTP_412_PRECONDITION_FAILED)
     except TenderNotFound as e:
         handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
     except Exception as e:
@@ -106,15 +205,21 @@ def edit_tender(
     tenderId: UUID,
     tender_data: TenderUpdate,
     username: str,
+    response: Response,
+    expected_version: int | None = Depends(get_expected_version),
     db: Session = Depends(get_db)
 ):
     try:
-        tender = update_tender(db=db, tender_id=tenderId, tender_data=tender_data, username=username)
+        tender = update_tender(db=db, tender_id=tenderId, tender_data=tender_data, username=username,
+                               expected_version=expected_version)
+        set_etag(response, tender.version)
         return TenderOut.from_orm(tender)
     except UserNotFound as e:
         handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
     except PermissionDenied as e:
         handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except VersionConflict as e:
+        handle_exception(e, fastapi.status.HTTP_412_PRECONDITION_FAILED)
     except TenderNotFound as e:
         handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
     except Exception as e:
@@ -125,16 +230,90 @@ def rollback_tender(
     tenderId: UUID,
     version: int,
     username: str,
+    response: Response,
+    expected_version: int | None = Depends(get_expected_version),
     db: Session = Depends(get_db)
 ):
     try:
-        tender = rollback_tender_version(db=db, tender_id=tenderId, version=version, username=username)
+        tender = rollback_tender_version(db=db, tender_id=tenderId, version=version, username=username,
+                                         expected_version=expected_version)
+        set_etag(response, tender.version)
         return TenderOut.from_orm(tender)
     except UserNotFound as e:
         handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
     except PermissionDenied as e:
         handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except VersionConflict as e:
+        handle_exception(e, fastapi.status.HTTP_412_PRECONDITION_FAILED)
     except TenderVersionNotFound as e:
         handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
     except Exception as e:
         handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
+
+@router.get("/{tenderId}/versions", response_model=list[TenderVersionOut])
+def get_tender_versions(
+    tenderId: UUID,
+    username: str,
+    response: Response,
+    pagination: PaginationParameters = Depends(get_pagination),
+    db: Session = Depends(get_db)
+):
+    try:
+        tender = get_tender_for_history(db=db, tender_id=tenderId, username=username)
+        history = get_tender_history(db=db, tender=tender, limit=pagination.limit, offset=pagination.offset)
+        # Новые версии добавляются только в конец истории, поэтому заполненная страница уже не изменится
+        set_cache_control(response, immutable=pagination.limit > 0 and len(history) == pagination.limit)
+        return [TenderVersionOut.from_orm(record) for record in history]
+    except UserNotFound as e:
+        handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
+    except PermissionDenied as e:
+        handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except TenderNotFound as e:
+        handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
+
+@router.get("/{tenderId}/versions/{version}", response_model=TenderVersionOut)
+def get_tender_version(
+    tenderId: UUID,
+    version: int,
+    username: str,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    try:
+        tender = get_tender_for_history(db=db, tender_id=tenderId, username=username)
+        snapshot = load_tender_versions(db, tender, [version])[version]
+        set_cache_control(response, immutable=version < tender.version)
+        return snapshot
+    except UserNotFound as e:
+        handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
+    except PermissionDenied as e:
+        handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except (TenderNotFound, TenderVersionNotFound) as e:
+        handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
+
+@router.get("/{tenderId}/diff", response_model=VersionDiffOut)
+def get_tender_diff(
+    tenderId: UUID,
+    username: str,
+    response: Response,
+    fromVersion: int = Query(..., ge=1, description="Исходная версия."),
+    toVersion: int = Query(..., ge=1, description="Версия, с которой сравнивается исходная."),
+    db: Session = Depends(get_db)
+):
+    try:
+        tender = get_tender_for_history(db=db, tender_id=tenderId, username=username)
+        snapshots = load_tender_versions(db, tender, [fromVersion, toVersion])
+        set_cache_control(response, immutable=max(fromVersion, toVersion) < tender.version)
+        return VersionDiffOut.between(snapshots[fromVersion], snapshots[toVersion])
+    except UserNotFound as e:
+        handle_exception(e, fastapi.status.HTTP_401_UNAUTHORIZED)
+    except PermissionDenied as e:
+        handle_exception(e, fastapi.status.HTTP_403_FORBIDDEN)
+    except (TenderNotFound, TenderVersionNotFound) as e:
+        handle_exception(e, fastapi.status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        handle_exception(e, fastapi.status.HTTP_400_BAD_REQUEST)
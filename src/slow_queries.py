@@ -0,0 +1,159 @@
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import Engine, event
+
+from src.metrics import metrics
+from src.request_context import current_route
+
+
+SLOW_QUERY_LOG_ENABLED = os.getenv("SLOW_QUERY_LOG_ENABLED", "true").lower() == "true"
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+# Доля медленных SELECT, для которых снимается EXPLAIN (ANALYZE, BUFFERS): запрос выполняется повторно
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0"))
+SLOW_QUERY_MAX_ENTRIES = int(os.getenv("SLOW_QUERY_MAX_ENTRIES", "200"))
+
+CRUD_MODULES = ("src.db.crud",)
+# Общие помощники crud выполняют запросы от имени вызвавшей их функции, запрос относится к ней
+CRUD_HELPERS = {"execute_rows", "fetch_page", "project"}
+
+logger = logging.getLogger(__name__)
+
+
+def calling_function() -> str | None:
+    """Имя функции crud, из которой выполняется запрос: первая такая функция вверх по стеку."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_globals.get("__name__") in CRUD_MODULES and frame.f_code.co_name not in CRUD_HELPERS:
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return None
+
+
+def parameter_shape(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def parameters_shape(parameters, executemany: bool) -> dict | list:
+    """Типы и размеры параметров без значений: в логе не должно быть пользовательских данных."""
+    if executemany:
+        rows = list(parameters)
+        return {"rows": len(rows), "first": parameters_shape(rows[0], False) if rows else {}}
+    if isinstance(parameters, dict):
+        return {name: parameter_shape(value) for name, value in parameters.items()}
+    return [parameter_shape(value) for value in parameters or ()]
+
+
+class SlowQueryLog:
+    """Медленные запросы, сгруппированные по тексту и функции crud; хранит самые тяжёлые группы."""
+
+    def __init__(self, max_entries: int = SLOW_QUERY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, function: str | None, route: str | None, duration_ms: float,
+               parameters: dict | list, plan: list[str] | None):
+        key = (statement, function)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {
+                    "statement": statement,
+                    "function": function,
+                    "count": 0,
+                    "totalMs": 0.0,
+                    "maxMs": 0.0,
+                    "routes": [],
+                    "plan": None,
+                }
+            entry["count"] += 1
+            entry["totalMs"] += duration_ms
+            entry["lastSeenAt"] = datetime.utcnow().isoformat() + "Z"
+            entry["lastParameters"] = parameters
+            if route and route not in entry["routes"] and len(entry["routes"]) < 20:
+                entry["routes"].append(route)
+            if duration_ms >= entry["maxMs"]:
+                entry["maxMs"] = duration_ms
+                entry["plan"] = plan or entry["plan"]
+            elif plan:
+                entry["plan"] = plan
+            if len(self._entries) > self.max_entries:
+                lightest = min(self._entries, key=lambda k: self._entries[k]["totalMs"])
+                del self._entries[lightest]
+
+    def worst(self, limit: int) -> list[dict]:
+        with self._lock:
+            entries = [dict(entry, routes=list(entry["routes"])) for entry in self._entries.values()]
+        return sorted(entries, key=lambda entry: entry["totalMs"], reverse=True)[:limit]
+
+
+slow_query_log = SlowQueryLog()
+
+
+def explain_analyze(conn, statement: str, parameters) -> list[str] | None:
+    # Курсор DBAPI напрямую, а не Connection.execute: события движка не вызываются повторно,
+    # а план снимается в той же транзакции и с теми же параметрами. Точка сохранения не даёт
+    # ошибке EXPLAIN прервать транзакцию запроса.
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            plan = [row[0] for row in cursor.fetchall()]
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            logger.exception("Failed to capture EXPLAIN for slow query")
+            return None
+        cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        return plan
+    finally:
+        cursor.close()
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration_ms = (time.perf_counter() - conn.info["query_started_at"].pop()) * 1000
+    if duration_ms < SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    function = calling_function()
+    route = current_route()
+    shape = parameters_shape(parameters, executemany)
+    plan = None
+    if (
+        conn.dialect.name == "postgresql"
+        and not executemany
+        and statement.lstrip().upper().startswith("SELECT")
+        and random.random() < SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+    ):
+        plan = explain_analyze(conn, statement, parameters)
+
+    metrics.inc("slow_queries_total", {"function": function or "unknown"})
+    logger.warning("Slow query %.1f ms in %s (%s), parameters %s: %s",
+                   duration_ms, function or "unknown", route or "no route", shape, " ".join(statement.split()))
+    slow_query_log.record(statement, function, route, duration_ms, shape, plan)
+
+
+def handle_error(exception_context):
+    started_at = exception_context.connection.info.get("query_started_at") if exception_context.connection else None
+    if started_at:
+        started_at.pop()
+
+
+def install_slow_query_log(engine: Engine):
+    if not SLOW_QUERY_LOG_ENABLED:
+        return
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
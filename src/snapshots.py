@@ -0,0 +1,50 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from src.metrics import metrics
+
+
+SNAPSHOT_CACHE_SIZE = int(os.getenv("SNAPSHOT_CACHE_SIZE", "10000"))
+
+
+class SnapshotCache:
+    """
+    LRU-кеш снимков исторических версий. Записи истории не изменяются,
+    поэтому снимок версии можно хранить без срока жизни и без инвалидации.
+    """
+
+    def __init__(self, name: str, max_size: int = SNAPSHOT_CACHE_SIZE):
+        self.name = name
+        self.max_size = max_size
+        self._items: OrderedDict[tuple, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, entity_id: Hashable, versions: list[int],
+                 load: Callable[[list[int]], dict[int, Any]]) -> dict[int, Any]:
+        """Снимки версий сущности; отсутствующие в кеше загружаются одним вызовом load(versions)."""
+        found, missing = {}, []
+        with self._lock:
+            for version in versions:
+                key = (entity_id, version)
+                if key in self._items:
+                    self._items.move_to_end(key)
+                    found[version] = self._items[key]
+                else:
+                    missing.append(version)
+        if found:
+            metrics.inc("snapshot_cache_hits_total", {"cache": self.name}, len(found))
+        if not missing:
+            return found
+
+        metrics.inc("snapshot_cache_misses_total", {"cache": self.name}, len(missing))
+        loaded = load(missing)
+        with self._lock:
+            for version, snapshot in loaded.items():
+                self._items[(entity_id, version)] = snapshot
+                self._items.move_to_end((entity_id, version))
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        found.update(loaded)
+        return found
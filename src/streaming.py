@@ -0,0 +1,35 @@
+import os
+from typing import Callable
+
+from starlette.responses import StreamingResponse
+
+from src.db.crud import execute_rows
+from src.db.database import SessionLocal
+
+
+STREAMING_BATCH_SIZE = int(os.getenv("STREAMING_BATCH_SIZE", "500"))
+
+
+def stream_json_array(query, serialize: Callable[[object], str]) -> StreamingResponse:
+    """
+    Отдаёт результат запроса JSON-массивом по мере чтения: строки читаются из курсора пачками
+    по STREAMING_BATCH_SIZE (yield_per) и отправляются такими же пачками, поэтому память не зависит от размера страницы.
+    Сессия своя: сессия из get_db закрывается раньше, чем ответ будет отправлен.
+    Права проверяются при построении запроса, до начала ответа.
+    """
+    def generate():
+        db = SessionLocal()
+        try:
+            separator = b"["
+            batch = []
+            for row in execute_rows(db, query, yield_per=STREAMING_BATCH_SIZE):
+                batch.append(separator + serialize(row).encode())
+                separator = b","
+                if len(batch) >= STREAMING_BATCH_SIZE:
+                    yield b"".join(batch)
+                    batch = []
+            yield b"".join(batch) + (b"]" if separator == b"," else b"[]")
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type="application/json")
@@ -0,0 +1,71 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+
+# База из TEST_DATABASE_URL пересоздаётся каждым тестом; без неё тесты идут в SQLite в памяти.
+# Режим trigger проверяется только с PostgreSQL: триггеры версионирования есть только в нём.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "sqlite://")
+# src.db.database читает адрес базы при импорте
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+os.environ["ADMISSION_ENABLED"] = "false"
+
+VERSIONING_MODES = ["app", "trigger"]
+
+
+@pytest.fixture(scope="session")
+def app():
+    from src.main import app
+    return app
+
+
+@pytest.fixture(params=VERSIONING_MODES)
+def versioning_mode(request, monkeypatch, app):
+    """Режим версионирования на время теста: как у процесса, запущенного с VERSIONING_MODE=<режим>."""
+    from src.db import triggers
+    from src.db.database import BaseModel, engine
+
+    if request.param == "trigger" and engine.dialect.name != "postgresql":
+        pytest.skip("VERSIONING_MODE=trigger needs TEST_DATABASE_URL with a PostgreSQL database")
+    monkeypatch.setattr(triggers, "VERSIONING_MODE", request.param)
+    if request.param == "trigger":
+        event.listen(engine, "connect", triggers.enable_trigger_versioning)
+    # Новые соединения получают настройку режима, таблицы создаются заново при старте приложения
+    engine.dispose()
+    BaseModel.metadata.drop_all(engine)
+    yield request.param
+    if request.param == "trigger":
+        event.remove(engine, "connect", triggers.enable_trigger_versioning)
+    engine.dispose()
+
+
+@pytest.fixture
+def client(app, versioning_mode):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def people(client):
+    """Организация с тремя ответственными (кворум решений — три одобрения) и автор предложений."""
+    from src.db.database import SessionLocal
+    from src.db.models import User, Organization, OrganizationResponsible
+
+    with SessionLocal() as db:
+        responsibles = [User(username=f"responsible{i}", first_name="R", last_name=str(i)) for i in range(3)]
+        author = User(username="author", first_name="A", last_name="A")
+        organization = Organization(name="organization")
+        db.add_all([*responsibles, author, organization])
+        db.flush()
+        db.add_all([OrganizationResponsible(organization_id=organization.id, user_id=user.id) for user in responsibles])
+        db.commit()
+        return SimpleNamespace(
+            organization_id=str(organization.id),
+            responsibles=[user.username for user in responsibles],
+            author=author.username,
+            author_id=str(author.id),
+        )
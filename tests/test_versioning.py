@@ -0,0 +1,232 @@
+"""
+Версии и история тендеров и предложений в обоих режимах VERSIONING_MODE: каждый тест выполняется
+с app и с trigger и проверяет одни и те же номера версий и строки истории.
+"""
+from sqlalchemy import select
+
+from src.db.database import SessionLocal
+from src.db.models import Tender, TenderHistory, Bid, BidHistory
+
+
+def create_tender(client, people, name="tender"):
+    response = client.post("/api/tenders/new", json={
+        "name": name,
+        "description": "description",
+        "serviceType": "Construction",
+        "organizationId": people.organization_id,
+        "creatorUsername": people.responsibles[0],
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def publish_tender(client, people, tender_id):
+    response = client.put(f"/api/tenders/{tender_id}/status",
+                          params={"status": "Published", "username": people.responsibles[0]})
+    assert response.status_code == 200, response.text
+
+
+def create_bid(client, people, tender_id, name="bid"):
+    response = client.post("/api/bids/new", json={
+        "name": name,
+        "description": "description",
+        "tenderId": tender_id,
+        "authorType": "User",
+        "authorId": people.author_id,
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def publish_bid(client, people, bid_id):
+    response = client.put(f"/api/bids/{bid_id}/status", params={"status": "Published", "username": people.author})
+    assert response.status_code == 200, response.text
+
+
+def tender_state(tender_id):
+    """Текущие (version, name, status) тендера и его история в порядке версий."""
+    with SessionLocal() as db:
+        tender = db.get(Tender, tender_id)
+        history = db.execute(
+            select(TenderHistory.version, TenderHistory.name, TenderHistory.status)
+            .where(TenderHistory.tender_id == tender_id).order_by(TenderHistory.version)
+        ).all()
+        return (tender.version, tender.name, tender.status.name), \
+            [(version, name, status.name) for version, name, status in history]
+
+
+def bid_state(bid_id):
+    """Текущие (version, name, status) предложения и его история в порядке версий."""
+    with SessionLocal() as db:
+        bid = db.get(Bid, bid_id)
+        history = db.execute(
+            select(BidHistory.version, BidHistory.name, BidHistory.status)
+            .where(BidHistory.bid_id == bid_id).order_by(BidHistory.version)
+        ).all()
+        return (bid.version, bid.name, bid.status.name), \
+            [(version, name, status.name) for version, name, status in history]
+
+
+def test_tender_edit_status_and_rollback(client, people):
+    tender_id = create_tender(client, people)
+    username = people.responsibles[0]
+
+    response = client.patch(f"/api/tenders/{tender_id}/edit", params={"username": username}, json={"name": "renamed"})
+    assert response.status_code == 200, response.text
+    assert response.json()["version"] == 2
+    assert response.headers["ETag"] == '"2"'
+
+    publish_tender(client, people, tender_id)
+
+    response = client.put(f"/api/tenders/{tender_id}/rollback/1", params={"username": username})
+    assert response.status_code == 200, response.text
+    assert response.json()["version"] == 4
+
+    assert tender_state(tender_id) == (
+        (4, "tender", "CREATED"),
+        [(1, "tender", "CREATED"), (2, "renamed", "CREATED"), (3, "renamed", "PUBLISHED")],
+    )
+    response = client.get(f"/api/tenders/{tender_id}/versions", params={"username": username})
+    assert [version["version"] for version in response.json()] == [1, 2, 3]
+
+
+def test_tender_if_match(client, people):
+    tender_id = create_tender(client, people)
+    username = people.responsibles[0]
+
+    response = client.patch(f"/api/tenders/{tender_id}/edit", params={"username": username},
+                            json={"name": "first"}, headers={"If-Match": '"1"'})
+    assert response.status_code == 200, response.text
+
+    response = client.patch(f"/api/tenders/{tender_id}/edit", params={"username": username},
+                            json={"name": "stale"}, headers={"If-Match": '"1"'})
+    assert response.status_code == 412, response.text
+
+    response = client.put(f"/api/tenders/{tender_id}/status", params={"status": "Published", "username": username},
+                          headers={"If-Match": 'W/"2"'})
+    assert response.status_code == 200, response.text
+
+    response = client.put(f"/api/tenders/{tender_id}/rollback/1", params={"username": username},
+                          headers={"If-Match": '"2"'})
+    assert response.status_code == 412, response.text
+
+    assert tender_state(tender_id) == (
+        (3, "first", "PUBLISHED"),
+        [(1, "tender", "CREATED"), (2, "first", "CREATED")],
+    )
+
+
+def test_bid_edit_status_and_rollback(client, people):
+    tender_id = create_tender(client, people)
+    publish_tender(client, people, tender_id)
+    bid_id = create_bid(client, people, tender_id)
+
+    publish_bid(client, people, bid_id)
+
+    response = client.patch(f"/api/bids/{bid_id}/edit", params={"username": people.author}, json={"name": "renamed"})
+    assert response.status_code == 200, response.text
+    assert response.json()["version"] == 3
+
+    response = client.put(f"/api/bids/{bid_id}/rollback/1", params={"username": people.author})
+    assert response.status_code == 200, response.text
+    assert response.json()["version"] == 4
+
+    assert bid_state(bid_id) == (
+        (4, "bid", "CREATED"),
+        [(1, "bid", "CREATED"), (2, "bid", "PUBLISHED"), (3, "renamed", "PUBLISHED")],
+    )
+
+
+def test_bid_if_match(client, people):
+    tender_id = create_tender(client, people)
+    publish_tender(client, people, tender_id)
+    bid_id = create_bid(client, people, tender_id)
+
+    response = client.put(f"/api/bids/{bid_id}/status", params={"status": "Published", "username": people.author},
+                          headers={"If-Match": '"1"'})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] == '"2"'
+
+    response = client.patch(f"/api/bids/{bid_id}/edit", params={"username": people.author},
+                            json={"name": "stale"}, headers={"If-Match": '"1"'})
+    assert response.status_code == 412, response.text
+
+    response = client.patch(f"/api/bids/{bid_id}/edit", params={"username": people.author},
+                            json={"name": "current"}, headers={"If-Match": '"2"'})
+    assert response.status_code == 200, response.text
+
+    assert bid_state(bid_id) == (
+        (3, "current", "PUBLISHED"),
+        [(1, "bid", "CREATED"), (2, "bid", "PUBLISHED")],
+    )
+
+
+def test_rejection_cancels_bid_without_new_version(client, people):
+    tender_id = create_tender(client, people)
+    publish_tender(client, people, tender_id)
+    bid_id = create_bid(client, people, tender_id)
+    publish_bid(client, people, bid_id)
+
+    response = client.put(f"/api/bids/{bid_id}/submit_decision",
+                          params={"decision": "Rejected", "username": people.responsibles[0]})
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "Canceled"
+
+    assert bid_state(bid_id) == ((2, "bid", "CANCELED"), [(1, "bid", "CREATED")])
+
+
+def test_quorum_closes_tender_and_cancels_other_bids(client, people):
+    tender_id = create_tender(client, people)
+    publish_tender(client, people, tender_id)
+    winner_id = create_bid(client, people, tender_id, "winner")
+    publish_bid(client, people, winner_id)
+    published_id = create_bid(client, people, tender_id, "published")
+    publish_bid(client, people, published_id)
+    created_id = create_bid(client, people, tender_id, "created")
+
+    for username in people.responsibles:
+        response = client.put(f"/api/bids/{winner_id}/submit_decision",
+                              params={"decision": "Approved", "username": username})
+        assert response.status_code == 200, response.text
+
+    # Решение закрывает тендер и не меняет победившее предложение без новой версии (SET LOCAL в режиме trigger)
+    assert tender_state(tender_id) == ((2, "tender", "CLOSED"), [(1, "tender", "CREATED")])
+    assert bid_state(winner_id) == ((2, "winner", "PUBLISHED"), [(1, "winner", "CREATED")])
+    # Остальные открытые предложения отменяются с новыми версиями
+    assert bid_state(published_id) == (
+        (3, "published", "CANCELED"),
+        [(1, "published", "CREATED"), (2, "published", "PUBLISHED")],
+    )
+    assert bid_state(created_id) == ((2, "created", "CANCELED"), [(1, "created", "CREATED")])
+
+
+def test_closing_tender_cancels_open_bids(client, people):
+    tender_id = create_tender(client, people)
+    publish_tender(client, people, tender_id)
+    published_id = create_bid(client, people, tender_id, "published")
+    publish_bid(client, people, published_id)
+    created_id = create_bid(client, people, tender_id, "created")
+    canceled_id = create_bid(client, people, tender_id, "canceled")
+    response = client.put(f"/api/bids/{canceled_id}/status", params={"status": "Canceled", "username": people.author})
+    assert response.status_code == 200, response.text
+
+    response = client.put(f"/api/tenders/{tender_id}/status",
+                          params={"status": "Closed", "username": people.responsibles[0]})
+    assert response.status_code == 200, response.text
+    assert response.json()["version"] == 3
+
+    assert tender_state(tender_id) == (
+        (3, "tender", "CLOSED"),
+        [(1, "tender", "CREATED"), (2, "tender", "PUBLISHED")],
+    )
+    assert bid_state(published_id) == (
+        (3, "published", "CANCELED"),
+        [(1, "published", "CREATED"), (2, "published", "PUBLISHED")],
+    )
+    assert bid_state(created_id) == ((2, "created", "CANCELED"), [(1, "created", "CREATED")])
+    # Уже отменённое предложение не получает новой версии
+    assert bid_state(canceled_id) == ((2, "canceled", "CANCELED"), [(1, "canceled", "CREATED")])
+
+    response = client.get(f"/api/tenders/{tender_id}/stats", params={"username": people.responsibles[0]})
+    assert response.status_code == 200, response.text
+    assert response.json()["bidsByStatus"] == {"Created": 0, "Published": 0, "Canceled": 3}